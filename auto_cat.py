@@ -0,0 +1,147 @@
+import os
+import re
+
+import date_compare
+
+try:
+    from dir_names import AUTO_CAT_RULES
+except ImportError:
+    # Optional. Default rules below used unless dir_names.py defines its own.
+    AUTO_CAT_RULES = None
+
+
+# Rules for categorizing buffer files by metadata alone, before the manual
+# photo_transfer() loop. Each rule is a dict. All conditions present in a rule
+# must match, and the first matching rule decides the target.
+#   "name":         label used in report
+#   "target":       CAT_DIRS key to move matching files to ('st' also allowed)
+#   "ext":          list of file extensions (upper case, with dot)
+#   "name_pattern": regex searched for in the (datestamped) file name
+#   "tags":         dict of exiftool tag -> regex the tag's value must match
+#   "missing_tags": list of exiftool tags the file must NOT have
+#   "dims":         list of (width, height) sizes, either orientation
+# To change them, define AUTO_CAT_RULES (same format) in dir_names.py.
+# Example for pictures saved from an app:
+#   {"name": "Snapchat", "target": "snap", "ext": [".JPG"],
+#    "missing_tags": ["EXIF:Make"], "name_pattern": "Snapchat"}
+
+# Screen resolutions of iPhone/iPad models (portrait).
+SCREEN_SIZES = [(640, 1136), (750, 1334), (1242, 2208), (1080, 1920),
+                (1125, 2436), (828, 1792), (1242, 2688), (1080, 2340),
+                (1170, 2532), (1284, 2778), (1179, 2556), (1290, 2796),
+                (1536, 2048), (1668, 2224), (1668, 2388), (1620, 2160),
+                (1640, 2360), (2048, 2732)]
+# Screen recordings are saved scaled down to 1920 px or less on long side.
+SCREEN_RECORDING_SIZES = SCREEN_SIZES + [(884, 1920), (886, 1920),
+                                                    (888, 1920), (1440, 1920)]
+
+DEFAULT_RULES = [
+    {"name": "screenshot", "target": "ss", "ext": [".PNG"],
+     "tags": {"XMP:UserComment": "^Screenshot$"}},
+    {"name": "screenshot (screen-sized PNG)", "target": "ss", "ext": [".PNG"],
+     "dims": SCREEN_SIZES},
+    {"name": "screen recording", "target": "sr", "ext": [".MP4"],
+     "missing_tags": ["QuickTime:Make"], "dims": SCREEN_RECORDING_SIZES},
+]
+
+SIZE_TAG = "Composite:ImageSize"
+
+
+class AutoCatError(Exception):
+    pass
+
+
+class CatRule(object):
+    """One categorization rule, compiled from its dict form."""
+    def __init__(self, rule_dict):
+        unknown = set(rule_dict) - {"name", "target", "ext", "name_pattern",
+                                        "tags", "missing_tags", "dims"}
+        if unknown or "target" not in rule_dict:
+            raise AutoCatError("Invalid auto-cat rule %s" % rule_dict)
+        self.name = rule_dict.get("name", rule_dict["target"])
+        self.target = rule_dict["target"]
+        self.exts = [ext.upper() for ext in rule_dict.get("ext", [])]
+        self.name_pattern = (re.compile(rule_dict["name_pattern"])
+                                if rule_dict.get("name_pattern") else None)
+        self.tags = {tag: re.compile(pattern) for tag, pattern
+                                        in rule_dict.get("tags", {}).items()}
+        self.missing_tags = list(rule_dict.get("missing_tags", []))
+        self.dims = set()
+        for width, height in rule_dict.get("dims", []):
+            self.dims.update([(width, height), (height, width)])
+
+    def needed_tags(self):
+        """exiftool tags this rule looks at."""
+        tags = list(self.tags) + self.missing_tags
+        if self.dims:
+            tags.append(SIZE_TAG)
+        return tags
+
+    def applies_to(self, img_name):
+        """Checks that don't need metadata."""
+        img_ext = os.path.splitext(img_name)[-1].upper()
+        if self.exts and img_ext not in self.exts:
+            return False
+        if self.name_pattern and not self.name_pattern.search(img_name):
+            return False
+        return True
+
+    def matches(self, img_name, metadata):
+        if not self.applies_to(img_name):
+            return False
+        for tag, pattern in self.tags.items():
+            if tag not in metadata or not pattern.search(str(metadata[tag])):
+                return False
+        for tag in self.missing_tags:
+            if tag in metadata:
+                return False
+        if self.dims and get_dims(metadata) not in self.dims:
+            return False
+        return True
+
+
+def get_dims(metadata):
+    """(width, height) from exiftool ImageSize tag ("750x1334" or "750 1334"
+    depending on exiftool version). None if not found."""
+    dims = re.split(r"[x ]", str(metadata.get(SIZE_TAG, "")).strip())
+    if len(dims) == 2 and all(dim.isdigit() for dim in dims):
+        return (int(dims[0]), int(dims[1]))
+    return None
+
+
+def load_rules(cat_dirs):
+    """Returns list of CatRule from dir_names.AUTO_CAT_RULES (or defaults),
+    leaving out rules whose target isn't a CAT_DIRS key."""
+    rules = []
+    for rule_dict in (AUTO_CAT_RULES if AUTO_CAT_RULES is not None
+                                                        else DEFAULT_RULES):
+        rule = CatRule(rule_dict)
+        if rule.target in cat_dirs or rule.target == "st":
+            rules.append(rule)
+        else:
+            print("Auto-cat rule '%s' skipped: no '%s' key in CAT_DIRS."
+                                                    % (rule.name, rule.target))
+    return rules
+
+
+def plan_auto_cat(img_paths, rules, et=None):
+    """Function that matches each file against rules. Metadata for all files
+    any rule could apply to is read in one batch.
+    Returns dict of matching CatRule keyed by img path (unmatched left out)."""
+    candidates = [img_path for img_path in img_paths if [rule for rule in rules
+                                if rule.applies_to(os.path.basename(img_path))]]
+    tags = sorted({tag for rule in rules for tag in rule.needed_tags()})
+
+    if candidates and tags:
+        with date_compare.exiftool_session(et) as et:
+            metadata_list = et.get_tags_batch(tags, candidates)
+    else:
+        metadata_list = [{} for img_path in candidates]
+
+    plan = {}
+    for img_path, metadata in zip(candidates, metadata_list):
+        for rule in rules:
+            if rule.matches(os.path.basename(img_path), metadata):
+                plan[img_path] = rule
+                break
+    return plan
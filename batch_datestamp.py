@@ -0,0 +1,341 @@
+import os
+import sys
+import threading
+
+import date_compare
+from date_compare import DATE_SOURCE_RANK
+from dir_index import DIR_INDEX
+from change_manifest import MANIFEST
+from prompt_policy import POLICY, PolicyError
+
+
+# Datestamps any number of files in one process, from a few hundred picked in
+# a file manager to whole trees of hundreds of thousands. Paths can be files
+# or dirs (every file directly inside is datestamped, like
+# date_compare.datestamp_all(), or every file below with --recursive), given
+# as arguments or as a NUL-delimited list on stdin (--null, e.g. from
+# find -print0). Works in phases instead of one add_datestamp() per file:
+#   1. Dates are read by a pool of worker threads, each with its own
+#      exiftool process, BATCH_SIZE files per request. Files exiftool has no
+#      date for are then dealt with one by one, as add_datestamp() does
+#      (prompt "manual_date").
+#   2. New names are worked out, and all files with non-standard names are
+#      confirmed in one review (prompt "nonstandard_name").
+#   3. Renames are planned in memory against one listing per dir, so names
+#      taken on disk or by another file in the batch get "_N" added (as
+#      safe_rename() would) without any lookups on disk.
+#   4. Renames are applied dir by dir. A planned name found taken by then
+#      (someone else's change) falls back on safe_rename().
+# A line per file at the end says what happened to it.
+#
+#   python3 batch_datestamp.py [--long] PATH [PATH ...]
+#   python3 batch_datestamp.py --recursive --changes-only TREE_ROOT
+#   find DIR -name '*.HEIC' -print0 | python3 batch_datestamp.py --null
+
+BATCH_SIZE = 500
+WORKERS = min(4, os.cpu_count() or 1)   # exiftool processes reading dates
+
+# Result of each file, as shown in report.
+RENAMED = "renamed"
+SKIPPED = "skipped"         # non-standard name, datestamp declined
+CORRECT = "correct"         # already has correct datestamp
+STAMPED = "stamped"         # starts with a date (not checked)
+UNKNOWN = "unknown type"    # no metadata to get date from
+MISSING = "missing"
+FAILED = "failed"
+UNCHANGED = [CORRECT, STAMPED, UNKNOWN]
+
+
+class StampResult(object):
+    """What happened to one file."""
+    __slots__ = ("img_path", "status", "new_path", "nonstandard", "detail")
+
+    def __init__(self, img_path, status=None, new_path=None, detail=None):
+        self.img_path = img_path
+        self.status = status
+        self.new_path = new_path      # new name until planned, then path
+        self.nonstandard = False
+        self.detail = detail
+
+    def describe(self):
+        line = "%-12s %s" % (self.status, self.img_path)
+        if self.new_path:
+            line += " -> %s" % os.path.basename(self.new_path)
+        if self.detail:
+            line += " (%s)" % self.detail
+        return line
+
+
+def walk_tree(root):
+    """Paths of all files under root, sorted by dir then name. Hidden files
+    and dirs (e.g. caches, checkpoints) are left out."""
+    img_paths = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(name for name in dir_names
+                                                if not name.startswith("."))
+        dir_path = dir_path.rstrip("/") + "/"
+        img_paths += [dir_path + img_name for img_name in sorted(file_names)
+                                            if not img_name.startswith(".")]
+    return img_paths
+
+
+def expand_paths(paths, recursive=False):
+    """List of file paths: each path given, or the files directly inside it
+    if it's a dir (sorted), or all files below it if recursive. Missing paths
+    are kept so they're reported."""
+    img_paths = []
+    for path in paths:
+        if os.path.isdir(path) and recursive:
+            img_paths += walk_tree(path)
+        elif os.path.isdir(path):
+            dir_path = path.rstrip("/") + "/"
+            img_paths += [dir_path + img_name
+                            for img_name in sorted(os.listdir(dir_path))
+                            if not os.path.isdir(dir_path + img_name)]
+        else:
+            img_paths.append(path)
+    return img_paths
+
+
+def read_null_list(stream):
+    """Paths from NUL-delimited stream (bytes), e.g. find -print0 output."""
+    return [os.fsdecode(path) for path in stream.read().split(b"\0") if path]
+
+
+class DateReader(object):
+    """Reads metadata dates of many files with a pool of worker threads, each
+    using its own exiftool process (started on its first batch). With an
+    exiftool process passed in, reads through that one only."""
+    def __init__(self, workers=WORKERS, et=None):
+        self.workers = 1 if et else max(1, workers)
+        self.et = et
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.sessions = []      # exiftool contexts started by workers
+
+    def session(self):
+        if self.et:
+            return self.et
+        if not hasattr(self.local, "et"):
+            context = date_compare.exiftool_session()
+            self.local.et = context.__enter__()
+            with self.lock:
+                self.sessions.append(context)
+        return self.local.et
+
+    def read_batch(self, img_paths):
+        return date_compare.get_group_dates_plus(
+                    [[img_path] for img_path in img_paths], self.session(),
+                                                                fallback=False)
+
+    def read_all(self, img_paths):
+        """Returns date of each of img_paths, like get_img_date_plus(), or
+        None where metadata has no usable date."""
+        from tqdm import tqdm
+        from concurrent.futures import ThreadPoolExecutor
+        batches = [img_paths[i:i + BATCH_SIZE]
+                                for i in range(0, len(img_paths), BATCH_SIZE)]
+        if len(batches) < 2 or self.workers == 1:
+            return [img_date for batch in tqdm(batches,
+                                                    disable=len(batches) < 2)
+                                        for img_date in self.read_batch(batch)]
+        with ThreadPoolExecutor(max_workers=min(self.workers,
+                                                        len(batches))) as pool:
+            # map() keeps batches in order.
+            return [img_date for batch_dates in tqdm(pool.map(self.read_batch,
+                                                batches), total=len(batches))
+                                                for img_date in batch_dates]
+
+    def close(self):
+        for context in self.sessions:
+            context.__exit__(None, None, None)
+        self.sessions = []
+
+
+def review_nonstandard(results):
+    """Single confirmation for all files with non-standard names (could have
+    an alternate datestamp already). Declined ones are marked skipped."""
+    queued = [Result for Result in results
+                            if not Result.status and Result.nonstandard]
+    if not queued:
+        return
+
+    print("\nFiles with non-standard naming:")
+    for n, Result in enumerate(queued):
+        print("\t%d: %s\t-> %s" % (n+1, Result.img_path, Result.new_path))
+    while True:
+        response = POLICY.ask("nonstandard_name",
+                    "Add datestamp to these anyway? [Y/N, or list numbers "
+                                "to datestamp only those, e.g. '1 3 4']\n> ")
+        if response.lower() == 'y':
+            picks = range(1, len(queued) + 1)
+            break
+        elif response.lower() == 'n':
+            picks = []
+            break
+        try:
+            picks = [int(num) for num in response.replace(",", " ").split()]
+        except ValueError:
+            picks = []
+        if picks and all(0 < num <= len(queued) for num in picks):
+            break
+        print("Input not recognized.")
+
+    picks = set(picks)
+    for n, Result in enumerate(queued):
+        if n+1 not in picks:
+            Result.status = SKIPPED
+            Result.new_path = None
+
+
+def free_name(taken, name):
+    """name if not in taken set, else first free one with "_N" inserted
+    before the extension (same names as DirNameIndex.next_free_name())."""
+    if name not in taken:
+        return name
+    name_noext, name_ext = os.path.splitext(name)
+    n = 1
+    while "%s_%d%s" % (name_noext, n, name_ext) in taken:
+        n += 1
+    return "%s_%d%s" % (name_noext, n, name_ext)
+
+
+def plan_renames(results):
+    """Turn each pending result's new name into a free path in its dir,
+    checking against one listing per dir plus names already planned.
+    Returns dict of pending results keyed by dir path."""
+    by_dir = {}
+    for Result in results:
+        if not Result.status and Result.new_path:
+            by_dir.setdefault(os.path.dirname(Result.img_path),
+                                                            []).append(Result)
+    for dir_path, dir_results in by_dir.items():
+        # Copy, since cached listing changes as renames are done.
+        taken = set(DIR_INDEX.names(dir_path))
+        for Result in dir_results:
+            new_name = free_name(taken, Result.new_path)
+            taken.add(new_name)
+            Result.new_path = dir_path + "/" + new_name
+    return by_dir
+
+
+def apply_renames(by_dir):
+    """Do the renames planned by plan_renames()."""
+    from tqdm import tqdm
+    for dir_path in tqdm(list(by_dir), disable=len(by_dir) < 2):
+        for Result in by_dir[dir_path]:
+            try:
+                if os.path.lexists(Result.new_path):
+                    # Taken since it was planned. Let safe_rename() find
+                    # another name from a fresh listing.
+                    DIR_INDEX.invalidate(dir_path)
+                    Result.new_path = date_compare.safe_rename(
+                            Result.img_path, os.path.basename(Result.new_path))
+                else:
+                    os.rename(Result.img_path, Result.new_path)
+                    MANIFEST.moved(Result.img_path, Result.new_path)
+                Result.status = RENAMED
+            except (OSError, date_compare.DirectoryNameError) as err:
+                # e.g. file moved away since its date was read.
+                Result.status = FAILED
+                Result.new_path = None
+                Result.detail = str(err)
+        # Listing changed by renames above; re-list on next use.
+        DIR_INDEX.invalidate(dir_path)
+
+
+def datestamp_paths(img_paths, long_stamp=False, et=None, workers=WORKERS):
+    """Function that datestamps every file in img_paths as add_datestamp()
+    would, in the phases described above. Returns list of StampResults in the
+    same order."""
+    results = [StampResult(img_path) for img_path in img_paths]
+    to_read = []
+    for Result in results:
+        img_name = os.path.basename(Result.img_path)
+        if not os.path.isfile(Result.img_path):
+            Result.status = MISSING
+        elif date_compare.has_datestamp(img_name):
+            Result.status = STAMPED
+        elif os.path.splitext(img_name)[-1].upper() not in DATE_SOURCE_RANK:
+            Result.status = UNKNOWN
+        else:
+            to_read.append(Result)
+
+    if to_read:
+        print("Reading dates of %d files..." % len(to_read))
+        Reader = DateReader(workers, et)
+        try:
+            img_dates = Reader.read_all([Result.img_path
+                                                    for Result in to_read])
+        finally:
+            Reader.close()
+
+        for Result, img_date in zip(to_read, img_dates):
+            if not img_date:
+                # No metadata date: ask, as add_datestamp() would.
+                img_date = date_compare.fallback_date_plus(Result.img_path)
+            datestamp_obj, manual = img_date
+            Result.new_path, Result.nonstandard = date_compare.datestamp_name(
+                            os.path.basename(Result.img_path), datestamp_obj,
+                                                                    long_stamp)
+            if not Result.new_path:
+                Result.status = CORRECT
+            if manual:
+                Result.detail = "manual/fs mod time"
+
+    review_nonstandard(to_read)
+    apply_renames(plan_renames(to_read))
+    return results
+
+
+def report(results, changes_only=False):
+    """Print a line per file (with changes_only, only files renamed, skipped
+    or failed) and totals. Returns True if none failed."""
+    totals = {}
+    for Result in results:
+        if not (changes_only and Result.status in UNCHANGED):
+            print(Result.describe())
+        totals[Result.status] = totals.get(Result.status, 0) + 1
+    print("\n%d files: %s" % (len(results), ", ".join("%d %s"
+                    % (totals[status], status) for status in sorted(totals))))
+    return not (totals.get(FAILED) or totals.get(MISSING))
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Prepend creation date to "
+                        "the names of many images at once (dates read by a "
+                                                "pool of exiftool processes).")
+    parser.add_argument("paths", nargs="*", help="images, or dirs of images")
+    parser.add_argument("--null", "-0", action="store_true",
+                        help="also read NUL-delimited paths from stdin")
+    parser.add_argument("--recursive", "-r", action="store_true",
+                        help="datestamp all files below each dir")
+    parser.add_argument("--long", action="store_true",
+                        help="date and time instead of date only")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="exiftool processes reading dates")
+    parser.add_argument("--changes-only", action="store_true",
+                        help="list only files renamed, skipped or failed")
+    parser.add_argument("--policy", help="prompt policy file (see "
+                                                        "prompt_policy.py)")
+    args = parser.parse_args(argv)
+
+    paths = list(args.paths)
+    if args.null:
+        paths += read_null_list(sys.stdin.buffer)
+    if not paths:
+        parser.error("no paths given")
+    try:
+        if args.policy:
+            POLICY.load(args.policy)
+        results = datestamp_paths(expand_paths(paths, args.recursive),
+                                            args.long, workers=args.workers)
+    except PolicyError as err:
+        print("Stopped: %s" % err)
+        return 2
+    return 0 if report(results, args.changes_only) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,105 @@
+"""Benchmark of copying many files into one directory with copy_to_target().
+
+Creates --files small source files (default 10k) and copies them all into one
+target directory, as when filling a month folder or Cat_Buffer. A fraction of
+them (--dup-fraction) reuse a handful of names with different contents, so
+they collide and are kept with "_N" suffixes (answering "k" to the prompt).
+Then renames every copied file in place with date_compare.safe_rename().
+
+Reports wall time and os.listdir() calls for the copy and rename phases.
+
+Example:
+    python benchmarks/bench_copy_collisions.py --files 10000 --save copy_base
+"""
+import os
+import shutil
+import argparse
+import tempfile
+
+import bench_util
+
+
+def build_sources(src_root, file_count, dup_fraction, dup_names):
+    """Returns list of source paths. Duplicate-named files go in their own
+    subdirs since names must be unique within a dir."""
+    dup_count = int(file_count * dup_fraction)
+    src_paths = []
+    for n in range(file_count):
+        if n < dup_count:
+            src_dir = os.path.join(src_root, "dup_%05d" % n)
+            name = "IMG_%04d.JPG" % (n % dup_names)
+        else:
+            src_dir = os.path.join(src_root, "uniq")
+            name = "IMG_%05d.JPG" % n
+        os.makedirs(src_dir, exist_ok=True)
+        src_path = os.path.join(src_dir, name)
+        with open(src_path, "w") as src_file:
+            # Unique contents so collisions are never same-hash skips.
+            src_file.write("source file %d\n" % n)
+        src_paths.append(src_path)
+    return src_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--dup-fraction", type=float, default=0.2,
+                        help="fraction of files sharing a colliding name")
+    parser.add_argument("--dup-names", type=int, default=5,
+                        help="number of distinct colliding names")
+    parser.add_argument("--work-dir", help="build files here instead of a "
+                                            "temp dir (left in place)")
+    bench_util.add_baseline_args(parser)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_copy_")
+    try:
+        bench_util.use_dir_names()
+        import pic_categorize_tool
+        import date_compare
+
+        src_paths = build_sources(os.path.join(work_dir, "src"), args.files,
+                                            args.dup_fraction, args.dup_names)
+        target_dir = os.path.join(work_dir, "target") + "/"
+        os.makedirs(target_dir)
+
+        with bench_util.NonInteractive(response="k") as copy_prompts, \
+                bench_util.IOCounters() as copy_io, \
+                bench_util.Timer() as copy_timer:
+            dest_paths = [pic_categorize_tool.copy_to_target(src_path,
+                                            target_dir) for src_path in src_paths]
+
+        with bench_util.NonInteractive() as rename_prompts, \
+                bench_util.IOCounters() as rename_io, \
+                bench_util.Timer() as rename_timer:
+            for dest_path in dest_paths:
+                date_compare.safe_rename(dest_path,
+                                    "2020-01-01_" + os.path.basename(dest_path))
+
+        copied = len(os.listdir(target_dir))
+        if copied != args.files:
+            raise Exception("Expected %d files in target, found %d."
+                                                        % (args.files, copied))
+
+        metrics = {"copy_wall_s": copy_timer.elapsed,
+                   "copy_files_per_s": args.files / copy_timer.elapsed,
+                   "copy_listdir_calls": copy_io.listdir_calls,
+                   "copy_prompts": copy_prompts.prompts,
+                   "rename_wall_s": rename_timer.elapsed,
+                   "rename_listdir_calls": rename_io.listdir_calls,
+                   "rename_prompts": rename_prompts.prompts}
+        result = {"benchmark": "copy_collisions",
+                  "git_rev": bench_util.git_rev(),
+                  "params": {"files": args.files,
+                             "dup_fraction": args.dup_fraction,
+                             "dup_names": args.dup_names},
+                  "metrics": metrics}
+        bench_util.finish(result, args)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark of datestamping a whole tree (batch_datestamp.datestamp_paths
+with --recursive paths).
+
+Generates --files synthetic media files (see synth_corpus.py) spread over
+--dirs folders, then datestamps them all with --workers exiftool processes.
+Reports wall time, files/s, exiftool processes and commands, listdir calls,
+and checks every file with a date was renamed.
+
+Requires exiftool and the tools' own dependencies (pyexiftool, tqdm).
+
+Example:
+    python benchmarks/bench_datestamp.py --files 20000 --save datestamp_base
+    python benchmarks/bench_datestamp.py --files 20000 --workers 1 \\
+                                                    --compare datestamp_base
+"""
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import bench_util
+import synth_corpus
+
+
+def build_tree(work_dir, args):
+    rng = random.Random(args.seed)
+    start_time = time.mktime((2019, 1, 1, 8, 0, 0, 0, 0, -1))
+    per_dir = max(1, args.files // args.dirs)
+    file_count = 0
+    for n in range(args.dirs):
+        dir_path = os.path.join(work_dir, "%d" % (2019 + n // 12),
+                                                "%03dAPPLE" % (100 + n))
+        file_count += len(synth_corpus.make_apple_folder(dir_path,
+                            n * per_dir, per_dir, start_time + n * 86400, rng,
+                            photo_kb=args.photo_kb, video_kb=args.video_kb))
+    return file_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000,
+                            help="number of pictures/videos to generate")
+    parser.add_argument("--dirs", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None,
+                            help="exiftool processes (default: tool's default)")
+    parser.add_argument("--photo-kb", type=int, default=8)
+    parser.add_argument("--video-kb", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=2019)
+    parser.add_argument("--work-dir", help="build tree here instead of a "
+                                                "temp dir (left in place)")
+    bench_util.add_baseline_args(parser)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_datestamp_")
+    try:
+        file_count = build_tree(work_dir, args)
+        bench_util.use_dir_names()
+        import batch_datestamp
+        from prompt_policy import POLICY
+        workers = args.workers or batch_datestamp.WORKERS
+        # Accept every fallback, so the run never waits on a prompt.
+        POLICY.answers = {"nonstandard_name": "y", "manual_date": ""}
+        POLICY.headless = True
+        POLICY.max_repeats = float("inf")
+
+        with bench_util.NonInteractive(), \
+             bench_util.IOCounters() as counters, \
+             bench_util.Timer() as timer:
+            results = batch_datestamp.datestamp_paths(
+                    batch_datestamp.expand_paths([work_dir], recursive=True),
+                                                            workers=workers)
+
+        renamed = sum(Result.status == batch_datestamp.RENAMED
+                                                        for Result in results)
+        metrics = {"wall_s": timer.elapsed,
+                   "files": len(results),
+                   "files_per_s": len(results) / timer.elapsed,
+                   "renamed": renamed,
+                   "not_renamed": len(results) - renamed}
+        metrics.update(counters.as_dict())
+        result = {"benchmark": "datestamp",
+                  "git_rev": bench_util.git_rev(),
+                  "params": {"files": file_count, "dirs": args.dirs,
+                             "workers": workers,
+                             "batch_size": batch_datestamp.BATCH_SIZE},
+                  "metrics": metrics}
+        bench_util.finish(result, args)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
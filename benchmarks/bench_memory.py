@@ -0,0 +1,167 @@
+"""Memory benchmark for the tree and index objects at archive scale.
+
+Creates a synthetic archive of empty files (default 500k) split between an
+Organized/ tree and Raw_Offload/ folders, then measures with tracemalloc:
+    organized   OrganizedGroup with every YearDir/MoDir and its image name
+                table loaded (worst case, as when IMG_E originals are searched)
+    raw_offload RawOffloadGroup/RawOffload objects with every APPLE folder
+                listing loaded into one name table, as done for the overlap
+                folder's previous offloads
+Each measurement is checked against a ceiling (MB). Exits non-zero if any
+ceiling is exceeded.
+
+Example:
+    python benchmarks/bench_memory.py --files 500000 --save memory_base
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+import bench_util
+
+
+# Peaks measured for the default 500k-file archive were ~8 MB (organized) and
+# ~34 MB (raw_offload, mostly the transient sort while building the table).
+# Ceilings leave some headroom.
+DEFAULT_CEILINGS_MB = {"organized": 12, "raw_offload": 40}
+
+
+def touch_files(dir_path, names):
+    os.makedirs(dir_path, exist_ok=True)
+    for name in names:
+        open(os.path.join(dir_path, name), "w").close()
+
+
+def build_archive(work_dir, total_files):
+    """Half the files go into Organized/ (20 years of months), half into
+    Raw_Offload/ (offloads of 10 APPLE folders each)."""
+    bu_root = os.path.join(work_dir, "iPhone_Pictures") + "/"
+    org_files = total_files // 2
+    raw_files = total_files - org_files
+
+    months = [(year, month) for year in range(2000, 2020)
+                                                for month in range(1, 13)]
+    per_month = max(1, org_files // len(months))
+    num = 0
+    for year, month in months:
+        mo_path = bu_root + "Organized/%d/%d-%02d" % (year, year, month)
+        names = []
+        for n in range(per_month):
+            names.append("%d-%02d-%02d_IMG_%04d.HEIC" % (year, month,
+                                                1 + n % 28, num % 10000))
+            num += 1
+        touch_files(mo_path, names)
+
+    per_folder = 2000
+    folder_count = max(1, raw_files // per_folder)
+    for n in range(folder_count):
+        offload = "2020-%02d-%02dT120000" % (1 + n // 280 % 12, 1 + n // 10 % 28)
+        folder = "%dAPPLE" % (100 + n % 10 + n // 280 * 10)
+        touch_files(bu_root + "Raw_Offload/%s/%s" % (offload, folder),
+                    ["IMG_%04d.HEIC" % (i % 10000) for i in range(
+                                n * per_folder, (n + 1) * per_folder)])
+    os.makedirs(bu_root + "Cat_Buffer")
+    return bu_root
+
+
+def measure(func):
+    """Returns (current MB still held by func's result, peak MB) and result."""
+    tracemalloc.start()
+    result = func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / 2**20, peak / 2**20, result
+
+
+def load_organized(bu_root):
+    import date_organize_tool
+    orgg = date_organize_tool.OrganizedGroup(bu_root, bu_root + "Cat_Buffer/")
+    names = 0
+    for yr_obj in orgg.get_yr_objs().values():
+        for mo_name in yr_obj.get_mo_list():
+            if mo_name not in yr_obj.get_mo_objs():
+                yr_obj.make_yrmonth(mo_name)
+            names += len(yr_obj.get_mo_objs()[mo_name].get_img_list())
+    return orgg, names
+
+
+def load_raw_offload(bu_root):
+    import pic_offload_tool
+    from dir_index import SortedNames
+    rog = pic_offload_tool.RawOffloadGroup(bu_root)
+    offloads = [pic_offload_tool.RawOffload(name, rog)
+                                            for name in rog.get_offload_list()]
+    # Name table over every APPLE folder, built the way run_overlap_offload()
+    # builds prev_APPLE_pics for the overlap folders.
+    all_pics = SortedNames(offload.get_dir_name() + "/" + folder + "/" + pic
+                                for offload in offloads
+                                for folder in offload.list_APPLE_folders()
+                                for pic in offload.APPLE_contents(folder))
+    return (rog, offloads, all_pics), sum(len(offload.list_APPLE_folders())
+                                            for offload in offloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=500000)
+    parser.add_argument("--organized-ceiling-mb", type=float,
+                                    default=DEFAULT_CEILINGS_MB["organized"])
+    parser.add_argument("--raw-offload-ceiling-mb", type=float,
+                                    default=DEFAULT_CEILINGS_MB["raw_offload"])
+    parser.add_argument("--work-dir", help="build archive here instead of a "
+                                            "temp dir (left in place)")
+    bench_util.add_baseline_args(parser)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_memory_")
+    try:
+        if os.path.exists(os.path.join(work_dir, "iPhone_Pictures")):
+            bu_root = os.path.join(work_dir, "iPhone_Pictures") + "/"
+        else:
+            print("Creating %d-file archive in %s" % (args.files, work_dir))
+            bu_root = build_archive(work_dir, args.files)
+        bench_util.use_dir_names(IPHONE_BU_ROOT=bu_root)
+
+        metrics = {}
+        ceilings = {"organized": args.organized_ceiling_mb,
+                    "raw_offload": args.raw_offload_ceiling_mb}
+        with bench_util.NonInteractive():
+            org_mb, org_peak_mb, (orgg, org_names) = measure(
+                                            lambda: load_organized(bu_root))
+            raw_mb, raw_peak_mb, (raw_objs, raw_folders) = measure(
+                                            lambda: load_raw_offload(bu_root))
+        metrics["organized_names"] = org_names
+        metrics["organized_mb"] = org_mb
+        metrics["organized_peak_mb"] = org_peak_mb
+        metrics["organized_bytes_per_name"] = org_mb * 2**20 / max(1, org_names)
+        metrics["raw_offload_names"] = len(raw_objs[2])
+        metrics["raw_offload_bytes_per_name"] = (raw_mb * 2**20
+                                                    / max(1, len(raw_objs[2])))
+        metrics["raw_offload_folders"] = raw_folders
+        metrics["raw_offload_mb"] = raw_mb
+        metrics["raw_offload_peak_mb"] = raw_peak_mb
+
+        result = {"benchmark": "memory",
+                  "git_rev": bench_util.git_rev(),
+                  "params": {"files": args.files, "ceilings_mb": ceilings},
+                  "metrics": metrics}
+        bench_util.finish(result, args)
+
+        over = [name for name in ceilings
+                            if metrics[name + "_peak_mb"] > ceilings[name]]
+        for name in over:
+            print("FAIL: %s peak %.1f MB exceeds ceiling %.1f MB"
+                            % (name, metrics[name + "_peak_mb"], ceilings[name]))
+        if over:
+            sys.exit(1)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
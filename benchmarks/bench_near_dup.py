@@ -0,0 +1,61 @@
+"""Benchmark of near-duplicate clustering (near_dup.cluster_hashes).
+
+Generates --images synthetic 64-bit dHashes in bursts of --burst-size, each
+burst member a few bits off the burst's base hash, and clusters them as if
+all were taken the same day (worst case: one all-pairs comparison).
+Checks that every burst comes back as one cluster.
+
+Example:
+    python benchmarks/bench_near_dup.py --images 10000 --save near_dup_base
+"""
+import random
+import argparse
+
+import bench_util
+
+
+def make_hashes(image_count, burst_size, rng):
+    hashes = []
+    while len(hashes) < image_count:
+        base_hash = rng.getrandbits(64)
+        for n in range(min(burst_size, image_count - len(hashes))):
+            img_hash = base_hash
+            for bit in rng.sample(range(64), rng.randint(0, 3)):
+                img_hash ^= 1 << bit
+            hashes.append(img_hash)
+    return hashes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=10000)
+    parser.add_argument("--burst-size", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    bench_util.add_baseline_args(parser)
+    args = parser.parse_args()
+
+    import near_dup
+    if not near_dup.optional_deps.installed("numpy"):
+        raise SystemExit("NumPy required for near-duplicate clustering.")
+
+    hashes = make_hashes(args.images, args.burst_size, random.Random(args.seed))
+    with bench_util.Timer() as timer:
+        clusters = near_dup.cluster_hashes(hashes)
+
+    bursts = -(-args.images // args.burst_size)
+    metrics = {"cluster_wall_s": timer.elapsed,
+               "images_per_s": args.images / timer.elapsed,
+               "clusters": len(clusters),
+               "bursts_missed": bursts - len(clusters)}
+    result = {"benchmark": "near_dup",
+              "git_rev": bench_util.git_rev(),
+              "params": {"images": args.images, "burst_size": args.burst_size,
+                         "seed": args.seed,
+                         "max_distance": near_dup.MAX_DISTANCE},
+              "metrics": metrics}
+    bench_util.finish(result, args)
+
+
+if __name__ == "__main__":
+    main()
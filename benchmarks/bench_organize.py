@@ -0,0 +1,104 @@
+"""Benchmark for the ORGANIZE phase (OrganizedGroup.run_org, YearDir.insert_img,
+MoDir.insert_img).
+
+Builds a synthetic backup root in a temp dir - a pre-populated multi-year
+Organized/ tree and a Raw_Offload/ folder of freshly generated media (see
+synth_corpus.py) - then runs the organizer with every prompt answered by its
+fallback. Reports wall time, files/s, exiftool invocations, listdir calls and
+bytes written.
+
+Requires exiftool and the tools' own dependencies (pyexiftool, tqdm).
+
+Example:
+    python benchmarks/bench_organize.py --assets 2000 --save organize_base
+    python benchmarks/bench_organize.py --assets 2000 --compare organize_base
+"""
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import bench_util
+import synth_corpus
+
+
+def build_tree(work_dir, args):
+    rng = random.Random(args.seed)
+    bu_root = os.path.join(work_dir, "iPhone_Pictures") + "/"
+    org_root = bu_root + "Organized/"
+    buffer_root = bu_root + "Cat_Buffer/"
+    os.makedirs(buffer_root)
+
+    last_year = 2019
+    years = list(range(last_year - args.years + 1, last_year + 1))
+    synth_corpus.make_organized_tree(org_root, years, args.files_per_month, rng)
+
+    # Previous offload holds the overlap folder; the new one is organized.
+    prev_offload = bu_root + "Raw_Offload/2019-12-31T120000/"
+    os.makedirs(prev_offload + "100APPLE")
+    offload_path = bu_root + "Raw_Offload/2020-03-01T120000/"
+
+    start_time = time.mktime((last_year + 1, 1, 1, 8, 0, 0, 0, 0, -1))
+    per_folder = max(1, args.assets // args.folders)
+    file_count = 0
+    for n in range(args.folders):
+        folder = "%dAPPLE" % (100 + n)
+        file_count += len(synth_corpus.make_apple_folder(
+                            offload_path + folder, n * per_folder, per_folder,
+                            start_time + n * per_folder * 1800, rng,
+                            photo_kb=args.photo_kb, video_kb=args.video_kb))
+    return bu_root, buffer_root, file_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assets", type=int, default=2000,
+                            help="number of pictures/videos to generate")
+    parser.add_argument("--folders", type=int, default=2,
+                            help="APPLE folders to spread assets across")
+    parser.add_argument("--years", type=int, default=3,
+                            help="years in pre-populated Organized tree")
+    parser.add_argument("--files-per-month", type=int, default=50)
+    parser.add_argument("--photo-kb", type=int, default=64)
+    parser.add_argument("--video-kb", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=2020)
+    parser.add_argument("--work-dir", help="build tree here instead of a "
+                                                "temp dir (left in place)")
+    bench_util.add_baseline_args(parser)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_organize_")
+    try:
+        bu_root, buffer_root, file_count = build_tree(work_dir, args)
+        bench_util.use_dir_names(IPHONE_BU_ROOT=bu_root)
+        import date_organize_tool
+
+        bytes_before = bench_util.tree_bytes(bu_root)
+        with bench_util.NonInteractive() as prompts, \
+             bench_util.IOCounters() as counters, \
+             bench_util.Timer() as timer:
+            orgg = date_organize_tool.OrganizedGroup(bu_root, buffer_root)
+            orgg.run_org()
+
+        metrics = {"wall_s": timer.elapsed,
+                   "files": file_count,
+                   "files_per_s": file_count / timer.elapsed,
+                   "bytes_written": bench_util.tree_bytes(bu_root) - bytes_before,
+                   "prompts": prompts.prompts}
+        metrics.update(counters.as_dict())
+        result = {"benchmark": "organize",
+                  "git_rev": bench_util.git_rev(),
+                  "params": {key: val for key, val in vars(args).items()
+                                    if key not in ["save", "compare", "work_dir"]},
+                  "metrics": metrics}
+        bench_util.finish(result, args)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
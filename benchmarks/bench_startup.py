@@ -0,0 +1,103 @@
+"""Benchmark of program startup: time to import each entry module.
+
+Runs `python -X importtime -c "import <module>"` --runs times per module in a
+fresh interpreter (so nothing is cached in-process) and takes the median of
+the module's cumulative import time. Quick commands (--help, datestamp, sync,
+sync history) shouldn't pay for PIL, NumPy, exiftool, or the process pool,
+which are loaded on first use (see optional_deps.py). Exits with an error if
+any module in --budget-modules takes longer than --budget-ms.
+
+Example:
+    python benchmarks/bench_startup.py --save startup_base
+"""
+import os
+import re
+import sys
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import bench_util
+
+MODULES = ["full_bu", "date_compare", "prompt_policy", "nas_sync",
+           "rsync_history", "pic_offload_tool", "date_organize_tool",
+           "pic_categorize_tool", "batch_datestamp"]
+# Modules behind the quick commands, held to --budget-ms.
+BUDGET_MODULES = ["full_bu", "date_compare", "prompt_policy", "nas_sync",
+                  "rsync_history", "batch_datestamp"]
+
+# e.g. "import time:       255 |      23057 | full_bu"
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| (\S+)$")
+
+
+def write_dir_names(stub_dir):
+    """dir_names.py stand-in (see bench_util.use_dir_names) for the
+    subprocesses, which can't see the one installed in this process."""
+    dir_names = bench_util.use_dir_names()
+    with open(os.path.join(stub_dir, "dir_names.py"), "w") as stub_file:
+        for attr_name in sorted(vars(dir_names)):
+            if attr_name.isupper():
+                stub_file.write("%s = %r\n" % (attr_name,
+                                            getattr(dir_names, attr_name)))
+
+
+def import_ms(module_name, env):
+    """Cumulative import time of module_name in a new interpreter, in ms."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                        "import %s" % module_name], cwd=bench_util.REPO_ROOT,
+                        env=env, stdout=subprocess.DEVNULL,
+                        stderr=subprocess.PIPE)
+    if proc.returncode:
+        raise SystemExit("Importing %s failed:\n%s" % (module_name,
+                                    proc.stderr.decode(errors="replace")))
+    for line in proc.stderr.decode().splitlines():
+        match = IMPORTTIME_PATTERN.match(line.strip())
+        if match and match.group(2) == module_name:
+            return int(match.group(1)) / 1000
+    raise SystemExit("No import time reported for %s" % module_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=50,
+                help="max median import time of each budget module")
+    parser.add_argument("--budget-modules", nargs="*", default=BUDGET_MODULES)
+    parser.add_argument("--modules", nargs="*", default=MODULES)
+    bench_util.add_baseline_args(parser)
+    args = parser.parse_args()
+
+    stub_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    write_dir_names(stub_dir)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([stub_dir, bench_util.REPO_ROOT]
+                            + [path for path in [env.get("PYTHONPATH")] if path])
+    # Warm-up run, so .pyc writes aren't measured.
+    for module_name in args.modules:
+        import_ms(module_name, env)
+
+    metrics = {}
+    for module_name in args.modules:
+        metrics["%s_ms" % module_name] = statistics.median(
+                import_ms(module_name, env) for run in range(args.runs))
+    os.remove(os.path.join(stub_dir, "dir_names.py"))
+    os.rmdir(stub_dir)
+
+    result = {"benchmark": "startup",
+              "git_rev": bench_util.git_rev(),
+              "params": {"runs": args.runs, "budget_ms": args.budget_ms,
+                         "python": sys.version.split()[0]},
+              "metrics": metrics}
+    bench_util.finish(result, args)
+
+    over_budget = [module_name for module_name in args.budget_modules
+                   if metrics.get("%s_ms" % module_name, 0) > args.budget_ms]
+    if over_budget:
+        raise SystemExit("Over %.0f ms startup budget: %s"
+                                % (args.budget_ms, ", ".join(over_budget)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark of categorization target suggestions (target_index.TargetIndex).
+
+Records --decisions synthetic decisions spread over --dirs target dirs (plus
+CAT_DIRS keys) and --days days, then times suggest() for each of --queries
+image names and lookup() for keywords matching many dirs. The index is kept
+in a temp dir, so the real history isn't touched.
+
+Example:
+    python benchmarks/bench_target_index.py --dirs 5000 --save targets_base
+"""
+import os
+import random
+import argparse
+import tempfile
+
+import bench_util
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                            formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dirs", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=2000)
+    parser.add_argument("--decisions", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    bench_util.add_baseline_args(parser)
+    args = parser.parse_args()
+
+    import target_index
+
+    rng = random.Random(args.seed)
+    cat_dirs = {key: "/nonexistent/%s/" % key for key in ["f", "t", "ss", "sr"]}
+    targets = list(cat_dirs.values()) + ["/nonexistent/archive/dir_%05d/" % n
+                                                    for n in range(args.dirs)]
+    patterns = ["IMG_%04d.JPG", "IMG_E%04d.JPG", "IMG_%04d.HEIC",
+                "IMG_%04d.MOV", "IMG_%04d.PNG"]
+
+    def img_name():
+        return "2020-%02d-%02d_%s" % (rng.randint(1, 12),
+                            rng.randint(1, 28) + rng.randint(0, args.days) % 3,
+                            rng.choice(patterns) % rng.randint(0, 9999))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index_path = os.path.join(temp_dir, "targets.json")
+        targets_index = target_index.TargetIndex(cat_dirs, index_path)
+        with bench_util.Timer() as record_timer:
+            for n in range(args.decisions):
+                targets_index.record(img_name(), rng.choice(targets),
+                                                        now=1.6e9 + n * 60)
+        with bench_util.Timer() as save_timer:
+            targets_index.save()
+        with bench_util.Timer() as load_timer:
+            targets_index = target_index.TargetIndex(cat_dirs, index_path)
+
+        query_names = [img_name() for n in range(args.queries)]
+        with bench_util.Timer() as suggest_timer:
+            for name in query_names:
+                targets_index.suggest(name)
+
+        keywords = ["dir_%d" % n for n in range(100)]
+        with bench_util.Timer() as lookup_timer:
+            for keyword in keywords:
+                targets_index.lookup(keyword)
+
+    metrics = {"suggest_us": suggest_timer.elapsed / args.queries * 1e6,
+               "lookup_uncached_us": lookup_timer.elapsed / len(keywords) * 1e6,
+               "record_us": record_timer.elapsed / args.decisions * 1e6,
+               "save_s": save_timer.elapsed,
+               "load_s": load_timer.elapsed}
+    result = {"benchmark": "target_index",
+              "git_rev": bench_util.git_rev(),
+              "params": {"dirs": args.dirs, "days": args.days,
+                         "decisions": args.decisions, "queries": args.queries,
+                         "seed": args.seed},
+              "metrics": metrics}
+    bench_util.finish(result, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Shared helpers for the benchmark scripts in this folder: I/O counters,
+non-interactive patching of the tools, and JSON baseline save/compare.
+
+Benchmarks are run directly, e.g.:
+    python benchmarks/bench_organize.py --save my_baseline
+    python benchmarks/bench_organize.py --compare my_baseline
+"""
+import os
+import sys
+import json
+import time
+import types
+import builtins
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def use_dir_names(**paths):
+    """dir_names.py holds each user's local paths and isn't part of the repo.
+    Point the tools at the benchmark's temp tree instead by installing a
+    stand-in module before they're imported."""
+    dir_names = types.ModuleType("dir_names")
+    dir_names.IPHONE_DCIM_PREFIX = paths.get("IPHONE_DCIM_PREFIX", "/nonexistent/")
+    dir_names.IPHONE_BU_ROOT = paths.get("IPHONE_BU_ROOT", "/nonexistent/")
+    dir_names.IPAD_BU_ROOT = paths.get("IPAD_BU_ROOT", "/nonexistent/")
+    dir_names.ST_VID_ROOT = paths.get("ST_VID_ROOT", "/nonexistent/")
+    dir_names.NAS_BU_ROOT = paths.get("NAS_BU_ROOT", "/nonexistent/")
+    dir_names.NAS_ST_DIR = paths.get("NAS_ST_DIR", "/nonexistent/")
+    dir_names.SSH_PORT = paths.get("SSH_PORT", 22)
+    dir_names.CAT_DIRS = paths.get("CAT_DIRS", {})
+    sys.modules["dir_names"] = dir_names
+    return dir_names
+
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                    cwd=REPO_ROOT, stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL).stdout.decode().strip()
+    except OSError:
+        return None
+
+
+def tree_bytes(root):
+    """Total size of all files under root."""
+    total = 0
+    for dir_path, dir_names, file_names in os.walk(root):
+        for file_name in file_names:
+            total += os.path.getsize(os.path.join(dir_path, file_name))
+    return total
+
+
+class IOCounters(object):
+    """Counts os.listdir calls and exiftool commands/processes while active.
+    Use as a context manager around the code being measured."""
+    def __init__(self):
+        self.listdir_calls = 0
+        self.exiftool_invocations = 0
+        self.exiftool_processes = 0
+        self._restore = []
+
+    def _wrap(self, owner, attr_name, counter_name):
+        orig = getattr(owner, attr_name, None)
+        if orig is None:
+            return
+
+        def counted(*args, **kwargs):
+            setattr(self, counter_name, getattr(self, counter_name) + 1)
+            return orig(*args, **kwargs)
+
+        setattr(owner, attr_name, counted)
+        self._restore.append((owner, attr_name, orig))
+
+    def __enter__(self):
+        self._wrap(os, "listdir", "listdir_calls")
+        try:
+            import exiftool
+        except ImportError:
+            exiftool = None
+        if exiftool:
+            # Every metadata request (single or batch) goes through execute().
+            self._wrap(exiftool.ExifTool, "execute", "exiftool_invocations")
+            self._wrap(exiftool.ExifTool, "start", "exiftool_processes")
+        return self
+
+    def __exit__(self, *exc_info):
+        for owner, attr_name, orig in reversed(self._restore):
+            setattr(owner, attr_name, orig)
+        self._restore = []
+
+    def as_dict(self):
+        return {"listdir_calls": self.listdir_calls,
+                "exiftool_invocations": self.exiftool_invocations,
+                "exiftool_processes": self.exiftool_processes}
+
+
+class NonInteractive(object):
+    """Answers every input() prompt with a fixed response (default: accept
+    the fallback) and stops the tools from opening image viewers."""
+    def __init__(self, response=""):
+        self.response = response
+        self.prompts = 0
+        self._restore = []
+
+    def __enter__(self):
+        def answer(prompt=""):
+            self.prompts += 1
+            return self.response
+
+        self._restore.append((builtins, "input", builtins.input))
+        builtins.input = answer
+
+        for mod_name in ["pic_categorize_tool", "date_compare"]:
+            mod = sys.modules.get(mod_name)
+            for attr_name in ["os_open", "display_photo", "display_dir"]:
+                if mod and hasattr(mod, attr_name):
+                    self._restore.append((mod, attr_name,
+                                                    getattr(mod, attr_name)))
+                    setattr(mod, attr_name, lambda *args, **kwargs: None)
+        return self
+
+    def __exit__(self, *exc_info):
+        for owner, attr_name, orig in reversed(self._restore):
+            setattr(owner, attr_name, orig)
+        self._restore = []
+
+
+class Timer(object):
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def baseline_path(name):
+    if name.endswith(".json") or os.sep in name:
+        return name
+    return os.path.join(BASELINE_DIR, name + ".json")
+
+
+def save_baseline(result, name):
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as baseline_file:
+        json.dump(result, baseline_file, indent=2, sort_keys=True)
+    print("Saved baseline to %s" % path)
+
+
+def compare_baseline(result, name):
+    """Prints each numeric metric next to the saved baseline's value."""
+    with open(baseline_path(name)) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    print("\nCompared to baseline %s (rev %s):"
+                                        % (name, baseline.get("git_rev")))
+    for key in sorted(result["metrics"]):
+        new_val = result["metrics"][key]
+        old_val = baseline.get("metrics", {}).get(key)
+        if isinstance(old_val, (int, float)) and old_val:
+            change = "%+.1f%%" % ((new_val - old_val) / old_val * 100)
+        else:
+            change = "n/a"
+        print("    %-24s %12s -> %-12s (%s)" % (key, fmt(old_val),
+                                                        fmt(new_val), change))
+
+
+def fmt(val):
+    if isinstance(val, float):
+        return "%.3f" % val
+    return str(val)
+
+
+def report(result):
+    print("\n%s benchmark (rev %s):" % (result["benchmark"], result["git_rev"]))
+    for key in sorted(result["params"]):
+        print("    %-24s %s" % (key, result["params"][key]))
+    print()
+    for key in sorted(result["metrics"]):
+        print("    %-24s %s" % (key, fmt(result["metrics"][key])))
+
+
+def add_baseline_args(parser):
+    parser.add_argument("--save", metavar="NAME",
+                help="save result as JSON baseline (name or path)")
+    parser.add_argument("--compare", metavar="NAME",
+                help="compare result against a saved JSON baseline")
+
+
+def finish(result, args):
+    """Report a result dict, then save and/or compare it as requested."""
+    report(result)
+    if args.compare:
+        compare_baseline(result, args.compare)
+    if args.save:
+        save_baseline(result, args.save)
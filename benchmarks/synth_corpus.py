@@ -0,0 +1,262 @@
+"""Generates a reproducible corpus of small iPhone-style media files with real
+embedded date tags that exiftool reads the same way it reads device files:
+    JPG   EXIF:DateTimeOriginal (+ optional EXIF:ImageDescription comment)
+    HEIC  EXIF:DateTimeOriginal in an Exif item
+    PNG   XMP:DateCreated (+ XMP:UserComment "Screenshot")
+    MOV   QuickTime:CreationDate (Keys) and QuickTime:CreateDate
+    MP4   QuickTime:CreateDate
+    AAE   PLIST:AdjustmentTimestamp
+Image data is filler, so files are not viewable, but sizes are configurable.
+"""
+import os
+import time
+import zlib
+import struct
+import calendar
+
+
+# Seconds between 1904-01-01 (QuickTime epoch) and 1970-01-01.
+QT_EPOCH_OFFSET = 2082844800
+
+# Screen sizes used for screenshot PNGs.
+SCREEN_SIZES = [(750, 1334), (1125, 2436), (828, 1792)]
+
+
+def filler(size):
+    """Deterministic stand-in for image/video data so corpus is reproducible."""
+    size = max(0, size)
+    return (bytes(range(256)) * (size // 256 + 1))[:size]
+
+
+def exif_time(time_struct):
+    return time.strftime("%Y:%m:%d %H:%M:%S", time_struct)
+
+
+def tiff_block(time_struct, description=None):
+    """Big-endian TIFF structure holding IFD0 (optional ImageDescription) and
+    an Exif IFD with DateTimeOriginal and CreateDate."""
+    date_bytes = exif_time(time_struct).encode() + b"\0"     # 20 bytes
+    ifd0_entries = []
+    if description:
+        ifd0_entries.append((0x010E, 2, description.encode() + b"\0"))
+    ifd0_entries.append((0x8769, 4, None))    # Exif IFD pointer
+    exif_entries = [(0x9003, 2, date_bytes), (0x9004, 2, date_bytes)]
+
+    def ifd_size(entries):
+        return 2 + 12 * len(entries) + 4
+
+    def data_size(entries):
+        return sum(len(value) for tag, typ, value in entries
+                                        if value is not None and len(value) > 4)
+
+    ifd0_offset = 8
+    exif_offset = ifd0_offset + ifd_size(ifd0_entries) + data_size(ifd0_entries)
+
+    def pack_ifd(entries, offset, exif_pointer=None):
+        data_offset = offset + ifd_size(entries)
+        head = struct.pack(">H", len(entries))
+        data = b""
+        for tag, typ, value in entries:
+            if value is None:
+                head += struct.pack(">HHII", tag, typ, 1, exif_pointer)
+            elif len(value) <= 4:
+                head += struct.pack(">HHI", tag, typ,
+                                        len(value)) + value.ljust(4, b"\0")
+            else:
+                head += struct.pack(">HHII", tag, typ, len(value),
+                                                    data_offset + len(data))
+                data += value
+        return head + struct.pack(">I", 0) + data
+
+    return (b"MM\0*" + struct.pack(">I", ifd0_offset)
+            + pack_ifd(ifd0_entries, ifd0_offset, exif_offset)
+            + pack_ifd(exif_entries, exif_offset))
+
+
+def make_jpeg(time_struct, size, description=None):
+    exif = b"Exif\0\0" + tiff_block(time_struct, description)
+    app1 = b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif
+    body = b"\xff\xd8" + app1 + b"\xff\xd9"
+    return body + filler(size - len(body))
+
+
+def box(box_type, payload):
+    return struct.pack(">I", len(payload) + 8) + box_type + payload
+
+
+def full_box(box_type, payload, version=0, flags=0):
+    return box(box_type, struct.pack(">I", (version << 24) | flags) + payload)
+
+
+def make_heic(time_struct, size, description=None):
+    exif_payload = struct.pack(">I", 6) + b"Exif\0\0" + tiff_block(time_struct,
+                                                                description)
+    image_payload = filler(max(16, size - len(exif_payload) - 300))
+
+    ftyp = box(b"ftyp", b"heic" + struct.pack(">I", 0) + b"mif1heic")
+    hdlr = full_box(b"hdlr", struct.pack(">I", 0) + b"pict" + b"\0" * 13)
+    pitm = full_box(b"pitm", struct.pack(">H", 1))
+    iinf = full_box(b"iinf", struct.pack(">H", 2)
+            + full_box(b"infe", struct.pack(">HH", 1, 0) + b"hvc1\0", 2)
+            + full_box(b"infe", struct.pack(">HH", 2, 0) + b"Exif\0", 2))
+
+    def build(mdat_offset):
+        # iloc v0: 4-byte offsets and lengths, no base offset.
+        iloc = full_box(b"iloc", bytes([0x44, 0x00]) + struct.pack(">H", 2)
+                + struct.pack(">HHHII", 1, 0, 1, mdat_offset + 8,
+                                                        len(image_payload))
+                + struct.pack(">HHHII", 2, 0, 1,
+                    mdat_offset + 8 + len(image_payload), len(exif_payload)))
+        return ftyp + full_box(b"meta", hdlr + pitm + iinf + iloc)
+
+    # iloc size doesn't depend on offset values, so lay out once to measure.
+    mdat_offset = len(build(0))
+    return build(mdat_offset) + box(b"mdat", image_payload + exif_payload)
+
+
+def mvhd(time_struct):
+    qt_time = calendar.timegm(time_struct) + QT_EPOCH_OFFSET
+    matrix = struct.pack(">9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+    return full_box(b"mvhd", struct.pack(">IIII", qt_time, qt_time, 600, 600)
+                    + struct.pack(">IH", 0x10000, 0x100) + b"\0" * 10 + matrix
+                    + b"\0" * 24 + struct.pack(">I", 2))
+
+
+def make_mov(time_struct, size, utc_offset="-04:00"):
+    creation_date = (time.strftime("%Y-%m-%dT%H:%M:%S", time_struct)
+                                                        + utc_offset).encode()
+    key = b"com.apple.quicktime.creationdate"
+    # Apple's moov/meta is a plain (not full) box.
+    meta = box(b"meta",
+            full_box(b"hdlr", struct.pack(">I", 0) + b"mdta" + b"\0" * 13)
+            + full_box(b"keys", struct.pack(">I", 1)
+                        + struct.pack(">I", len(key) + 8) + b"mdta" + key)
+            + box(b"ilst", box(struct.pack(">I", 1),
+                    box(b"data", struct.pack(">II", 1, 0) + creation_date))))
+    # mvhd times are UTC, so convert the local capture time back.
+    utc_struct = time.gmtime(calendar.timegm(time_struct) + 4 * 3600)
+    head = (box(b"ftyp", b"qt  " + struct.pack(">I", 0) + b"qt  ")
+                                + box(b"moov", mvhd(utc_struct) + meta))
+    return head + box(b"mdat", filler(size - len(head) - 8))
+
+
+def make_mp4(time_struct, size):
+    # MP4 QuickTime:CreateDate is UTC (organizer shifts it back 4 hrs).
+    utc_struct = time.gmtime(calendar.timegm(time_struct) + 4 * 3600)
+    head = (box(b"ftyp", b"mp42" + struct.pack(">I", 1) + b"mp41mp42isom")
+                                                + box(b"moov", mvhd(utc_struct)))
+    return head + box(b"mdat", filler(size - len(head) - 8))
+
+
+def png_chunk(chunk_type, data):
+    return (struct.pack(">I", len(data)) + chunk_type + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+_idat_cache = {}
+
+def make_png(time_struct, dims, screenshot=True):
+    width, height = dims
+    xmp = ('<x:xmpmeta xmlns:x="adobe:ns:meta/" x:xmptk="XMP Core 5.4.0">'
+        '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        '<rdf:Description rdf:about=""'
+        ' xmlns:photoshop="http://ns.adobe.com/photoshop/1.0/"'
+        ' xmlns:exif="http://ns.adobe.com/exif/1.0/">'
+        '<photoshop:DateCreated>%s</photoshop:DateCreated>'
+        '%s</rdf:Description></rdf:RDF></x:xmpmeta>'
+        % (time.strftime("%Y-%m-%dT%H:%M:%S", time_struct),
+           '<exif:UserComment><rdf:Alt><rdf:li xml:lang="x-default">'
+           'Screenshot</rdf:li></rdf:Alt></exif:UserComment>'
+                                                    if screenshot else ""))
+    itxt = b"XML:com.adobe.xmp\0\0\0\0\0" + xmp.encode()
+    if dims not in _idat_cache:
+        # Solid grey image. Compresses to almost nothing.
+        raw_rows = (b"\0" + b"\x80" * (width * 3)) * height
+        _idat_cache[dims] = zlib.compress(raw_rows)
+    return (b"\x89PNG\r\n\x1a\n"
+            + png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height,
+                                                            8, 2, 0, 0, 0))
+            + png_chunk(b"iTXt", itxt)
+            + png_chunk(b"IDAT", _idat_cache[dims])
+            + png_chunk(b"IEND", b""))
+
+
+def make_aae(time_struct):
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" '
+        '"http://www.apple.com/DTDs/PropertyList-1.0.dtd">\n'
+        '<plist version="1.0">\n<dict>\n'
+        '\t<key>adjustmentBaseVersion</key>\n\t<integer>0</integer>\n'
+        '\t<key>adjustmentEditorBundleID</key>\n'
+        '\t<string>com.apple.mobileslideshow</string>\n'
+        '\t<key>adjustmentFormatIdentifier</key>\n'
+        '\t<string>com.apple.photo</string>\n'
+        '\t<key>adjustmentFormatVersion</key>\n\t<string>1.4</string>\n'
+        '\t<key>adjustmentTimestamp</key>\n\t<date>%s</date>\n'
+        '</dict>\n</plist>\n'
+        % time.strftime("%Y-%m-%dT%H:%M:%SZ", time_struct)).encode()
+
+
+def write_file(path, data):
+    with open(path, "wb") as out_file:
+        out_file.write(data)
+
+
+def make_apple_folder(folder_path, first_num, count, start_time, rng,
+                                            photo_kb=64, video_kb=256):
+    """Writes `count` assets into folder_path, numbered from first_num, with
+    capture times increasing from start_time (epoch seconds, local).
+    Mix per asset: Live Photo HEIC+MOV, JPG (some with comments), screenshot
+    PNG, MP4, standalone MOV. Some get an IMG_E edit and AAE sidecar.
+    Returns list of file names written."""
+    os.makedirs(folder_path, exist_ok=True)
+    written = []
+    capture_time = start_time
+    for num in range(first_num, first_num + count):
+        capture_time += rng.randint(20, 3600)
+        time_struct = time.localtime(capture_time)
+        stem = "IMG_%04d" % (num % 10000)
+        roll = rng.random()
+
+        if roll < 0.45:
+            files = {stem + ".HEIC": make_heic(time_struct, photo_kb * 1024),
+                     stem + ".MOV": make_mov(time_struct, video_kb * 256)}
+        elif roll < 0.65:
+            description = "Job site visit %d" % num if rng.random() < 0.3 else None
+            files = {stem + ".JPG": make_jpeg(time_struct, photo_kb * 1024,
+                                                                description)}
+        elif roll < 0.75:
+            files = {stem + ".PNG": make_png(time_struct,
+                                                rng.choice(SCREEN_SIZES))}
+        elif roll < 0.85:
+            files = {stem + ".MP4": make_mp4(time_struct, video_kb * 1024)}
+        else:
+            files = {stem + ".MOV": make_mov(time_struct, video_kb * 1024)}
+
+        if roll < 0.65 and rng.random() < 0.15:
+            # Edited in Photos app: IMG_E copy of the still plus AAE sidecar.
+            edit_time = time.localtime(capture_time + rng.randint(60, 86400))
+            for name in list(files):
+                if os.path.splitext(name)[-1] in [".HEIC", ".JPG"]:
+                    edit_name = "IMG_E" + name[4:]
+                    files[edit_name] = files[name]
+            files[stem + ".AAE"] = make_aae(edit_time)
+
+        for name, data in files.items():
+            write_file(os.path.join(folder_path, name), data)
+            written.append(name)
+    return written
+
+
+def make_organized_tree(org_root, years, files_per_month, rng):
+    """Pre-populates an Organized/ tree with datestamped placeholder files for
+    every month of each year in `years`."""
+    for year in years:
+        for month in range(1, 13):
+            mo_path = os.path.join(org_root, str(year), "%d-%02d" % (year, month))
+            os.makedirs(mo_path, exist_ok=True)
+            for n in range(files_per_month):
+                day = rng.randint(1, 28)
+                name = "%d-%02d-%02d_IMG_%04d.JPG" % (year, month, day,
+                                                        rng.randint(0, 9999))
+                write_file(os.path.join(mo_path, name), b"\xff\xd8\xff\xd9")
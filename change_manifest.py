@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+
+
+# Record of files this program created, moved, or deleted under each tree
+# that gets synced to the NAS (Raw_Offload/, Organized/, st video dir), so the
+# NAS sync only has to look at those paths instead of comparing whole trees.
+# Each tracked root has its own manifest dir next to its rsync_logs/:
+#   <root parent>/rsync_manifests/<root name>/<run timestamp>.txt
+# with one line per change ("C" created, "D" deleted, then the path relative
+# to root). Lines are written as changes happen, so a crash before the sync
+# leaves them for the next run's sync. A sync takes all manifest files for its
+# root (starting a new file for changes made during the sync) and deletes
+# them only once the sync succeeds. A streaming sync (queued as each folder is
+# finished) calls rotate() when queued, so it syncs only changes made up to
+# that point.
+
+class ChangeManifest(object):
+    """Per-run change log for tracked roots. Safe to share between threads.
+    Changes outside tracked roots are ignored."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.roots = {}         # root path (trailing slash) -> manifest dir
+        self.files = {}         # root path -> open manifest file for this run
+        self.run_stamp = time.strftime("%Y-%m-%dT%H%M%S")
+        self.rotations = 0
+
+    @staticmethod
+    def manifest_dir(root):
+        root = root.rstrip("/")
+        return "%s/rsync_manifests/%s/" % (os.path.dirname(root),
+                                                        os.path.basename(root))
+
+    def track(self, root):
+        root = os.path.abspath(root).rstrip("/") + "/"
+        with self.lock:
+            self.roots[root] = self.manifest_dir(root)
+
+    def find_root(self, path):
+        path = os.path.abspath(path)
+        for root in self.roots:
+            if path.startswith(root):
+                return root, path[len(root):]
+        return None, None
+
+    def record(self, change, path):
+        root, rel_path = self.find_root(path)
+        if not root:
+            return
+        with self.lock:
+            if root not in self.files:
+                os.makedirs(self.roots[root], exist_ok=True)
+                self.files[root] = open("%s%s_%d.txt" % (self.roots[root],
+                                        self.run_stamp, self.rotations), "a")
+            self.files[root].write("%s\t%s\n" % (change, rel_path))
+            self.files[root].flush()
+
+    def created(self, path):
+        self.record("C", path)
+
+    def deleted(self, path):
+        self.record("D", path)
+
+    def moved(self, src_path, dest_path):
+        self.record("D", src_path)
+        self.record("C", dest_path)
+
+    def rotate(self, root):
+        """Close root's current manifest file (later changes go to a new one).
+        Returns list of all closed manifest files for root, including from
+        earlier runs whose sync didn't finish."""
+        root = os.path.abspath(root).rstrip("/") + "/"
+        with self.lock:
+            if root not in self.roots:
+                return []
+            if root in self.files:
+                self.files.pop(root).close()
+                self.rotations += 1
+            manifest_dir = self.roots[root]
+            if not os.path.isdir(manifest_dir):
+                return []
+            return [manifest_dir + name for name in
+                        sorted(os.listdir(manifest_dir)) if name.endswith(".txt")]
+
+    def take(self, root, manifest_files=None):
+        """Returns (manifest files, set of changed paths relative to root)
+        for manifest_files, or for all changes recorded for root so far if
+        None (see rotate())."""
+        if manifest_files is None:
+            manifest_files = self.rotate(root)
+
+        rel_paths = set()
+        for manifest_file in manifest_files:
+            if not os.path.exists(manifest_file):
+                # Already synced by another job.
+                continue
+            with open(manifest_file) as manifest:
+                for line in manifest:
+                    change, tab, rel_path = line.rstrip("\n").partition("\t")
+                    if rel_path:
+                        rel_paths.add(rel_path)
+        return manifest_files, rel_paths
+
+    def done(self, manifest_files):
+        """Discard manifest files whose changes are now synced."""
+        for manifest_file in manifest_files:
+            if os.path.exists(manifest_file):
+                os.remove(manifest_file)
+
+
+MANIFEST = ChangeManifest()
@@ -1,11 +1,12 @@
-import PIL.Image
-# https://stackoverflow.com/questions/11911480/python-pil-has-no-attribute-image
-from PIL.ExifTags import TAGS
 import os
 import time
-import exiftool
+import contextlib
+# PIL and exiftool are imported in the functions that use them, so importing
+# this module stays fast.
 
-from pic_categorize_tool import copy_to_target, display_photo
+from dir_index import DIR_INDEX
+from change_manifest import MANIFEST
+from prompt_policy import POLICY
 
 
 # class ImgTypeError(Exception):
@@ -17,6 +18,11 @@ class DirectoryNameError(Exception):
 DATETIME_FORMAT = "%Y-%m-%dT%H%M%S"  # Global format
 DATE_FORMAT = "%Y-%m-%d"  # Global format
 
+# File types a creation time can be read from, in order of preference when
+# several files belong to the same picture (e.g. Live Photo HEIC + MOV).
+DATE_SOURCE_RANK = [".HEIC", ".JPG", ".JPEG", ".MOV", ".PNG", ".MP4", ".GIF",
+                                                                    ".AAE"]
+
 
 def list_all_img_dates(path, skip_unknown=True, rename_with_datestamp=False):
     """Function that takes either a directory or single image path and prints
@@ -25,6 +31,10 @@ def list_all_img_dates(path, skip_unknown=True, rename_with_datestamp=False):
     Optional argument allows the creation timestamp to be prepended to image(s)
     as they are processed.
     datestamp_all() function below now preferred."""
+    # https://stackoverflow.com/questions/11911480/python-pil-has-no-attribute-image
+    import PIL.Image
+    import PIL.ExifTags
+    import exiftool
 
     if not os.path.exists(path):
         print("Not a valid path.")
@@ -261,87 +271,90 @@ def add_datestamp(img_path, long_stamp=False):
         raise DirectoryNameError("Invalid path passed to add_datestamp() "
                                                                     "function.")
 
-    # Separate out image name from directory path
     img_name = os.path.basename(img_path)  # no trailing slash present
-    dir_path = os.path.dirname(img_path) + "/"
 
     # See if file already datestamped (regardless of correctness)
-    if len(img_name) >= 10:
-        try:
-            time.strptime(img_name[:10], "%Y-%m-%d")
-            return
-        except ValueError:
-            pass
+    if has_datestamp(img_name):
+        return
 
     datestamp_obj = get_img_date(img_path)
-
-    if datestamp_obj:
-        datestamp_short = time.strftime("%Y-%m-%d", datestamp_obj)
-        datestamp_long = time.strftime(DATETIME_FORMAT, datestamp_obj)
-    else:
+    if not datestamp_obj:
         # if get_img_date returned None (because file wasn't a recognized img
         # format), don't proceed further.
         return
 
-    if long_stamp:
-        datestamp = datestamp_long
+    new_img_name, nonstandard = datestamp_name(img_name, datestamp_obj,
+                                                                    long_stamp)
+    if not new_img_name:
+        # Don't prepend redundant datestamp.
+        print("%s already has correct datestamp." % img_name)
+    elif not nonstandard or confirm_nonstandard(img_name, new_img_name):
+        safe_rename(img_path, new_img_name)
     else:
-        datestamp = datestamp_short
+        print("Skipped %s\n" % img_name)
+
+
+def has_datestamp(img_name):
+    """True if img_name starts with a date (regardless of correctness)."""
+    if len(img_name) >= 10:
+        try:
+            time.strptime(img_name[:10], "%Y-%m-%d")
+            return True
+        except ValueError:
+            pass
+    return False
+
+
+def datestamp_name(img_name, datestamp_obj, long_stamp=False):
+    """Function that works out the datestamped name for img_name, given its
+    creation time (struct_time). Returns a tuple of the new name (None if it
+    already has the right datestamp) and a boolean that's True if the name is
+    non-standard, so the rename needs confirming (see confirm_nonstandard())."""
+    datestamp_short = time.strftime("%Y-%m-%d", datestamp_obj)
+    datestamp_long = time.strftime(DATETIME_FORMAT, datestamp_obj)
+    datestamp = datestamp_long if long_stamp else datestamp_short
 
     if datestamp in img_name:
-        # Don't prepend redundant datestamp.
-        print("%s already has correct datestamp." % img_name)
+        return (None, False)
     elif not long_stamp and datestamp_long in img_name:
         # rename longer-stamped names when short stamp desired.
-        img_shortened = img_name.replace(datestamp_long, datestamp_short)
-        safe_rename(img_path, img_shortened)
+        return (img_name.replace(datestamp_long, datestamp_short), False)
     elif long_stamp and datestamp_short in img_name:
         # rename shorter-stamped names when long stamp desired.
         # note that datestamp_short appears in imgs w/ datestamp_long.
-        img_lengthened = img_name.replace(datestamp_short, datestamp_long)
-        safe_rename(img_path, img_lengthened)
-    elif img_name[:4] != 'IMG_':
+        return (img_name.replace(datestamp_short, datestamp_long), False)
+    else:
         # Detect presence of non-standard naming (could be pre-existing
         # alternate datestamp)
-        rename_choice = input("%s has non-standard naming. "
-                "Add %s datestamp anyway? [y/n]\n> " % (img_name, datestamp))
-        if rename_choice and rename_choice.lower() == 'y':
-            safe_rename(img_path, datestamp + '_' + img_name)
-        else:
-            print("Skipped %s\n" % img_name)
-    else:
-        safe_rename(img_path, datestamp + '_' + img_name)
+        return (datestamp + '_' + img_name, img_name[:4] != 'IMG_')
+
+
+def confirm_nonstandard(img_name, new_img_name):
+    """Asks whether to datestamp a file with non-standard naming anyway."""
+    datestamp = new_img_name[:-len(img_name) - 1]
+    rename_choice = POLICY.ask("nonstandard_name",
+                "%s has non-standard naming. "
+            "Add %s datestamp anyway? [y/n]\n> " % (img_name, datestamp))
+    return bool(rename_choice and rename_choice.lower() == 'y')
 
 
 def safe_rename(img_path, new_img_name):
     """Ensures that rename action does not overwrite existing img in
-    target dir."""
+    target dir. Returns new path."""
 
     if not os.path.exists(img_path):
         raise DirectoryNameError("Invalid path passed to safe_rename() "
                                                                     "function.")
 
     target_dir = os.path.dirname(img_path)
-    target_dir_imgs = os.listdir(target_dir)
-
-    new_img_name_noext = os.path.splitext(new_img_name)[0]
-    img_ext = os.path.splitext(new_img_name)[-1]
-
-    if new_img_name in target_dir_imgs:
-        n = 1
-        # need to split off extension before appending increment
-        new_img_name_noext = new_img_name_noext + "_%d" % n
-
-        while new_img_name_noext + img_ext in target_dir_imgs:
-            n += 1
-            new_img_name_noext = new_img_name_noext[:-1] + "%d" % n
-            # This will not increment correctly after more than nine iterations,
-            # but that would require nine instances of the same img name taken
-            # on the same date, which is very unlikely.
-
-        new_img_name = new_img_name_noext + img_ext
+    # Appends "_1", "_2", etc. (before extension) if name already taken.
+    new_img_name = DIR_INDEX.next_free_name(target_dir, new_img_name)
 
     os.rename(img_path, target_dir + "/" + new_img_name)
+    DIR_INDEX.discard(target_dir, os.path.basename(img_path))
+    DIR_INDEX.add(target_dir, new_img_name)
+    MANIFEST.moved(img_path, target_dir + "/" + new_img_name)
+    return target_dir + "/" + new_img_name
 
 
 def get_img_date_plus(img_path, skip_unknown=True):
@@ -349,6 +362,7 @@ def get_img_date_plus(img_path, skip_unknown=True):
     GIF, PNG, AAE, MP4, or MOV file located at img_path.
     Returns a tuple with a struct_time object and boolean indicating if the time
     was manually specified or automatically found."""
+    import exiftool
     # modify to look for each metadata type and fall back on mtime if needed.
 
     if not os.path.exists(img_path):
@@ -363,76 +377,182 @@ def get_img_date_plus(img_path, skip_unknown=True):
                                     % img_name)
         return None
 
-    with exiftool.ExifTool() as et:
-        metadata = et.get_metadata(img_path)
+    if img_ext in DATE_SOURCE_RANK:
+        with exiftool.ExifTool() as et:
+            metadata = et.get_metadata(img_path)
+        create_time_obj = meta_create_time(img_path, metadata)
+    elif skip_unknown:
+        print("%s - Cannot get EXIF data for this file type. Skipping."
+                                    % img_name)
+        return None
+    else:
+        print("%s - Cannot get EXIF data for this file type. Enter new "
+                        "timestamp or fall back on fs mod time." % img_name)
+        create_time_obj = None
 
-        # Different files have different names for the creation date in the
-        # metadata.
-        if img_ext in [".JPG", ".JPEG", ".HEIC"]:
-            create_time = metadata.get("EXIF:DateTimeOriginal")
-            # ex. 2019:08:26 09:11:21
-            format = "%Y:%m:%d %H:%M:%S"
-        elif img_ext == ".PNG":
-            create_time = metadata.get("XMP:DateCreated")
-            # ex. 2019:08:26 03:51:19
-            format = "%Y:%m:%d %H:%M:%S"
-        elif img_ext == ".GIF":
-            create_time = metadata.get("File:FileModifyDate")
-            # ex. 2019:10:05 10:13:04-04:00
-            # non-standard format - adjust manually before passing to strftime
-            if create_time:
-                create_time = create_time[0:22] + create_time[23:]
-                # Now formatted this way: 2019:08:26 19:22:27-0400
-                format = "%Y:%m:%d %H:%M:%S%z"
-        elif img_ext == ".MOV":
-            create_time = metadata.get("QuickTime:CreationDate")
-            # ex. 2019:08:26 19:22:27-04:00
-            # non-standard format - adjust manually before passing to strftime
-            if create_time:
-                create_time = create_time[0:22] + create_time[23:]
-                # Now formatted this way: 2019:08:26 19:22:27-0400
-                format = "%Y:%m:%d %H:%M:%S%z"
-        elif img_ext == ".MP4":
-            create_time = metadata.get("QuickTime:CreateDate")
-            # ex. 2019:08:26 03:51:19
-            format = "%Y:%m:%d %H:%M:%S"
-
-            if create_time == "0000:00:00 00:00:00":
-                # Fall back on fs mod time (below).
-                create_time = None
-            elif create_time:
-                # MP4 metadata isn't in correct time zone.
-                create_time = tz_adjust(create_time, format, 4)
-                if not create_time:
-                    print("Changing time stamp would require date change: %s"
-                                                                % img_name)
-        elif img_ext == ".AAE":
-            create_time = metadata.get("PLIST:AdjustmentTimestamp")
-            # ex. 2019:07:05 12:46:46Z
-            format = "%Y:%m:%d %H:%M:%SZ"
+    if create_time_obj:
+        return (create_time_obj, False)
+    else:
+        return fallback_date_plus(img_path)
 
-        elif skip_unknown:
-            print("%s - Cannot get EXIF data for this file type. Skipping."
-                                        % img_name)
-            return None
-        else:
-            print("%s - Cannot get EXIF data for this file type. Enter new "
-                            "timestamp or fall back on fs mod time." % img_name)
-            create_time = None
 
+def meta_create_time(img_path, metadata):
+    """Function that picks the creation time out of exiftool metadata already
+    read for the JPG, HEIC, GIF, PNG, AAE, MP4, or MOV file at img_path.
+    Returns a struct_time object, or None if no usable timestamp found or file
+    type not recognized."""
+
+    img_name = os.path.basename(img_path)  # no trailing slash in path
+    img_ext = os.path.splitext(img_name)[-1].upper()
+
+    # Different files have different names for the creation date in the
+    # metadata.
+    if img_ext in [".JPG", ".JPEG", ".HEIC"]:
+        create_time = metadata.get("EXIF:DateTimeOriginal")
+        # ex. 2019:08:26 09:11:21
+        format = "%Y:%m:%d %H:%M:%S"
+    elif img_ext == ".PNG":
+        create_time = metadata.get("XMP:DateCreated")
+        # ex. 2019:08:26 03:51:19
+        format = "%Y:%m:%d %H:%M:%S"
+    elif img_ext == ".GIF":
+        create_time = metadata.get("File:FileModifyDate")
+        # ex. 2019:10:05 10:13:04-04:00
+        # non-standard format - adjust manually before passing to strftime
         if create_time:
-            create_time_obj = time.strptime(create_time, format)
-            return (create_time_obj, False)
-        else:
-            # Fall back on fs mod time if more precise metadata unavailable.
-            print("No valid EXIF timestamp found. Enter new timestamp or "
-                                                "fall back on fs mod time.")
-            manual_time_obj = spec_manual_time(img_path)
-            if manual_time_obj:
-                return (manual_time_obj, True)
-            else:
-                # Go ahead w/ fs mod time if user accepts fallback.
-                return (time.localtime(os.path.getmtime(img_path)), True)
+            create_time = create_time[0:22] + create_time[23:]
+            # Now formatted this way: 2019:08:26 19:22:27-0400
+            format = "%Y:%m:%d %H:%M:%S%z"
+    elif img_ext == ".MOV":
+        create_time = metadata.get("QuickTime:CreationDate")
+        # ex. 2019:08:26 19:22:27-04:00
+        # non-standard format - adjust manually before passing to strftime
+        if create_time:
+            create_time = create_time[0:22] + create_time[23:]
+            # Now formatted this way: 2019:08:26 19:22:27-0400
+            format = "%Y:%m:%d %H:%M:%S%z"
+    elif img_ext == ".MP4":
+        create_time = metadata.get("QuickTime:CreateDate")
+        # ex. 2019:08:26 03:51:19
+        format = "%Y:%m:%d %H:%M:%S"
+
+        if create_time == "0000:00:00 00:00:00":
+            # Fall back on fs mod time (below).
+            create_time = None
+        elif create_time:
+            # MP4 metadata isn't in correct time zone.
+            create_time = tz_adjust(create_time, format, 4)
+            if not create_time:
+                print("Changing time stamp would require date change: %s"
+                                                            % img_name)
+    elif img_ext == ".AAE":
+        create_time = metadata.get("PLIST:AdjustmentTimestamp")
+        # ex. 2019:07:05 12:46:46Z
+        format = "%Y:%m:%d %H:%M:%SZ"
+    else:
+        create_time = None
+
+    if create_time:
+        return time.strptime(create_time, format)
+    else:
+        return None
+
+
+def fallback_date_plus(img_path):
+    """Prompts for a manual timestamp when no valid EXIF timestamp was found
+    for img_path. Falls back on fs mod time if user enters nothing.
+    Returns a tuple like get_img_date_plus()."""
+
+    print("No valid EXIF timestamp found. Enter new timestamp or "
+                                        "fall back on fs mod time.")
+    manual_time_obj = spec_manual_time(img_path)
+    if manual_time_obj:
+        return (manual_time_obj, True)
+    else:
+        # Go ahead w/ fs mod time if user accepts fallback.
+        return (time.localtime(os.path.getmtime(img_path)), True)
+
+
+def date_source_rank(img_name):
+    """Sort key ordering sibling files (Live Photo HEIC/MOV pairs, "IMG_E"
+    edits, AAE sidecars) from most to least trustworthy source of the group's
+    capture time. Originals come before edits."""
+    img_ext = os.path.splitext(img_name)[-1].upper()
+    if img_ext in DATE_SOURCE_RANK:
+        ext_rank = DATE_SOURCE_RANK.index(img_ext)
+    else:
+        ext_rank = len(DATE_SOURCE_RANK)
+    return (img_name[:5] == "IMG_E", ext_rank, img_name)
+
+
+def exiftool_session(et=None):
+    """Context manager yielding an exiftool process. Reuses the one passed in
+    (left running) so several bulk reads can share one process."""
+    if et:
+        return contextlib.nullcontext(et)
+    else:
+        import exiftool
+        return exiftool.ExifTool()
+
+
+def get_group_dates_plus(img_groups, et=None, fallback=True, comments=None):
+    """Function that resolves one timestamp for each group of sibling files
+    passed in (list of lists of paths, each sorted by date_source_rank()).
+    All metadata is read through a single exiftool process, and only as many
+    files per group as needed to find a timestamp - normally just the first.
+    Returns a list of tuples like get_img_date_plus(), one per group.
+    With fallback False, groups w/o metadata timestamp are left None instead
+    of prompting (e.g. when called from worker threads).
+    If a comments dict is passed, it gets each group's EXIF comment (first
+    one found in the files read) keyed by group index. The first file of
+    groups w/o a date source is read too, so every group's comment is looked
+    for (any file type, like get_comment())."""
+
+    group_dates = [None] * len(img_groups)
+    # Only files exiftool can give a creation time for are candidates.
+    candidates = [[img_path for img_path in img_group
+                    if os.path.splitext(img_path)[-1].upper() in DATE_SOURCE_RANK]
+                                                    for img_group in img_groups]
+    if comments is None:
+        read_lists = candidates
+    else:
+        read_lists = [candidates[i] or [img_path for img_path in img_group[:1]
+                                                if os.path.isfile(img_path)]
+                                    for i, img_group in enumerate(img_groups)]
+    pending = [i for i in range(len(img_groups)) if read_lists[i]]
+
+    with exiftool_session(et) as et:
+        depth = 0
+        while pending:
+            # Read the next-best file of every unresolved group in one batch.
+            batch = [read_lists[i][depth] for i in pending]
+            metadata_list = et.get_metadata_batch(batch)
+
+            still_pending = []
+            for i, metadata in zip(pending, metadata_list):
+                if (comments is not None and i not in comments
+                                    and metadata.get("EXIF:ImageDescription")):
+                    comments[i] = metadata["EXIF:ImageDescription"]
+                create_time_obj = meta_create_time(read_lists[i][depth],
+                                                                    metadata)
+                if create_time_obj:
+                    group_dates[i] = (create_time_obj, False)
+                else:
+                    still_pending.append(i)
+
+            depth += 1
+            # Groups that ran out of candidates are dealt with below.
+            pending = [i for i in still_pending if depth < len(read_lists[i])]
+
+    for i, img_group in enumerate(img_groups):
+        if img_group and not group_dates[i] and fallback:
+            if not candidates[i]:
+                print("%s - Cannot get EXIF data for this file type. Enter new "
+                        "timestamp or fall back on fs mod time."
+                                            % os.path.basename(img_group[0]))
+            group_dates[i] = fallback_date_plus(img_group[0])
+
+    return group_dates
 
 
 def get_img_date(img_path, skip_unknown=True):
@@ -449,10 +569,13 @@ def spec_manual_time(img_path):
     """Prompts user to enter a timestamp for displayed pic. Returns a
     struct_time object or None if user accepts (caller-defined)
     fallback option."""
+    from pic_categorize_tool import display_photo
 
     list_all_img_dates(img_path, skip_unknown=False)
-    display_photo(img_path)
-    man_img_time = input("Manually specify timestamp in YYYY-MM-DD format or "
+    if not POLICY.has_answer("manual_date"):
+        display_photo(img_path)
+    man_img_time = POLICY.ask("manual_date",
+                "Manually specify timestamp in YYYY-MM-DD format or "
                                         "enter nothing to accept fallback.\n> ")
     if man_img_time:
         try:
@@ -482,6 +605,7 @@ def tz_adjust(time_str, format, shift):
 
 
 def get_comment(img_path):
+    import exiftool
     if not os.path.exists(img_path):
         print("Not a valid path.")
         return None
@@ -498,6 +622,7 @@ def get_comment(img_path):
 
 def meta_dump(img_path):
     """Display all available exiftool data (for any file w/ EXIF data)."""
+    import exiftool
 
     if not os.path.exists(img_path):
         print("Not a valid path.")
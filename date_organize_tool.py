@@ -1,10 +1,14 @@
 import os
+import re
 import time
 from tqdm import tqdm
 
 import date_compare
+from dir_index import SortedNames
 from pic_categorize_tool import copy_to_target
 from pic_offload_tool import RawOffloadGroup
+from change_manifest import MANIFEST
+from prompt_policy import POLICY
 
 
 
@@ -12,6 +16,140 @@ class OrganizeFolderError(Exception):
     pass
 
 
+def img_num(img_name):
+    """Returns the image number shared by sibling files of one picture, e.g.
+    "1234" for IMG_1234.HEIC, IMG_1234.MOV, IMG_E1234.HEIC and IMG_1234.AAE.
+    Files not following iOS naming are their own group (name returned)."""
+    if img_name[:4] == "IMG_":
+        return os.path.splitext(img_name)[0][-4:]
+    else:
+        return img_name
+
+
+def is_sidecar(img_name):
+    """AAE files only hold edit settings. They stay in raw offload."""
+    return ".AAE" in img_name
+
+
+def group_siblings(img_names):
+    """Groups names from an APPLE folder by image number so Live Photo pairs,
+    edits, and AAE sidecars can be dated and placed together. Returns list of
+    lists of names. Each group is sorted best date source first. Groups of
+    only AAE sidecars are left out, since nothing in them gets organized."""
+    groups = {}
+    for img_name in img_names:
+        groups.setdefault(img_num(img_name), []).append(img_name)
+
+    return [sorted(group, key=date_compare.date_source_rank)
+                    for group in groups.values()
+                    if [img_name for img_name in group
+                                            if not is_sidecar(img_name)]]
+
+
+def replaced_originals(img_names):
+    """Names of originals in a sibling group that an "IMG_E" edit in the same
+    group replaces. Each edit replaces one original: the one with the same
+    extension if there is one (e.g. Live Photo edit IMG_E1234.HEIC replaces
+    IMG_1234.HEIC, not IMG_1234.MOV), else the best date source (e.g. edit
+    saved as IMG_E1234.JPG replaces IMG_1234.HEIC)."""
+    originals = [img_name for img_name in img_names
+                    if img_name[:5] != "IMG_E" and not is_sidecar(img_name)]
+    edits = [img_name for img_name in img_names
+                    if img_name[:5] == "IMG_E" and not is_sidecar(img_name)]
+
+    def ext(img_name):
+        return os.path.splitext(img_name)[-1].upper()
+
+    replaced = set()
+    unmatched = []
+    for edit in edits:
+        same_ext = [img_name for img_name in originals
+                    if ext(img_name) == ext(edit) and img_name not in replaced]
+        if same_ext:
+            replaced.add(same_ext[0])
+        else:
+            unmatched.append(edit)
+    for edit in unmatched:
+        remaining = [img_name for img_name in originals
+                                                if img_name not in replaced]
+        if remaining:
+            replaced.add(remaining[0])
+    return replaced
+
+
+def format_comment(img_comment):
+    """Makes an EXIF comment usable as part of a file name."""
+    # https://stackoverflow.com/questions/1976007/what-characters-are-forbidden-in-windows-and-linux-directory-names
+    # Only character not allowed in UNIX filename is the forward slash.
+    # But I also don't like spaces.
+    return img_comment.replace("/", "_").replace(" ", "_")
+
+
+class CommentPolicy(object):
+    """Rules deciding whether an EXIF comment gets appended to an organized
+    file's name. decide() returns "append", "skip", or "ask" (queue for the
+    single batch confirmation run before copying starts).
+    default_action applies to comments no rule catches. allow_patterns and
+    deny_patterns are regexes searched for in the comment (deny wins)."""
+    def __init__(self, default_action="ask", allow_patterns=(),
+                    deny_patterns=(), max_len=None, skip_urls=True):
+        if default_action not in ["append", "skip", "ask"]:
+            raise ValueError("Invalid comment default_action '%s'"
+                                                            % default_action)
+        self.default_action = default_action
+        self.allow_patterns = [re.compile(pattern) for pattern in allow_patterns]
+        self.deny_patterns = [re.compile(pattern) for pattern in deny_patterns]
+        self.max_len = max_len
+        self.skip_urls = skip_urls
+
+    def decide(self, img_comment, stamped_name):
+        if not img_comment:
+            return "skip"
+        # Ensure not longer than ext4 fs allows.
+        elif len(img_comment) >= 255-len(stamped_name)-1:
+            return "skip"
+        elif self.max_len and len(img_comment) > self.max_len:
+            return "skip"
+        elif self.skip_urls and ("https://" in img_comment
+                                                or "http://" in img_comment):
+            return "skip"
+        elif [p for p in self.deny_patterns if p.search(img_comment)]:
+            return "skip"
+        elif [p for p in self.allow_patterns if p.search(img_comment)]:
+            return "append"
+        else:
+            return self.default_action
+
+
+def confirm_comments(queued_comments):
+    """Single confirmation for all comments queued by CommentPolicy. Takes and
+    returns dict of comments keyed by img path (only accepted ones returned)."""
+    if not queued_comments:
+        return {}
+
+    queued_paths = sorted(queued_comments)
+    print("\nComments found in EXIF data:")
+    for n, img_path in enumerate(queued_paths):
+        print("\t%d: %s\t%s" % (n+1, os.path.basename(img_path),
+                                                    queued_comments[img_path]))
+    while True:
+        response = POLICY.ask("append_comments",
+                    "Append comments to filenames? [Y/N, or list "
+                            "numbers to append only those, e.g. '1 3 4']\n> ")
+        if response.lower() == 'y':
+            return dict(queued_comments)
+        elif response.lower() == 'n':
+            return {}
+        try:
+            picks = [int(num) for num in response.replace(",", " ").split()]
+        except ValueError:
+            picks = []
+        if picks and all(0 < num <= len(queued_paths) for num in picks):
+            return {queued_paths[num-1]: queued_comments[queued_paths[num-1]]
+                                                            for num in picks}
+        print("Input not recognized.")
+
+
 # Phase 2: Organize files by date into dated directory structure.
 # Creates new dated folders where needed.
 # Prepends timestamps to img names.
@@ -22,16 +160,27 @@ class OrganizeFolderError(Exception):
 class OrganizedGroup(object):
     """Represents date-organized directory structure. Contains YrDir objects
     which in turn contain MoDir objects."""
-    def __init__(self, bu_root_path, buffer_root):
+    def __init__(self, bu_root_path, buffer_root, comment_policy=None,
+                                                            folder_done=None):
         self.bu_root_path = bu_root_path
         self.date_root_path = self.bu_root_path + "Organized/"
         self.buffer_root_path = buffer_root
+        self.comment_policy = comment_policy or CommentPolicy()
+        # Called with Organized root path after all images from each raw
+        # offload folder are organized (e.g. to start NAS sync of them while
+        # the next folder is done).
+        self.folder_done = folder_done
+        # EXIF comments to append to file names, keyed by source path.
+        # Decided up front in run_org() so copying never stops for input.
+        self.img_comments = {}
         # Double-check Organized folder is there.
         if not os.path.exists(self.date_root_path):
             raise OrganizeFolderError("Organized dir not found at %s! "
                         "Pics not organized. Terminating" % self.date_root_path)
         # Initialize object dictionary.
         self.yr_objs = {}
+        # Year dir names, listed once and kept up to date as years are added.
+        self.yr_names = SortedNames.from_dir(self.date_root_path)
 
         # Instantiate year objects.
         yr_list = self.get_yr_list()
@@ -45,10 +194,8 @@ class OrganizedGroup(object):
         return self.buffer_root_path
 
     def get_yr_list(self):
-        # Refresh date_root_path every time in case dir changes.
-        year_list = os.listdir(self.get_root_path())
-        year_list.sort()
-        return year_list
+        # Sorted. Maintained by YearDir objects as they create dirs.
+        return self.yr_names
 
     def get_yr_objs(self):
         return self.yr_objs
@@ -74,13 +221,25 @@ class OrganizedGroup(object):
             self.yr_objs[year] = YearDir(year, self)
 
     def insert_img(self, img_orig_path, man_img_time=False):
+        self.insert_group([img_orig_path], man_img_time)
+
+    def insert_group(self, img_orig_paths, man_img_time=False,
+                                                        img_date_plus=None):
+        """Places a group of sibling files (see group_siblings()) into one
+        month dir using a single timestamp. The first (best date source) path
+        is the one shown in any prompts. A timestamp already resolved by
+        date_compare.get_group_dates_plus() can be passed as img_date_plus."""
+        lead_img_path = img_orig_paths[0]
+
         # Allow a manually-specified img_time to be passed and substituted.
         if man_img_time:
             img_time = man_img_time
             bypass_age_warn = True
+        elif img_date_plus:
+            (img_time, bypass_age_warn) = img_date_plus
         else:
-            (img_time, bypass_age_warn) = date_compare.get_img_date_plus(
-                                            img_orig_path, skip_unknown=False)
+            (img_time, bypass_age_warn) = date_compare.get_group_dates_plus(
+                                                            [img_orig_paths])[0]
 
         yr_str = str(img_time.tm_year)
         mo_str = str(img_time.tm_mon)
@@ -102,19 +261,19 @@ class OrganizedGroup(object):
 
         if yr_str in self.get_latest_yrs():
             # Proceed as normal for this year and last
-            self.yr_objs[yr_str].insert_img(img_orig_path, img_time,
+            self.yr_objs[yr_str].insert_group(img_orig_paths, img_time,
                                                                 bypass_age_warn)
         elif yr_str > self.get_latest_yrs()[-1]:
             # If the image is from a later year than the existing folders,
             # make new year object.
             self.make_year(yr_str)
             NewYr = self.yr_objs[yr_str]
-            NewYr.insert_img(img_orig_path, img_time, bypass_age_warn)
+            NewYr.insert_group(img_orig_paths, img_time, bypass_age_warn)
         elif man_img_time:
             # This is the same as a condition above, but the intervening elif
             # should instead run if it evaluates true. A new manually-specified
             # date might not be present in yr_objs dir.
-            self.yr_objs[yr_str].insert_img(img_orig_path, img_time,
+            self.yr_objs[yr_str].insert_group(img_orig_paths, img_time,
                                                                 bypass_age_warn)
         else:
             print("Attempted to pull image into %s-%s dir, "
@@ -123,20 +282,20 @@ class OrganizedGroup(object):
                                 "warning and copies into older dir anyway."
                                                         % (yr_str, mo_str))
 
-            man_img_time_struct = date_compare.spec_manual_time(img_orig_path)
+            man_img_time_struct = date_compare.spec_manual_time(lead_img_path)
             if man_img_time_struct:
                 # If user entered a date:
-                self.insert_img(img_orig_path, man_img_time_struct)
+                self.insert_group(img_orig_paths, man_img_time_struct)
                 # bypass_age_warn will be set True within function.
             elif yr_str in self.get_yr_list():
                 # If user chose fallback but still in valid years, continue
                 # with operation anyway
-                self.yr_objs[yr_str].insert_img(img_orig_path, img_time,
+                self.yr_objs[yr_str].insert_group(img_orig_paths, img_time,
                                                         bypass_age_warn=True)
             else:
                 # year directory doesn't exist yet, so have make it.
                 self.make_year(yr_str)
-                self.yr_objs[yr_str].insert_img(img_orig_path, img_time,
+                self.yr_objs[yr_str].insert_group(img_orig_paths, img_time,
                                                         bypass_age_warn=True)
 
     def run_org(self):
@@ -145,22 +304,71 @@ class OrganizedGroup(object):
         LastRawOffload = ROG.get_latest_offload_obj()
         src_APPLE_folders = LastRawOffload.list_APPLE_folders()
 
-        for n, folder in enumerate(src_APPLE_folders):
+        # Group Live Photo pairs, edits, and sidecars so each picture is
+        # dated once and lands in one month dir. Dates and EXIF comments for
+        # everything are read in one exiftool pass before copying starts.
+        folder_groups = []
+        queued_comments = {}
+        queued_groups = {}      # lead path -> its group, for queued comments
+        with date_compare.exiftool_session() as et:
+            for folder in src_APPLE_folders:
+                APPLE_path = LastRawOffload.APPLE_folder_path(folder)
+                img_groups = [[APPLE_path + img for img in group] for group in
+                        group_siblings(LastRawOffload.APPLE_contents(folder))]
+                group_comments = {}
+                group_dates = date_compare.get_group_dates_plus(img_groups, et,
+                                                    comments=group_comments)
+                folder_groups.append((folder, img_groups, group_dates))
+
+                for i in sorted(group_comments):
+                    queued_groups[img_groups[i][0]] = img_groups[i]
+                    self.add_comment(img_groups[i], group_comments[i],
+                                        group_dates[i][0], queued_comments)
+
+        for lead_img_path, img_comment in confirm_comments(
+                                                    queued_comments).items():
+            for img_path in queued_groups[lead_img_path]:
+                self.img_comments[img_path] = img_comment
+
+        for n, (folder, img_groups, group_dates) in enumerate(folder_groups):
             print("Organizing from raw offload folder %s/%s (%s of %s)" %
             (LastRawOffload.get_dir_name(), folder,
                                 str(n+1), len(src_APPLE_folders)))
 
-            for img in tqdm(LastRawOffload.APPLE_contents(folder)):
-                full_img_path = LastRawOffload.APPLE_folder_path(folder) + img
-                self.insert_img(full_img_path)
+            for img_group, group_date in tqdm(list(zip(img_groups,
+                                                                group_dates))):
+                self.insert_group(img_group, img_date_plus=group_date)
+            if self.folder_done:
+                self.folder_done(self.date_root_path)
 
         print("\nCategorization buffer populated.")
 
+    def add_comment(self, img_group, img_comment, img_time, queued_comments):
+        """Apply comment policy to a sibling group's EXIF comment. Decided
+        once for the whole group, so e.g. both halves of a Live Photo keep
+        the same name. Comments needing confirmation are put in
+        queued_comments dict, keyed by the group's first path."""
+        stamped_name = (time.strftime("%Y-%m-%d", img_time) + "_"
+                + max([os.path.basename(img_path) for img_path in img_group],
+                                                                    key=len))
+        decision = self.comment_policy.decide(img_comment, stamped_name)
+        if decision == "append":
+            for img_path in img_group:
+                self.img_comments[img_path] = img_comment
+        elif decision == "ask":
+            queued_comments[img_group[0]] = img_comment
+
+    def get_comment(self, img_path):
+        return self.img_comments.get(img_path)
+
     def __repr__(self):
         return "OrganizedGroup object with path:\n\t" + self.get_root_path()
 
 
 class YearDir(object):
+    __slots__ = ("year_name", "year_path", "OrgGroup", "mo_names", "mo_objs",
+                                            "no_prompt_months", "og_latest_mo")
+
     def __init__(self, year_name, OrgGroup):
         """Represents directory w/ year label that exists inside date-organized
         directory structure. Contains MoDir objects."""
@@ -170,6 +378,9 @@ class YearDir(object):
 
         if not self.year_name in OrgGroup.get_yr_list():
             os.mkdir(self.year_path)
+            OrgGroup.yr_names.add(self.year_name)
+        # Month dir names, listed once and kept up to date as months are added.
+        self.mo_names = SortedNames.from_dir(self.year_path)
         # Create dict of months.
         # This will contain all directories transferred to in this job.
         self.mo_objs = {}
@@ -189,9 +400,8 @@ class YearDir(object):
         return self.year_path
 
     def get_mo_list(self):
-        mo_list = os.listdir(self.year_path)
-        mo_list.sort()
-        return mo_list
+        # Sorted. Maintained by MoDir objects as they create dirs.
+        return self.mo_names
 
     def get_mo_objs(self):
         return self.mo_objs
@@ -222,38 +432,60 @@ class YearDir(object):
             self.mo_objs[yrmonth] = MoDir(yrmonth, self)
 
     def insert_img(self, img_orig_path, img_time, bypass_age_warn=False):
-        if ".AAE" in os.path.basename(img_orig_path):
-            # Don't copy AAE files into date-organized folders or cat buffer.
-            # They will still exist in raw, but it doesn't add any value to copy
-            # them elsewhere. They can also have dates that don't match the
-            # corresponding img/vid, causing confusion.
-            return
-
-        elif os.path.basename(img_orig_path)[:5] == "IMG_E":
-            # Look for any original/edited pairs in all org dirs used so far.
-            # "IMG_E" files appear later in sorted order than originals, so
-            # the originals are transferred first.
-            # Can't assume datestamp is the same. Could have edited later.
-            target_img_num = os.path.splitext(
-                                        os.path.basename(img_orig_path))[0][-4:]
-
-            for month in self.mo_objs.keys():
-                mo_obj = self.mo_objs[month]
-                for img_name in mo_obj.get_img_list():
-                    # If number that follows the "IMG_" or "IMG_E" matches, find
-                    # and discard the original (remains in raw_offload folder).
-                    if os.path.splitext(img_name)[0][-4:] == target_img_num:
-                        # Replace "IMG_E" img_time with original's datestamp.
-                        img_time = time.strptime(img_name.split("_")[0],
+        self.insert_group([img_orig_path], img_time, bypass_age_warn)
+
+    def insert_group(self, img_orig_paths, img_time, bypass_age_warn=False):
+        img_names = [os.path.basename(path) for path in img_orig_paths]
+        # Originals that have an edited version in this group.
+        replaced = replaced_originals(img_names)
+        xfer_paths = []
+
+        for img_orig_path in img_orig_paths:
+            img_name = os.path.basename(img_orig_path)
+
+            if is_sidecar(img_name):
+                # Don't copy AAE files into date-organized folders or cat buffer.
+                # They will still exist in raw, but it doesn't add any value to
+                # copy them elsewhere. They can also have dates that don't match
+                # the corresponding img/vid, causing confusion.
+                continue
+
+            elif img_name[:5] == "IMG_E" and not [name for name in img_names
+                        if name[:5] != "IMG_E" and not is_sidecar(name)]:
+                # Original isn't in this group (came in an earlier offload).
+                # Look for any original/edited pairs in all org dirs used so far.
+                # Can't assume datestamp is the same. Could have edited later.
+                target_img_num = img_num(img_name)
+
+                for month in self.mo_objs.keys():
+                    mo_obj = self.mo_objs[month]
+                    for org_img_name in mo_obj.get_img_list():
+                        # If number that follows the "IMG_" or "IMG_E" matches,
+                        # find and discard the original (remains in raw_offload
+                        # folder).
+                        if os.path.splitext(org_img_name)[0][-4:] == target_img_num:
+                            # Replace "IMG_E" img_time with original's datestamp.
+                            img_time = time.strptime(org_img_name.split("_")[0],
                                                                     "%Y-%m-%d")
-                        print("Keeping edited file %s and removing original "
-                           "%s." % (os.path.basename(img_orig_path), img_name))
-                        # Remove from both date-org folder and cat buffer.
-                        os.remove(os.path.join(mo_obj.get_mo_path(), img_name))
-                        os.remove(os.path.join(
-                                self.OrgGroup.get_buffer_root_path(), img_name))
-                        break
-            # Continue to next conditional. Edited ("IMG_E") file is xfered.
+                            print("Keeping edited file %s and removing original "
+                                            "%s." % (img_name, org_img_name))
+                            # Remove from both date-org folder and cat buffer.
+                            mo_obj.remove_img(org_img_name)
+                            os.remove(os.path.join(
+                                self.OrgGroup.get_buffer_root_path(), org_img_name))
+                            break
+                # Edited ("IMG_E") file is xfered.
+
+            elif img_name in replaced:
+                # Edited version of this file is in the same group. Keep only
+                # the edit. Original remains in raw_offload folder.
+                print("Keeping edited file and skipping original %s." % img_name)
+                continue
+
+            xfer_paths.append(img_orig_path)
+
+        if not xfer_paths:
+            return
 
         yr_str = str(img_time.tm_year)
         # Have to zero-pad single-digit months pulled from struct_time
@@ -261,38 +493,39 @@ class YearDir(object):
         yrmon = "%s-%s" % (yr_str, mon_str)
 
         if yrmon in self.no_prompt_months:
-            # Pass image path to correct month object for insertion.
-            self.mo_objs[yrmon].insert_img(img_orig_path, img_time)
+            # Pass image paths to correct month object for insertion.
+            self.mo_objs[yrmon].insert_group(xfer_paths, img_time)
         elif (not self.og_latest_mo) or (yrmon > str(self.og_latest_mo)):
             # If there are no months in year directory initially, or if the
             # image is from a later month than the existing folders, make new
             # month object.
             self.make_yrmonth(yrmon)
             self.no_prompt_months.add(yrmon)
-            # Pass image path to new month object for insertion.
-            self.mo_objs[yrmon].insert_img(img_orig_path, img_time)
+            # Pass image paths to new month object for insertion.
+            self.mo_objs[yrmon].insert_group(xfer_paths, img_time)
         elif bypass_age_warn:
             # This is the same as a condition above, but the intervening elif
             # should instead run if it evaluates true. A new manually-specified
             # date might not be present in mo_objs.
-            self.mo_objs[yrmon].insert_img(img_orig_path, img_time)
+            self.mo_objs[yrmon].insert_group(xfer_paths, img_time)
         else:
             # If the image is from an earlier month not in no_prompt_months set:
             print("Attempted to pull image into %s dir, but a more recent "
             "month dir exists, so timestamp may be wrong.\nFallback bypasses "
                             "warning and copies into older dir anyway." % yrmon)
 
-            man_img_time_struct = date_compare.spec_manual_time(img_orig_path)
+            man_img_time_struct = date_compare.spec_manual_time(xfer_paths[0])
             if man_img_time_struct:
-                self.insert_img(img_orig_path, man_img_time_struct,
+                self.insert_group(xfer_paths, man_img_time_struct,
                                                         bypass_age_warn=True)
             else: # continue with operation anyway
                 if yrmon not in self.mo_objs.keys():
                     # year-month directory doesn't exist yet, so have make it.
                     self.make_yrmonth(yrmon)
-                self.mo_objs[yrmon].insert_img(img_orig_path, img_time)
+                self.mo_objs[yrmon].insert_group(xfer_paths, img_time)
 
-                ignore = input("Ignore future warnings for this month? "
+                ignore = POLICY.ask("ignore_month_warnings",
+                            "Ignore future warnings for this month? "
                                                                     "[Y/N]\n> ")
                 if ignore and ignore.lower() == "y":
                     self.no_prompt_months.add(yrmon)
@@ -307,51 +540,62 @@ class YearDir(object):
 class MoDir(object):
     """Represents directory w/ month label that exists inside a YrDir object
     within the date-organized directory structure. Contains images."""
+    __slots__ = ("dir_name", "yrmonth_path", "YrDir", "img_names")
+
     def __init__(self, yrmonth_name, YrDir):
         self.dir_name = yrmonth_name
         self.yrmonth_path = YrDir.get_yr_path() + self.dir_name + '/'
         self.YrDir = YrDir
+        # Image names are only listed if needed (see get_img_list()).
+        self.img_names = None
 
         if not self.dir_name in YrDir.get_mo_list():
             os.mkdir(self.yrmonth_path)
+            YrDir.mo_names.add(self.dir_name)
 
     def get_mo_path(self):
         return self.yrmonth_path
 
     def get_img_list(self):
-        self.img_list = os.listdir(self.yrmonth_path)
-        self.img_list.sort()
-        return self.img_list
+        # Sorted. Listed on first use then kept up to date by insert_img()
+        # and remove_img().
+        if self.img_names is None:
+            self.img_names = SortedNames.from_dir(self.yrmonth_path)
+        return self.img_names
+
+    def remove_img(self, img_name):
+        os.remove(self.yrmonth_path + img_name)
+        MANIFEST.deleted(self.yrmonth_path + img_name)
+        if self.img_names is not None:
+            self.img_names.discard(img_name)
 
     def insert_img(self, img_orig_path, img_time):
         # make sure image not already here
         img_name = os.path.basename(img_orig_path)   # no trailing slash
         stamped_name = time.strftime("%Y-%m-%d", img_time) + "_" + img_name
 
-        img_comment = date_compare.get_comment(img_orig_path)
-        # Ensure not longer than ext4 fs allows. Ignore URLs too.
-        if (img_comment and len(img_comment) < 255-len(stamped_name)-1
-                                            and "https://" not in img_comment):
-            add_comment = input("Comment found in %s EXIF data:\n\t%s\n"
-                    "Append to filename? [Y/N]\n> " % (img_name, img_comment))
-            if add_comment:
-                # https://stackoverflow.com/questions/1976007/what-characters-are-forbidden-in-windows-and-linux-directory-names
-                # Only character not allowed in UNIX filename is the forward slash.
-                # But I also don't like spaces.
-                formatted_comment = img_comment.replace("/", "_")
-                formatted_comment = img_comment.replace(" ", "_")
-                stamped_name = (os.path.splitext(stamped_name)[0] + "_"
-                        + formatted_comment + os.path.splitext(stamped_name)[1])
+        # Comment was already read and approved in OrganizedGroup.run_org().
+        img_comment = self.YrDir.OrgGroup.get_comment(img_orig_path)
+        if img_comment:
+            stamped_name = (os.path.splitext(stamped_name)[0] + "_"
+                + format_comment(img_comment) + os.path.splitext(stamped_name)[1])
 
         # Copy into the dated directory
-        copy_to_target(img_orig_path, self.yrmonth_path,
+        dest_path = copy_to_target(img_orig_path, self.yrmonth_path,
                                                     new_name=stamped_name)
+        if dest_path and self.img_names is not None:
+            self.img_names.add(os.path.basename(dest_path))
 
         # Also copy the img into the cat buffer for next step in prog.
         copy_to_target(img_orig_path,
                             self.YrDir.OrgGroup.get_buffer_root_path(),
                             new_name=stamped_name)
 
+    def insert_group(self, img_orig_paths, img_time):
+        # Sibling files (e.g. Live Photo HEIC + MOV) share one timestamp.
+        for img_orig_path in img_orig_paths:
+            self.insert_img(img_orig_path, img_time)
+
     def get_yrmon_name(self):
         return self.dir_name
 
@@ -0,0 +1,204 @@
+import os
+import heapq
+import threading
+from bisect import bisect_left
+from array import array
+from itertools import accumulate
+
+
+# Directory listings are kept as compact sorted name tables instead of lists of
+# str objects. Building one costs a single os.listdir(). The table is then
+# updated in place as the tools create or remove entries, instead of
+# re-listing and re-sorting on every lookup.
+#
+# DirNameIndex does the same for collision checks when copying or renaming
+# into a directory: one listing per directory, kept in a set and reused as long
+# as the directory's mtime shows no one else has changed it.
+
+
+class SortedNames(object):
+    """Sorted table of file or directory names supporting fast membership
+    test, insertion and removal. Indexing and iteration work like a sorted
+    list.
+    Names are stored back to back in one string with an array of offsets
+    (~30 bytes/name instead of ~80 for a list of str). Changes go into a
+    small sorted overlay that is folded back in when it grows."""
+    __slots__ = ("blob", "offsets", "added", "removed")
+
+    def __init__(self, names=()):
+        self.build(sorted(names))
+
+    @classmethod
+    def from_dir(cls, dir_path):
+        return cls(os.listdir(dir_path))
+
+    def build(self, sorted_names):
+        self.blob = "".join(sorted_names)
+        self.offsets = array("I", accumulate((len(name)
+                                    for name in sorted_names), initial=0))
+        self.added = []
+        self.removed = set()
+
+    def compact(self):
+        """Fold added/removed names back into the packed table."""
+        if self.added or self.removed:
+            self.build(list(self))
+
+    def base_name(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i+1]]
+
+    def base_len(self):
+        return len(self.offsets) - 1
+
+    def in_base(self, name):
+        # Binary search of packed table.
+        lo, hi = 0, self.base_len()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.base_name(mid) < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self.base_len() and self.base_name(lo) == name
+
+    def in_added(self, name):
+        i = bisect_left(self.added, name)
+        return i < len(self.added) and self.added[i] == name
+
+    def add(self, name):
+        if name in self.removed:
+            self.removed.discard(name)
+        elif not self.in_added(name) and not self.in_base(name):
+            self.added.insert(bisect_left(self.added, name), name)
+            self.maybe_compact()
+
+    def discard(self, name):
+        if self.in_added(name):
+            self.added.remove(name)
+        elif name not in self.removed and self.in_base(name):
+            self.removed.add(name)
+            self.maybe_compact()
+
+    def maybe_compact(self):
+        if len(self.added) + len(self.removed) > max(64, self.base_len() // 8):
+            self.compact()
+
+    def __contains__(self, name):
+        if name in self.removed:
+            return False
+        return self.in_added(name) or self.in_base(name)
+
+    def __iter__(self):
+        base_iter = (self.base_name(i) for i in range(self.base_len()))
+        if self.removed:
+            base_iter = (name for name in base_iter if name not in self.removed)
+        if self.added:
+            return heapq.merge(base_iter, self.added)
+        return base_iter
+
+    def __len__(self):
+        return self.base_len() - len(self.removed) + len(self.added)
+
+    def __getitem__(self, index):
+        self.compact()
+        if isinstance(index, slice):
+            return [self.base_name(i)
+                            for i in range(*index.indices(self.base_len()))]
+        if index < 0:
+            index += self.base_len()
+        if not 0 <= index < self.base_len():
+            raise IndexError("SortedNames index out of range")
+        return self.base_name(index)
+
+    def __repr__(self):
+        return "SortedNames(%d names)" % len(self)
+
+
+class DirEntry(object):
+    """Cached listing of one directory."""
+    __slots__ = ("mtime_ns", "names", "suffix_hints")
+
+    def __init__(self, mtime_ns, names):
+        self.mtime_ns = mtime_ns
+        self.names = names
+        # Last "_N" suffix handed out per name, so the search for a free
+        # suffix doesn't restart at 1 each time.
+        self.suffix_hints = {}
+
+
+class DirNameIndex(object):
+    """Shared cache of directory listings for collision detection.
+    A directory is listed once, then re-listed only if its mtime no longer
+    matches the one recorded (i.e. something other than add()/discard()
+    changed it). Safe to share between threads."""
+    def __init__(self):
+        self.dirs = {}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def dir_key(dir_path):
+        return os.path.normpath(os.path.abspath(dir_path))
+
+    def entry(self, dir_path):
+        key = self.dir_key(dir_path)
+        mtime_ns = os.stat(key).st_mtime_ns
+        with self.lock:
+            entry = self.dirs.get(key)
+            if entry is None or entry.mtime_ns != mtime_ns:
+                entry = DirEntry(mtime_ns, set(os.listdir(key)))
+                self.dirs[key] = entry
+            return entry
+
+    def names(self, dir_path):
+        return self.entry(dir_path).names
+
+    def contains(self, dir_path, name):
+        return name in self.entry(dir_path).names
+
+    def add(self, dir_path, name):
+        """Record a name just created in dir_path by this program."""
+        self.update(dir_path, name, True)
+
+    def discard(self, dir_path, name):
+        """Record a name just removed from dir_path by this program."""
+        self.update(dir_path, name, False)
+
+    def update(self, dir_path, name, present):
+        key = self.dir_key(dir_path)
+        with self.lock:
+            entry = self.dirs.get(key)
+            if entry is None:
+                # Not cached, so nothing to keep up to date.
+                return
+            if present:
+                entry.names.add(name)
+            else:
+                entry.names.discard(name)
+            try:
+                entry.mtime_ns = os.stat(key).st_mtime_ns
+            except FileNotFoundError:
+                del self.dirs[key]
+
+    def next_free_name(self, dir_path, name):
+        """Returns name if not taken in dir_path. Otherwise the first free
+        name with "_N" inserted before the extension (no upper limit on N)."""
+        with self.lock:
+            entry = self.entry(dir_path)
+            if name not in entry.names:
+                return name
+            name_noext, name_ext = os.path.splitext(name)
+            n = entry.suffix_hints.get(name, 0) + 1
+            while "%s_%d%s" % (name_noext, n, name_ext) in entry.names:
+                n += 1
+            entry.suffix_hints[name] = n
+            return "%s_%d%s" % (name_noext, n, name_ext)
+
+    def invalidate(self, dir_path=None):
+        with self.lock:
+            if dir_path is None:
+                self.dirs.clear()
+            else:
+                self.dirs.pop(self.dir_key(dir_path), None)
+
+
+DIR_INDEX = DirNameIndex()
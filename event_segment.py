@@ -0,0 +1,138 @@
+import os
+import re
+import time
+
+import date_compare
+from file_compare import FileKeyCache
+from thumb_cache import DEFAULT_CACHE_DIR
+
+
+# Splits the categorization buffer into events (a trip, a job site visit) so
+# a whole event can be sent to one target at once. Items are ordered by
+# capture time and a new event starts wherever the gap between consecutive
+# items is longer than EVENT_GAP.
+# Capture times come from, in order of preference:
+#   1. long datestamp in file name (YYYY-MM-DDTHHMMSS_...)
+#   2. time cache (from an earlier run) keyed by file identity
+#   3. EXIF/QuickTime creation time, read for all remaining files in one
+#      exiftool batch, then cached
+#   4. fs mod time if it's on the file's datestamp day, else noon that day
+# Nothing here prompts (unlike get_img_date_plus()), since a rough time is
+# good enough for grouping.
+
+EVENT_GAP = 3 * 3600           # seconds between items that splits events
+MIN_EVENT_SIZE = 3             # smaller events left for one-at-a-time
+TIME_CACHE_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR),
+                                                        "capture_times.json")
+TIME_CACHE_MAX = 200000
+
+# Every tag date_compare.meta_create_time() looks at.
+TIME_TAGS = ["EXIF:DateTimeOriginal", "XMP:DateCreated", "File:FileModifyDate",
+             "QuickTime:CreationDate", "QuickTime:CreateDate",
+             "PLIST:AdjustmentTimestamp"]
+
+
+class Event(object):
+    """Buffer items (sorted by capture time) taken close together."""
+    def __init__(self, img_paths, start_time, end_time):
+        self.img_paths = img_paths
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def describe(self):
+        """e.g. '2024-06-01 09:12 - 11:40 (2h28m), 37 items'"""
+        span = int(self.end_time - self.start_time) // 60
+        start_str = time.strftime("%Y-%m-%d %H:%M",
+                                            time.localtime(self.start_time))
+        if (time.strftime("%Y-%m-%d", time.localtime(self.start_time)) ==
+                    time.strftime("%Y-%m-%d", time.localtime(self.end_time))):
+            end_str = time.strftime("%H:%M", time.localtime(self.end_time))
+        else:
+            end_str = time.strftime("%Y-%m-%d %H:%M",
+                                                time.localtime(self.end_time))
+        return "%s - %s (%dh%02dm), %d items" % (start_str, end_str,
+                                    span // 60, span % 60, len(self.img_paths))
+
+
+def name_time(img_name):
+    """Capture time from long datestamp in name, or None."""
+    match = re.match(r"(\d{4}-\d{2}-\d{2}T\d{6})_", img_name)
+    if match:
+        return time.mktime(time.strptime(match.group(1),
+                                                date_compare.DATETIME_FORMAT))
+    return None
+
+
+def fallback_time(img_path):
+    """mod time if it falls on file's datestamp day, else noon of that day
+    (or mod time if name has no datestamp)."""
+    mtime = os.path.getmtime(img_path)
+    img_day = os.path.basename(img_path)[:10]
+    try:
+        day_start = time.mktime(time.strptime(img_day, "%Y-%m-%d"))
+    except ValueError:
+        return mtime
+    if time.strftime("%Y-%m-%d", time.localtime(mtime)) == img_day:
+        return mtime
+    return day_start + 12 * 3600
+
+
+def capture_times(img_paths, cache=None, et=None):
+    """Function that finds rough capture time (epoch seconds) of each file.
+    Metadata of all files not named or cached with a time is read in one
+    exiftool batch.
+    Returns dict of capture times keyed by img path."""
+    if cache is None:
+        cache = FileKeyCache(TIME_CACHE_PATH, TIME_CACHE_MAX)
+
+    times = {}
+    to_read = []
+    for img_path in img_paths:
+        img_time = name_time(os.path.basename(img_path))
+        if img_time is None:
+            img_time = cache.get(img_path)
+        if img_time is not None:
+            times[img_path] = img_time
+        elif (os.path.splitext(img_path)[-1].upper()
+                                            in date_compare.DATE_SOURCE_RANK):
+            to_read.append(img_path)
+        else:
+            times[img_path] = fallback_time(img_path)
+
+    if to_read:
+        with date_compare.exiftool_session(et) as et:
+            metadata_list = et.get_tags_batch(TIME_TAGS, to_read)
+        for img_path, metadata in zip(to_read, metadata_list):
+            create_time_obj = date_compare.meta_create_time(img_path, metadata)
+            if create_time_obj:
+                times[img_path] = time.mktime(create_time_obj)
+                cache.put(img_path, times[img_path])
+            else:
+                times[img_path] = fallback_time(img_path)
+        cache.save()
+    return times
+
+
+def segment_events(times, gap=EVENT_GAP):
+    """Function that splits items into events wherever consecutive capture
+    times are more than gap seconds apart. times is dict of capture times
+    keyed by img path.
+    Returns list of Events in time order."""
+    events = []
+    img_paths = []
+    for img_path in sorted(times, key=lambda path: (times[path], path)):
+        if img_paths and times[img_path] - times[img_paths[-1]] > gap:
+            events.append(Event(img_paths, times[img_paths[0]],
+                                                    times[img_paths[-1]]))
+            img_paths = []
+        img_paths.append(img_path)
+    if img_paths:
+        events.append(Event(img_paths, times[img_paths[0]],
+                                                    times[img_paths[-1]]))
+    return events
+
+
+def find_events(img_paths, gap=EVENT_GAP, min_size=MIN_EVENT_SIZE):
+    """Events with at least min_size items among img_paths."""
+    return [event for event in segment_events(capture_times(img_paths), gap)
+                                        if len(event.img_paths) >= min_size]
@@ -0,0 +1,170 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import xxhash
+except ImportError:
+    # Optional. Falls back to BLAKE2 from hashlib (still faster than SHA-1).
+    xxhash = None
+
+
+# File equality checks used on name collisions. Cheapest test first:
+#   1. same inode, or different sizes -> answered from os.stat() alone
+#   2. digest of head/middle/tail sample blocks -> few hundred KB read
+#   3. digest of whole file, read in fixed-size chunks (never whole file
+#      in memory at once)
+# Digests are cached by file identity, so a file compared against several
+# destinations (e.g. organized month dir and cat buffer) is only read once.
+
+SAMPLE_SIZE = 64 * 1024      # bytes read at each of head, middle, and tail
+CHUNK_SIZE = 1024 * 1024     # read size for full-file digest
+
+
+def new_hasher():
+    if xxhash:
+        return xxhash.xxh3_128()
+    else:
+        return hashlib.blake2b(digest_size=32)
+
+
+def file_key(file_stat):
+    """Identity of a file's current contents. Changes if the file is
+    replaced or modified."""
+    return (file_stat.st_dev, file_stat.st_ino, file_stat.st_size,
+                                                        file_stat.st_mtime_ns)
+
+
+class FileKeyCache(object):
+    """Values (anything JSON can hold, e.g. near_dup dHashes or event_segment
+    capture times) keyed by file identity, saved as JSON between runs.
+    Bounded to max_entries (oldest entries dropped)."""
+    def __init__(self, cache_path, max_entries):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.values = {}
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path) as cache_file:
+                    self.values = json.load(cache_file)
+            except (OSError, ValueError):
+                # Corrupt cache just gets rebuilt.
+                self.values = {}
+
+    @staticmethod
+    def key(file_path):
+        return "%d_%d_%d_%d" % file_key(os.stat(file_path))
+
+    def get(self, file_path):
+        return self.values.get(self.key(file_path))
+
+    def put(self, file_path, value):
+        self.values[self.key(file_path)] = value
+
+    def save(self):
+        while len(self.values) > self.max_entries:
+            del self.values[next(iter(self.values))]
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path + ".tmp", "w") as cache_file:
+            json.dump(self.values, cache_file)
+        os.replace(self.cache_path + ".tmp", self.cache_path)
+
+
+def sample_digest(file_path, file_size):
+    """Digest of blocks from start, middle, and end of file."""
+    hasher = new_hasher()
+    with open(file_path, 'rb') as file_obj:
+        for offset in [0, (file_size - SAMPLE_SIZE) // 2,
+                                                    file_size - SAMPLE_SIZE]:
+            file_obj.seek(offset)
+            hasher.update(file_obj.read(SAMPLE_SIZE))
+    return hasher.digest()
+
+
+def full_digest(file_path):
+    hasher = new_hasher()
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as file_obj:
+        while True:
+            bytes_read = file_obj.readinto(buffer)
+            if not bytes_read:
+                break
+            hasher.update(view[:bytes_read])
+    return hasher.digest()
+
+
+class DigestCache(object):
+    """Bounded cache of sample and full-file digests keyed by file identity
+    (device, inode, size, mtime). Safe to share between threads."""
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Counters for benchmarks/diagnostics.
+        self.bytes_read = 0
+        self.hits = 0
+
+    def lookup(self, key, kind):
+        with self.lock:
+            digest = self.entries.get((key, kind))
+            if digest is not None:
+                self.entries.move_to_end((key, kind))
+                self.hits += 1
+            return digest
+
+    def store(self, key, kind, digest, bytes_read):
+        with self.lock:
+            self.bytes_read += bytes_read
+            self.entries[(key, kind)] = digest
+            self.entries.move_to_end((key, kind))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def digest(self, file_path, file_stat, kind):
+        """Returns "sample" or "full" digest of file, reading it only if not
+        already cached."""
+        key = file_key(file_stat)
+        digest = self.lookup(key, kind)
+        if digest is None:
+            if kind == "sample":
+                digest = sample_digest(file_path, file_stat.st_size)
+                bytes_read = 3 * SAMPLE_SIZE
+            else:
+                digest = full_digest(file_path)
+                bytes_read = file_stat.st_size
+            self.store(key, kind, digest, bytes_read)
+        return digest
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+DIGEST_CACHE = DigestCache()
+
+
+def same_file(file1_path, file2_path, cache=None):
+    """Function that determines if two files have identical contents.
+    Reads as little of each file as it can to decide."""
+    if cache is None:
+        cache = DIGEST_CACHE
+
+    file1_stat = os.stat(file1_path)
+    file2_stat = os.stat(file2_path)
+
+    if os.path.samestat(file1_stat, file2_stat):
+        return True
+    elif file1_stat.st_size != file2_stat.st_size:
+        return False
+
+    if file1_stat.st_size > 3 * SAMPLE_SIZE:
+        # Only worth sampling if it reads less than the whole file.
+        if (cache.digest(file1_path, file1_stat, "sample")
+                            != cache.digest(file2_path, file2_stat, "sample")):
+            return False
+
+    return (cache.digest(file1_path, file1_stat, "full")
+                                == cache.digest(file2_path, file2_stat, "full"))
@@ -1,119 +1,264 @@
-import subprocess
+import sys
+import argparse
 
-import pic_offload_tool as offload_tool
-import date_organize_tool as org_tool
-import pic_categorize_tool as cat_tool
+# Each program's modules are imported when it's run, so e.g. --help,
+# datestamp, or sync don't pay for loading all of them.
+import nas_sync
+from change_manifest import MANIFEST
+from prompt_policy import POLICY, PolicyError
 
 from dir_names import IPHONE_BU_ROOT, IPAD_BU_ROOT, ST_VID_ROOT
 from dir_names import NAS_BU_ROOT, NAS_ST_DIR, SSH_PORT
+try:
+    from dir_names import OFFLOAD_MIRROR_ROOT
+except ImportError:
+    # Optional. If defined (e.g. path where NAS BU root is mounted), offload
+    # writes each image there too as it's read from the device.
+    OFFLOAD_MIRROR_ROOT = None
 
 
 def run_offload(bu_root_dir):
+    import pic_offload_tool as offload_tool
     print('\n\t', '*' * 10, 'OFFLOAD program', '*' * 10)
     # Instantiate a RawOffloadGroup instance then call its create_new_offload()
     # method.
-    rog = offload_tool.RawOffloadGroup(bu_root_dir)
+    # Each APPLE folder is queued for NAS sync as soon as it's offloaded.
+    offload_dir = "%sRaw_Offload/" % bu_root_dir
+    if OFFLOAD_MIRROR_ROOT:
+        # Same layout as NAS BU root, e.g. <mirror root>/iPhone_Pictures/Raw_Offload/
+        mirror_dir = "%s/%s/Raw_Offload/" % (OFFLOAD_MIRROR_ROOT.rstrip("/"),
+                                        bu_root_dir.rstrip("/").split("/")[-1])
+    else:
+        mirror_dir = None
+    rog = offload_tool.RawOffloadGroup(bu_root_dir,
+                folder_done=stream_sync(offload_dir), mirror_root=mirror_dir)
     rog.create_new_offload()
 
-    # run rsync script to copy new data to NAS
-    offload_dir = "%sRaw_Offload/" % bu_root_dir
-    call_rs_script("NAS_BU_sync.sh", offload_dir, NAS_BU_ROOT)
-    print("\nRunning NAS rsync in new terminal.\n")
+    # Queue rsync to copy rest of new data to NAS (runs in background).
+    SYNC.submit(nas_sync.bu_job(offload_dir, NAS_BU_ROOT, SSH_PORT, MANIFEST))
+    print("\nNAS sync of %s queued.\n" % offload_dir)
 
     print('\t', '*' * 10, 'OFFLOAD program complete', '*' * 10, "\n")
-    input("\nYou should proceed to run the ORGANIZE program, even if not "
+    POLICY.ask("offload_done",
+            "\nYou should proceed to run the ORGANIZE program, even if not "
             "intending to run the CAT program right now.\nThe only reason "
             "not to run ORG after OFFLOAD is if you never intend to CAT this "
-            "offload.\n")
+            "offload.\n", default="")
 
 def run_org(bu_root_dir, buffer_root_dir):
+    import date_organize_tool as org_tool
     print('\n\t', '*' * 10, 'ORGANIZE program', '*' * 10)
     # Instantiate an OrganizedGroup instance then call its run_org() method.
-    orgg = org_tool.OrganizedGroup(bu_root_dir, buffer_root_dir)
+    # Images from each raw offload folder are queued for NAS sync as soon as
+    # they're organized.
+    org_dir = "%sOrganized/" % bu_root_dir
+    # Comment rules can be set in policy file's [comments] table.
+    orgg = org_tool.OrganizedGroup(bu_root_dir, buffer_root_dir,
+                comment_policy=org_tool.CommentPolicy(**POLICY.section("comments")),
+                                            folder_done=stream_sync(org_dir))
     orgg.run_org()
 
-    # run rsync script to copy new data to NAS
-    org_dir = "%sOrganized/" % bu_root_dir
-    call_rs_script("NAS_BU_sync.sh", org_dir, NAS_BU_ROOT)
-    print("\nRunning NAS rsync in new terminal.\n")
+    # Queue rsync to copy rest of new data to NAS (runs in background).
+    SYNC.submit(nas_sync.bu_job(org_dir, NAS_BU_ROOT, SSH_PORT, MANIFEST))
+    print("\nNAS sync of %s queued.\n" % org_dir)
 
     print('\t', '*' * 10, 'ORGANIZE program complete', '*' * 10, '\n')
 
 def run_cat(buffer_root):
+    import pic_categorize_tool as cat_tool
     print('\n\t', '*' * 10, 'CATEGORIZE program', '*' * 10)
 
     Cat = cat_tool.Categorizer(buffer_root)
-    # Prompt user to put all bulk media in appropriate buffers (ex. st_buffer.)
-    # Then automatically categorize all.
-    Cat.run_auto_cat()
-    Cat.photo_transfer()
+    try:
+        # Prompt user to put all bulk media in appropriate buffers (ex.
+        # st_buffer.) Then automatically categorize all.
+        Cat.run_auto_cat()
+        # Send whole events (photos close together in time) to targets, then
+        # ranges of images from contact sheet, then go through the rest one
+        # at a time.
+        Cat.event_transfer()
+        Cat.grid_transfer()
+        Cat.photo_transfer()
+    finally:
+        # Close preview window even if stopped by an error or Ctrl-C.
+        Cat.stop_preview()
 
-    # run rsync script to copy new data to NAS
-    call_rs_script("NAS_ST_sync.sh", ST_VID_ROOT, NAS_ST_DIR)
-    print("\nRunning NAS rsync in new terminal.\n")
+    # Queue rsync to copy new data to NAS (runs in background).
+    SYNC.submit(nas_sync.st_job(ST_VID_ROOT, NAS_ST_DIR, SSH_PORT, MANIFEST))
+    print("\nNAS sync of %s queued.\n" % ST_VID_ROOT)
 
     print('\t', '*' * 10, 'CATEGORIZE program complete', '*' * 10, "\n")
 
+def stream_sync(src_dir):
+    # Returns callback that queues NAS sync of changes made in src_dir so far.
+    def folder_done(folder_path):
+        SYNC.submit(nas_sync.bu_job(src_dir, NAS_BU_ROOT, SSH_PORT, MANIFEST,
+                                                                stream=True))
+    return folder_done
+
+def run_full_sync(bu_root_dir):
+    # Compare whole trees with NAS (catches changes made outside this program).
+    for src_dir in ["%sRaw_Offload/" % bu_root_dir, "%sOrganized/" % bu_root_dir]:
+        SYNC.submit(nas_sync.bu_job(src_dir, NAS_BU_ROOT, SSH_PORT, MANIFEST,
+                                                                    full=True))
+    SYNC.submit(nas_sync.st_job(ST_VID_ROOT, NAS_ST_DIR, SSH_PORT, MANIFEST,
+                                                                    full=True))
+    print("\nFull NAS sync queued.\n")
+
 def run_all(bu_root_dir, buffer_root_dir):
     run_offload(bu_root_dir)
     run_org(bu_root_dir, buffer_root_dir)
     run_cat(buffer_root_dir)
 
+def run_datestamp(paths, long_stamp=False, recursive=False):
+    import batch_datestamp
+    # Datestamp each image, or every image in (or below) each dir, all in one
+    # batch. Returns True if none failed.
+    img_paths = batch_datestamp.expand_paths(paths, recursive)
+    return batch_datestamp.report(batch_datestamp.datestamp_paths(img_paths,
+                                                                long_stamp))
+
+def choose_bu_root(device=None):
+    # Returns BU root of device ('iphone' or 'ipad'), asking if not given.
+    # Returns None if user quits.
+    if device:
+        device_type = {"iphone": 'o', "ipad": 'a'}[device]
+    else:
+        device_type = POLICY.ask("device", "Backing up iPhone or iPad? "
+                                    "['o' for iPhone, 'a' for iPad]\n> ")
+    while device_type.lower() not in ['o', 'a', 'q']:
+        device_type = POLICY.ask("device", "Input not recognized. Choose "
+                        "device ['o' for iPhone, 'a' for iPad, 'q' to quit]\n> ")
+    if device_type.lower() == 'o':
+        return IPHONE_BU_ROOT
+    elif device_type.lower() == 'a':
+        return IPAD_BU_ROOT
+    return None
 
-def call_rs_script(script, src_dir, dest_dir):
-    shell_command = ("gnome-terminal --tab -- /bin/bash -c \"./%s %s %s %d; "
-                        "/bin/bash\"" % (script, src_dir, dest_dir, SSH_PORT))
+def track_synced_roots(bu_root):
+    # Record what each program changes in the synced trees, so NAS sync only
+    # needs to look at those files.
+    for synced_root in [bu_root + "Raw_Offload/", bu_root + "Organized/",
+                                                                ST_VID_ROOT]:
+        MANIFEST.track(synced_root)
 
-    subprocess.run([shell_command],
-                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
+def run_menu(bu_root, buffer_root):
+    # Main loop
+    while True:
+        prog = input("Choose program to run:\n"
+                     "\tType 'f' to run the OFFLOAD program only.\n"
+                     "\tType 'g' to run the ORGANIZE (by date) program only.\n"
+                     "\tType 'c' to run the CATEGORIZE program only.\n"
+                     "\tType 'a' or press Enter to run all three programs.\n"
+                     "\tType 's' to sync whole BU trees to NAS (full compare).\n"
+                     "\tType 'q' to quit.\n"
+                     "\tType 'h' for help.\n> ")
 
+        if prog.lower() == 'f':
+            run_offload(bu_root)
 
-device_type = input("Backing up iPhone or iPad? ['o' for iPhone, 'a' for iPad]\n> ")
-while device_type.lower() not in ['o', 'a', 'q']:
-    device_type = input("Input not recognized. Choose device ['o' for iPhone, "
-                                                "'a' for iPad, 'q' to quit]\n> ")
-if device_type.lower() == 'o':
-    bu_root = IPHONE_BU_ROOT
-elif device_type.lower() == 'a':
-    bu_root = IPAD_BU_ROOT
-elif device_type.lower() == 'q':
-    quit()
+        elif prog.lower() == 'g':
+            run_org(bu_root, buffer_root)
 
-buffer_root = bu_root + "Cat_Buffer/"
+        elif prog.lower() == 'c':
+            run_cat(buffer_root)
 
-# Main loop
-while True:
-    prog = input("Choose program to run:\n"
-                 "\tType 'f' to run the OFFLOAD program only.\n"
-                 "\tType 'g' to run the ORGANIZE (by date) program only.\n"
-                 "\tType 'c' to run the CATEGORIZE program only.\n"
-                 "\tType 'a' or press Enter to run all three programs.\n"
-                 "\tType 'q' to quit.\n"
-                 "\tType 'h' for help.\n> ")
+        elif prog.lower() == 's':
+            run_full_sync(bu_root)
 
-    if prog.lower() == 'f':
-        run_offload(bu_root)
+        elif prog.lower() == 'q':
+            break
 
-    elif prog.lower() == 'g':
-        run_org(bu_root, buffer_root)
+        elif prog.lower() == 'a':
+            run_all(bu_root, buffer_root)
+            break
 
-    elif prog.lower() == 'c':
-        run_cat(buffer_root)
+        elif prog.lower() == 'h':
+            print("\tBasic workflow:\n"
+                "\t\tRun OFFLOAD and ORGANIZE.\n"
+                "\t\tLook at buffer, move all st vids or other big blocks of pics.\n"
+                "\t\tRun CAT tool on rest of pics in buffer.\n"
+                "\t\tProcess leftover uncategorized pics.\n"
+                "\t\tCopy data to NAS.\n")
 
-    elif prog.lower() == 'q':
-        break
+        else:
+            print("Invalid response. Try again.")
 
-    elif prog.lower() == 'a':
-        run_all(bu_root, buffer_root)
-        break
 
-    elif prog.lower() == 'h':
-        print("\tBasic workflow:\n"
-            "\t\tRun OFFLOAD and ORGANIZE.\n"
-            "\t\tLook at buffer, move all st vids or other big blocks of pics.\n"
-            "\t\tRun CAT tool on rest of pics in buffer.\n"
-            "\t\tProcess leftover uncategorized pics.\n"
-            "\t\tCopy data to NAS.\n")
+def main(argv):
+    parser = argparse.ArgumentParser(description="Back up iPhone/iPad "
+                "pictures. With no program given, shows interactive menu.")
+    parser.add_argument("--device", choices=["iphone", "ipad"],
+                                        help="device to back up (else asked)")
+    parser.add_argument("--policy", help="TOML or YAML file answering "
+                                        "prompts (see prompt_policy.py)")
+    parser.add_argument("--headless", action="store_true",
+                        help="stop with error at any prompt policy file "
+                                        "doesn't answer, instead of waiting")
+    programs = parser.add_subparsers(dest="program", metavar="program")
+    programs.add_parser("offload", help="copy new pictures off device")
+    programs.add_parser("organize", help="sort offloaded pictures by date")
+    programs.add_parser("categorize", help="sort buffer into target dirs")
+    programs.add_parser("all", help="offload, organize, then categorize")
+    programs.add_parser("sync", help="sync whole BU trees to NAS "
+                                                            "(full compare)")
+    datestamp_parser = programs.add_parser("datestamp",
+                        help="prepend capture date to image names")
+    datestamp_parser.add_argument("paths", nargs="+",
+                                            help="images or dirs of images")
+    datestamp_parser.add_argument("--long", action="store_true",
+                                        help="date and time (default date)")
+    datestamp_parser.add_argument("--recursive", "-r", action="store_true",
+                                        help="all images below each dir")
+    args = parser.parse_args(argv)
 
-    else:
-        print("Invalid response. Try again.")
+    if args.policy:
+        POLICY.load(args.policy)
+    if args.headless:
+        POLICY.headless = True
+
+    try:
+        if args.program == "datestamp":
+            all_ok = run_datestamp(args.paths, args.long, args.recursive)
+            return 0 if all_ok else 1
+
+        bu_root = choose_bu_root(args.device)
+        if not bu_root:
+            return 0
+        buffer_root = bu_root + "Cat_Buffer/"
+        track_synced_roots(bu_root)
+
+        try:
+            if args.program == "offload":
+                run_offload(bu_root)
+            elif args.program == "organize":
+                run_org(bu_root, buffer_root)
+            elif args.program == "categorize":
+                run_cat(buffer_root)
+            elif args.program == "all":
+                run_all(bu_root, buffer_root)
+            elif args.program == "sync":
+                run_full_sync(bu_root)
+            else:
+                run_menu(bu_root, buffer_root)
+        except BaseException:
+            # Let syncs already queued finish, without hiding the error.
+            SYNC.wait()
+            SYNC.report()
+            raise
+        SYNC.finish()
+    except PolicyError as err:
+        print("\nStopped: %s" % err)
+        return 2
+    except nas_sync.SyncError as err:
+        print("\n%s" % err)
+        return 3
+    return 0
+
+
+# NAS syncs queued by each program run in background while the next program
+# runs, and are waited on (with summary) before exit.
+SYNC = nas_sync.SyncManager()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,249 @@
+import os
+import time
+import errno
+import shutil
+import threading
+
+from dir_index import DIR_INDEX
+import file_compare
+from change_manifest import MANIFEST
+
+
+# Move primitive for categorization targets. Within one filesystem a move is
+# just os.rename(). When the target is on another filesystem (e.g. CAT_DIRS on
+# an external or network drive), shutil.move would copy then delete with no
+# durability or integrity check. Here the file is instead streamed to a temp
+# name in the target dir with its digest computed on the way, then renamed
+# into place. The source isn't deleted yet. Pending moves are committed in
+# batches per target dir: fsync each new file, fsync the dir once, re-read
+# each file from disk to check its digest, and only then unlink the source.
+# If power is lost before a commit, the source is still in the buffer, and the
+# next run finds the target copy as a same-hash collision. Renamed files'
+# dirs are fsynced once each at sync(). The change manifest only gets a
+# moved file's new path once it's in place (renamed, or copy verified).
+
+FSYNC_BATCH = 64             # pending moves per target dir before commit
+PART_SUFFIX = ".part"
+
+
+def fsync_paths(file_paths):
+    """fsync each file, then each of their dirs once (so new names are
+    durable too). Files that no longer exist are skipped."""
+    dir_paths = []
+    for file_path in file_paths:
+        try:
+            with open(file_path, 'rb') as file_obj:
+                os.fsync(file_obj.fileno())
+        except (FileNotFoundError, IsADirectoryError):
+            continue
+        if os.path.dirname(file_path) not in dir_paths:
+            dir_paths.append(os.path.dirname(file_path))
+    return fsync_dirs(dir_paths)
+
+
+def fsync_dirs(dir_paths):
+    """fsync each dir, so renames into or out of it are durable. Returns
+    number of dirs synced."""
+    for dir_path in dir_paths:
+        dir_fd = os.open(dir_path, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return len(dir_paths)
+
+
+class PendingMove(object):
+    """Cross-device copy waiting for commit before source is unlinked."""
+    __slots__ = ("src_path", "dest_path", "digest", "size")
+
+    def __init__(self, src_path, dest_path, digest, size):
+        self.src_path = src_path
+        self.dest_path = dest_path
+        self.digest = digest
+        self.size = size
+
+
+class MoveEngine(object):
+    """Moves files by rename where possible, else by verified copy + unlink
+    (see above). Safe to share between threads. Call sync() before relying on
+    sources being gone (pending sources still exist until then)."""
+    def __init__(self, fsync_batch=FSYNC_BATCH, verify=True):
+        self.fsync_batch = fsync_batch
+        self.verify = verify
+        self.lock = threading.Lock()
+        self.pending = {}       # target dir -> list of PendingMove
+        self.pending_srcs = set()
+        self.renamed_dirs = set()   # dirs of renames not yet fsynced
+        self.failures = []      # (src path, dest path, reason)
+        # Stats
+        self.renamed = 0
+        self.copied = 0
+        self.bytes_copied = 0
+        self.copy_seconds = 0.0
+        self.bytes_verified = 0
+        self.fsyncs = 0
+        self.commit_seconds = 0.0
+
+    def move(self, src_path, dest_path):
+        """Move src_path to dest_path (which must not exist) and record it in
+        change manifest. Returns dest_path. Across filesystems, src_path is
+        unlinked (and move recorded) at next commit."""
+        try:
+            os.rename(src_path, dest_path)
+        except OSError as err:
+            if err.errno != errno.EXDEV:
+                raise
+        else:
+            DIR_INDEX.discard(os.path.dirname(src_path),
+                                                os.path.basename(src_path))
+            MANIFEST.moved(src_path, dest_path)
+            with self.lock:
+                self.renamed += 1
+                self.renamed_dirs.update([os.path.dirname(src_path),
+                                                    os.path.dirname(dest_path)])
+            return dest_path
+
+        pending_move = self.copy(src_path, dest_path)
+        dest_dir = os.path.dirname(dest_path)
+        with self.lock:
+            self.pending.setdefault(dest_dir, []).append(pending_move)
+            self.pending_srcs.add(src_path)
+            batch_full = len(self.pending[dest_dir]) >= self.fsync_batch
+        if batch_full:
+            self.commit(dest_dir)
+        return dest_path
+
+    def copy(self, src_path, dest_path):
+        """Stream src_path to a temp name next to dest_path, hashing as it
+        goes, then rename into place. Returns PendingMove."""
+        part_path = os.path.join(os.path.dirname(dest_path),
+                            "." + os.path.basename(dest_path) + PART_SUFFIX)
+        start_time = time.perf_counter()
+        hasher = file_compare.new_hasher()
+        buffer = bytearray(file_compare.CHUNK_SIZE)
+        view = memoryview(buffer)
+        size = 0
+        try:
+            with open(src_path, 'rb', buffering=0) as src_file, \
+                                open(part_path, 'wb', buffering=0) as dest_file:
+                while True:
+                    bytes_read = src_file.readinto(buffer)
+                    if not bytes_read:
+                        break
+                    hasher.update(view[:bytes_read])
+                    written = 0
+                    while written < bytes_read:
+                        written += dest_file.write(view[written:bytes_read])
+                    size += bytes_read
+            shutil.copystat(src_path, part_path)
+            os.rename(part_path, dest_path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+        with self.lock:
+            self.copied += 1
+            self.bytes_copied += size
+            self.copy_seconds += time.perf_counter() - start_time
+        return PendingMove(src_path, dest_path, hasher.digest(), size)
+
+    def is_pending(self, src_path):
+        """True if src_path was moved but not yet unlinked."""
+        with self.lock:
+            return src_path in self.pending_srcs
+
+    def pending_paths(self):
+        with self.lock:
+            return set(self.pending_srcs)
+
+    def commit(self, dest_dir):
+        """Make pending copies in dest_dir durable, verify them, and unlink
+        their sources."""
+        with self.lock:
+            batch = self.pending.pop(dest_dir, [])
+        if not batch:
+            return
+        start_time = time.perf_counter()
+
+        fsync_paths([pending_move.dest_path for pending_move in batch])
+
+        for pending_move in batch:
+            reason = self.check(pending_move)
+            if reason:
+                # Keep source. Remove bad copy so retry doesn't see collision.
+                with self.lock:
+                    self.failures.append((pending_move.src_path,
+                                                pending_move.dest_path, reason))
+                if os.path.exists(pending_move.dest_path):
+                    os.remove(pending_move.dest_path)
+                DIR_INDEX.discard(dest_dir,
+                                    os.path.basename(pending_move.dest_path))
+            else:
+                os.remove(pending_move.src_path)
+                DIR_INDEX.discard(os.path.dirname(pending_move.src_path),
+                                    os.path.basename(pending_move.src_path))
+                MANIFEST.moved(pending_move.src_path, pending_move.dest_path)
+            with self.lock:
+                self.pending_srcs.discard(pending_move.src_path)
+
+        with self.lock:
+            self.fsyncs += len(batch) + 1
+            self.commit_seconds += time.perf_counter() - start_time
+
+    def check(self, pending_move):
+        """Returns reason copy is bad, or None if it matches source."""
+        try:
+            dest_size = os.stat(pending_move.dest_path).st_size
+        except OSError as err:
+            return str(err)
+        if dest_size != pending_move.size:
+            return "size %d != %d" % (dest_size, pending_move.size)
+        if not self.verify:
+            return None
+
+        with open(pending_move.dest_path, 'rb') as dest_file:
+            if hasattr(os, "posix_fadvise"):
+                # Already flushed, so drop cached pages to make the digest
+                # read back what's actually on disk.
+                os.posix_fadvise(dest_file.fileno(), 0, 0,
+                                                    os.POSIX_FADV_DONTNEED)
+        digest = file_compare.full_digest(pending_move.dest_path)
+        with self.lock:
+            self.bytes_verified += pending_move.size
+        if digest != pending_move.digest:
+            return "digest mismatch"
+        return None
+
+    def sync(self):
+        """Commit all pending moves, and make renames durable."""
+        with self.lock:
+            dest_dirs = list(self.pending)
+            renamed_dirs, self.renamed_dirs = self.renamed_dirs, set()
+        for dest_dir in dest_dirs:
+            self.commit(dest_dir)
+        fsync_dirs(sorted(dir_path for dir_path in renamed_dirs
+                                                if os.path.isdir(dir_path)))
+        with self.lock:
+            self.fsyncs += len(renamed_dirs)
+
+    def report(self):
+        """Print stats (if any copies made) and failures, then clear
+        failures."""
+        with self.lock:
+            failures, self.failures = self.failures, []
+            if self.copied:
+                mb_copied = self.bytes_copied / 1e6
+                print("Moves: %d renamed, %d copied across filesystems "
+                      "(%.1f MB at %.1f MB/s, %.1f MB verified, %d fsyncs "
+                      "in %.1f s)" % (self.renamed, self.copied, mb_copied,
+                            mb_copied / max(self.copy_seconds, 1e-6),
+                            self.bytes_verified / 1e6, self.fsyncs,
+                            self.commit_seconds))
+        for src_path, dest_path, reason in failures:
+            print("Copy of %s to %s failed verification (%s). Source left in "
+                                        "place." % (src_path, dest_path, reason))
+
+
+MOVE_ENGINE = MoveEngine()
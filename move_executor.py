@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+# Background I/O queue for categorization decisions. Moves and copies run in a
+# thread pool while the user goes on to the next image. Tasks run in the order
+# submitted, and a task waits for any earlier task on the same source file
+# (e.g. an '&' copy before the final move). Collisions that would need a prompt
+# aren't asked from the worker thread. They're held until the caller reaches a
+# safe point and calls resolve_collisions() (or flush()). Later tasks on the
+# same file are held with them so they still run in order.
+
+MOVE_WORKERS = 4
+
+
+class MoveExecutor(object):
+    """Ordered background executor for buffer file operations.
+    resolve_collision is called in the caller's thread for each deferred
+    collision with (img_path, target_dir, new_name, move_op), and may prompt."""
+    def __init__(self, resolve_collision, workers=MOVE_WORKERS):
+        self.resolve_collision = resolve_collision
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.futures = set()
+        self.tails = {}         # src path -> latest Future for that file
+        # Source files that are being moved/removed or have a deferred
+        # collision. No longer available in the buffer from user's view.
+        self.claimed = {}       # src path -> number of claiming tasks
+        # Held for resolve_collisions(), in order: (src path, func, args, claim)
+        self.deferred = []
+        self.blocked = {}       # src path -> number of held entries
+        self.resolving = False
+        self.errors = []
+
+    def submit(self, src_path, func, *args, claim=False):
+        """Queue func(*args) as a task on src_path. claim=True marks the file
+        as leaving the buffer (move or delete)."""
+        with self.lock:
+            prev = self.tails.get(src_path)
+            if claim:
+                self.claimed[src_path] = self.claimed.get(src_path, 0) + 1
+            future = self.pool.submit(self.run_task, prev, src_path, func,
+                                                                args, claim)
+            self.tails[src_path] = future
+            self.futures.add(future)
+        return future
+
+    def run_task(self, prev, src_path, func, args, claim):
+        if prev:
+            # Earlier task on same file was submitted first, so it's already
+            # running or done (pool is FIFO). Never deadlocks.
+            wait([prev])
+        with self.lock:
+            if src_path in self.blocked:
+                # Earlier task on this file is waiting on a collision decision.
+                # Hold this one too. The held entry takes over this task's
+                # claim on the file (released by resolve_collisions()).
+                self.hold(src_path, func, args, claim, add_claim=False)
+                return None
+        try:
+            return func(*args)
+        except Exception as err:
+            with self.lock:
+                self.errors.append((src_path, err))
+        finally:
+            if claim:
+                self.unclaim(src_path)
+
+    def hold(self, src_path, func, args, claim, add_claim=True):
+        """Add entry for resolve_collisions(). Call with lock held.
+        add_claim=False if the caller already holds the claim being handed
+        over to the entry."""
+        self.deferred.append((src_path, func, args, claim))
+        self.blocked[src_path] = self.blocked.get(src_path, 0) + 1
+        if claim and add_claim:
+            self.claimed[src_path] = self.claimed.get(src_path, 0) + 1
+
+    def unclaim(self, src_path):
+        with self.lock:
+            self.claimed[src_path] -= 1
+            if not self.claimed[src_path]:
+                del self.claimed[src_path]
+
+    def is_claimed(self, src_path):
+        with self.lock:
+            return src_path in self.claimed
+
+    def claimed_paths(self):
+        with self.lock:
+            return set(self.claimed)
+
+    def defer_collision(self, img_path, target_dir, new_name, move_op):
+        """on_collision hook for copy_to_target(). Holds the collision for
+        resolve_collisions() and tells copy_to_target to skip for now.
+        While resolving, tells copy_to_target to prompt as usual instead."""
+        if self.resolving:
+            return ""
+        with self.lock:
+            # Keeps file claimed until collision is resolved if it's a move.
+            self.hold(img_path, self.resolve_collision,
+                            (img_path, target_dir, new_name, move_op), move_op)
+        return None
+
+    def resolve_collisions(self):
+        """Ask about deferred collisions (and run tasks held behind them) in
+        order. Call only at a safe point (between prompts, in main thread)
+        after wait()."""
+        self.resolving = True
+        try:
+            while True:
+                with self.lock:
+                    if not self.deferred:
+                        return
+                    src_path, func, args, claim = self.deferred.pop(0)
+                try:
+                    func(*args)
+                except Exception as err:
+                    with self.lock:
+                        self.errors.append((src_path, err))
+                finally:
+                    with self.lock:
+                        self.blocked[src_path] -= 1
+                        if not self.blocked[src_path]:
+                            del self.blocked[src_path]
+                    if claim:
+                        self.unclaim(src_path)
+        finally:
+            self.resolving = False
+
+    def wait(self):
+        """Block until all queued tasks are done."""
+        with self.lock:
+            futures = set(self.futures)
+        wait(futures)
+        with self.lock:
+            self.futures.difference_update(futures)
+            for src_path in [src_path for src_path, future in
+                                self.tails.items() if future in futures]:
+                del self.tails[src_path]
+
+    def report_errors(self):
+        with self.lock:
+            errors, self.errors = self.errors, []
+        for src_path, err in errors:
+            print("Failed to transfer %s (left in place):\n\t%s"
+                                                            % (src_path, err))
+
+    def flush(self):
+        """Exit barrier. Waits for all queued tasks, then asks about any
+        deferred collisions and reports failures."""
+        self.wait()
+        self.resolve_collisions()
+        self.wait()
+        self.report_errors()
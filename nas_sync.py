@@ -0,0 +1,310 @@
+import os
+import re
+import time
+import queue
+import threading
+import subprocess
+
+from move_engine import fsync_paths
+
+
+# Runs NAS rsync jobs in a background thread of this program (instead of in a
+# separate gnome-terminal), so the backup program knows whether each sync
+# worked and can report it at the end of the run. Works without a desktop
+# session. Jobs run one at a time in the order queued. A job queued for a
+# destination that already has one waiting is merged into it, since one
+# rsync run picks up everything. (If that destination's sync is already
+# running, the new job waits and runs after it, to catch files added since.)
+# Options are the same as NAS_BU_sync.sh / NAS_ST_sync.sh, plus
+# --info=progress2 for overall throughput and ETA. With ssh_port None the
+# destination is a plain local path (e.g. a mounted NAS share, or a test dir).
+# A job given a change manifest only syncs paths recorded there (see
+# change_manifest.py): they're passed with --files-from, and any of them no
+# longer in the source tree are deleted on the NAS (--delete-missing-args).
+# A full job walks and compares the whole tree, as the scripts do.
+# A streaming job (stream=True) is queued as soon as a folder is finished, so
+# NAS transfer overlaps with the offload or organize still going on. It takes
+# only changes recorded up to when it was queued, and fsyncs those files
+# locally before sending them.
+
+RSYNC_OPTIONS = ["-rltgoD", "-zi", "--info=progress2"]
+# first group of options is equivalent to -a without the -p (permissions)
+
+# e.g. "  1,234,567,890  45%   12.34MB/s    0:01:23 (xfr#12, to-chk=34/567)"
+PROGRESS_PATTERN = re.compile(r"^\s*([\d,]+)\s+(\d+)%\s+(\S+/s)\s+"
+                                                        r"(\d+:\d{2}:\d{2})")
+# rsync exit code for "some files vanished before they could be transferred".
+RSYNC_VANISHED = 24
+# Added for manifest-driven jobs. --force lets a deleted dir be removed on the
+# NAS even if it still has files there.
+MANIFEST_OPTIONS = ["--from0", "--delete-missing-args", "--force"]
+
+
+class SyncError(Exception):
+    pass
+
+
+class SyncJob(object):
+    """One rsync run from src_path (trailing slash) to dest_path. log_root is
+    the dir holding rsync_logs/ and rsync_partials/.
+    With a ChangeManifest, only recorded changes are synced unless full is
+    True (full tree compared, then manifest cleared)."""
+    def __init__(self, name, src_path, dest_path, log_root, ssh_port=None,
+                                    manifest=None, full=False, stream=False):
+        self.name = name
+        self.src_path = src_path
+        self.dest_path = dest_path
+        self.log_root = log_root
+        self.ssh_port = ssh_port
+        self.manifest = manifest
+        self.full = full
+        self.stream = stream
+        # Manifest files to sync (set when streaming job queued), or None for
+        # all recorded changes as of when job starts.
+        self.manifest_files = None
+        self.extra_args = []
+        self.changed_count = None   # paths synced from manifest
+
+        self.status = "queued"      # queued, running, ok, failed
+        self.returncode = None
+        self.error = None
+        self.bytes_sent = 0
+        self.percent = 0
+        self.rate = ""
+        self.eta = ""
+        self.coalesced = 0          # later requests merged into this job
+        self.start_time = None
+        self.end_time = None
+        self.output_tail = []       # last lines of rsync output if failed
+
+    def key(self):
+        return (self.dest_path, self.full)
+
+    def command(self):
+        timestamp = time.strftime("%Y-%m-%dT%H%M%S")
+        command = ["rsync"] + RSYNC_OPTIONS + [
+            "--log-file=%s/rsync_logs/%s_%s" % (self.log_root, timestamp,
+                                                                    self.name),
+            "--partial-dir=%s/rsync_partials" % self.log_root]
+        if self.ssh_port:
+            command += ["-e", "ssh -p %d" % self.ssh_port]
+        return command + self.extra_args + [self.src_path, self.dest_path]
+
+    def update_progress(self, line):
+        match = PROGRESS_PATTERN.match(line)
+        if match:
+            self.bytes_sent = int(match.group(1).replace(",", ""))
+            self.percent = int(match.group(2))
+            self.rate = match.group(3)
+            self.eta = match.group(4)
+        return bool(match)
+
+    def describe(self):
+        if self.status == "running":
+            return ("%s: %d%% (%.1f MB) at %s, ETA %s" % (self.name,
+                        self.percent, self.bytes_sent / 1e6, self.rate, self.eta))
+        elif self.status in ["ok", "failed"]:
+            result = "OK" if self.status == "ok" else "FAILED"
+            if self.full:
+                result += " (full tree)"
+            elif self.changed_count is not None:
+                result += " (%d changed paths)" % self.changed_count
+            if self.error:
+                result += " (%s)" % self.error
+            return ("%s -> %s: %s, %.1f MB in %.0f s" % (self.name,
+                            self.dest_path, result, self.bytes_sent / 1e6,
+                            self.end_time - self.start_time))
+        return "%s -> %s: %s" % (self.name, self.dest_path, self.status)
+
+
+def bu_job(src_dir, nas_bu_root, ssh_port=None, manifest=None, full=False,
+                                                                stream=False):
+    """Job syncing Raw_Offload/ or Organized/ dir of a device BU root to the
+    same place under NAS BU root (same paths as NAS_BU_sync.sh)."""
+    job_name = os.path.basename(src_dir.rstrip("/"))     # e.g. Raw_Offload
+    src_bu_root = os.path.dirname(src_dir.rstrip("/"))
+    dev = os.path.basename(src_bu_root)                  # e.g. iPhone_Pictures
+    return SyncJob(job_name, src_dir, "%s/%s/%s" % (nas_bu_root.rstrip("/"),
+                dev, job_name), src_bu_root, ssh_port, manifest, full, stream)
+
+
+def st_job(src_dir, nas_st_dir, ssh_port=None, manifest=None, full=False,
+                                                                stream=False):
+    """Job syncing st video dir to NAS (same paths as NAS_ST_sync.sh)."""
+    job_name = os.path.basename(src_dir.rstrip("/"))
+    return SyncJob(job_name, src_dir, nas_st_dir,
+            os.path.dirname(src_dir.rstrip("/")), ssh_port, manifest, full,
+                                                                        stream)
+
+
+class SyncManager(object):
+    """Queue of SyncJobs run by one background worker thread."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs = []              # every job submitted, in order
+        self.waiting = {}           # job key -> job not yet started
+        self.queue = queue.Queue()
+        self.worker = None
+        self.current = None
+
+    def submit(self, job):
+        """Queue job, or merge it into the same destination's waiting job.
+        Returns the job that will do the sync."""
+        if job.stream and job.manifest and not job.full:
+            job.manifest_files = job.manifest.rotate(job.src_path)
+        with self.lock:
+            waiting_job = self.waiting.get(job.key())
+            if waiting_job:
+                waiting_job.coalesced += 1
+                if waiting_job.manifest_files is not None:
+                    if job.manifest_files is None:
+                        # Now has to take everything recorded.
+                        waiting_job.manifest_files = None
+                    else:
+                        waiting_job.manifest_files = sorted(
+                            set(waiting_job.manifest_files + job.manifest_files))
+                return waiting_job
+            self.waiting[job.key()] = job
+            self.jobs.append(job)
+            if not self.worker:
+                self.worker = threading.Thread(target=self.run_jobs)
+                self.worker.start()
+        self.queue.put(job)
+        return job
+
+    def run_jobs(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self.lock:
+                del self.waiting[job.key()]
+                self.current = job
+            self.run_job(job)
+            with self.lock:
+                self.current = None
+
+    def run_job(self, job):
+        job.status = "running"
+        job.start_time = time.time()
+        manifest_files = []
+        files_from = None
+        if job.manifest:
+            manifest_files, rel_paths = job.manifest.take(job.src_path,
+                                                            job.manifest_files)
+            if job.stream and rel_paths:
+                # Make sure local copies are on disk before they're sent.
+                fsync_paths([job.src_path + rel_path
+                                            for rel_path in sorted(rel_paths)])
+            if not job.full:
+                job.changed_count = len(rel_paths)
+                if not rel_paths:
+                    job.status = "ok"
+                    job.end_time = time.time()
+                    job.manifest.done(manifest_files)
+                    return
+                files_from = "%s/rsync_logs/%s_%s.files" % (job.log_root,
+                                time.strftime("%Y-%m-%dT%H%M%S"), job.name)
+
+        try:
+            os.makedirs("%s/rsync_logs" % job.log_root, exist_ok=True)
+            command = job.command()
+            if files_from:
+                with open(files_from, "wb") as files_from_file:
+                    for rel_path in sorted(rel_paths):
+                        files_from_file.write(rel_path.encode() + b"\0")
+                command[-2:-2] = (["--files-from=%s" % files_from]
+                                                        + MANIFEST_OPTIONS)
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                            stderr=subprocess.STDOUT)
+        except OSError as err:
+            job.status = "failed"
+            job.error = str(err)
+            job.end_time = time.time()
+            return
+
+        # progress2 lines are ended by \r (updated in place), others by \n.
+        output_tail = []
+        line = b""
+        while True:
+            data = proc.stdout.read1(4096)
+            if not data:
+                break
+            for part in re.split(rb"([\r\n])", data):
+                if part in [b"\r", b"\n"]:
+                    text = line.decode(errors="replace")
+                    if text.strip() and not job.update_progress(text):
+                        output_tail = (output_tail + [text])[-20:]
+                    line = b""
+                else:
+                    line += part
+        job.returncode = proc.wait()
+        job.end_time = time.time()
+
+        if job.returncode == 0:
+            job.status = "ok"
+        elif job.returncode == RSYNC_VANISHED:
+            job.status = "ok"
+            job.error = "some source files vanished during sync"
+        else:
+            job.status = "failed"
+            job.error = "rsync exit code %d" % job.returncode
+            job.output_tail = output_tail
+
+        if job.status == "ok" and job.manifest:
+            # Failed job's changes are left for the next sync.
+            job.manifest.done(manifest_files)
+        if files_from and os.path.exists(files_from):
+            os.remove(files_from)
+
+    def status(self):
+        """One-line description of running job, or "" if idle."""
+        with self.lock:
+            return self.current.describe() if self.current else ""
+
+    def wait(self, show_progress=True):
+        """Block until all queued jobs are done, showing progress of the
+        running one on one line."""
+        with self.lock:
+            worker = self.worker
+            self.worker = None
+        if not worker:
+            return
+        self.queue.put(None)
+        while worker.is_alive():
+            worker.join(0.5)
+            if show_progress and self.status():
+                print("\r%-79s" % self.status()[:79], end="", flush=True)
+        if show_progress:
+            print("\r%-79s\r" % "", end="")
+
+    def report(self):
+        """Print summary of every job submitted. Returns True if all OK."""
+        all_ok = True
+        if self.jobs:
+            print("NAS sync summary:")
+        for job in self.jobs:
+            print("\t%s" % job.describe())
+            if job.coalesced:
+                print("\t\t(%d later requests merged into this sync)"
+                                                            % job.coalesced)
+            if job.status == "failed":
+                all_ok = False
+                for line in job.output_tail:
+                    print("\t\t%s" % line)
+        return all_ok
+
+    def finish(self):
+        """Wait for all jobs, then report. Raises SyncError if any failed."""
+        if self.jobs:
+            print("\nWaiting for NAS sync to finish...")
+        self.wait()
+        all_ok = self.report()
+        if self.jobs:
+            # Add these runs to sync history and point out any regressions.
+            # (Imported here since sqlite3 is only needed at the end.)
+            import rsync_history
+            rsync_history.record_syncs(sorted(set(job.log_root
+                                                    for job in self.jobs)))
+        if not all_ok:
+            raise SyncError("NAS sync failed. See summary above.")
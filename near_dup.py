@@ -0,0 +1,154 @@
+import os
+
+# Optional: NumPy, PIL (and pillow_heif to let PIL read HEIC files),
+# imported on first use. See optional_deps.py.
+import optional_deps
+from file_compare import FileKeyCache
+from thumb_cache import DEFAULT_CACHE_DIR
+
+
+# Near-duplicate grouping for the categorizer. Bursts and repeated shots of the
+# same thing get the same categorization decision, so they're presented once.
+# Each image gets a 64-bit difference hash (dHash): shrink to 9x8 grayscale and
+# record whether each pixel is brighter than its right neighbor. Similar images
+# have hashes differing in few bits. Hashes are computed in worker processes
+# and cached by file identity. Clustering compares all pairs within each day's
+# images in NumPy blocks (XOR + bit count). Each cluster only takes images
+# close to its first image, which is the one shown for the whole group, so a
+# chain of gradually changing shots doesn't merge into one large group.
+
+HASH_SIZE = 8
+MAX_DISTANCE = 6           # max differing bits (of 64) to count as near-dup
+BLOCK_SIZE = 512           # rows compared per NumPy block
+HASH_CACHE_MAX = 200000
+HASH_CACHE_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), "dhash.json")
+
+
+def available():
+    return optional_deps.installed("numpy") and optional_deps.installed("PIL")
+
+
+def can_hash(img_path):
+    img_ext = os.path.splitext(img_path)[-1].upper()
+    if img_ext == ".HEIC":
+        return optional_deps.installed("pillow_heif")
+    return img_ext in [".JPG", ".JPEG", ".PNG", ".GIF"]
+
+
+def dhash(img_path):
+    """Returns 64-bit difference hash of image as int, or None if it can't
+    be read. Runs in worker process."""
+    PIL = optional_deps.pil()
+    try:
+        with PIL.Image.open(img_path) as img:
+            # JPEG decoder can downscale while decoding.
+            img.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+            small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE),
+                                                        PIL.Image.BILINEAR)
+            pixels = small.tobytes()
+    except (OSError, ValueError, SyntaxError):
+        return None
+
+    img_hash = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            img_hash = (img_hash << 1) | (left > right)
+    return img_hash
+
+
+def compute_hashes(img_paths, cache, workers=None):
+    """Returns dict of dHash keyed by img path for all hashable images,
+    computing any not in cache in parallel."""
+    hashes = {}
+    missing = []
+    for img_path in img_paths:
+        if not can_hash(img_path):
+            continue
+        img_hash = cache.get(img_path)
+        if img_hash is None:
+            missing.append(img_path)
+        else:
+            hashes[img_path] = img_hash
+
+    if missing:
+        from concurrent.futures import ProcessPoolExecutor    # (see thumb_cache)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for img_path, img_hash in zip(missing, pool.map(dhash, missing,
+                                    chunksize=max(1, len(missing) // 64))):
+                if img_hash is not None:
+                    hashes[img_path] = img_hash
+                    cache.put(img_path, img_hash)
+        cache.save()
+    return hashes
+
+
+def popcount(values):
+    """Number of set bits in each element of uint64 array."""
+    numpy = optional_deps.numpy()
+    if hasattr(numpy, "bitwise_count"):
+        return numpy.bitwise_count(values)
+    # NumPy < 2.0: count per byte with lookup table.
+    table = numpy.array([bin(n).count("1") for n in range(256)], numpy.uint8)
+    return table[values.view(numpy.uint8)].reshape(
+                                    values.shape + (8,)).sum(-1, numpy.uint8)
+
+
+def cluster_hashes(hash_list, max_distance=MAX_DISTANCE, block_size=BLOCK_SIZE):
+    """Function that groups hashes within max_distance bits of each cluster's
+    representative (its first member, the image shown when categorizing).
+    Clusters don't chain: a hash close only to other members starts its own.
+    Returns list of clusters (lists of indices into hash_list, ascending)
+    with more than one member."""
+    numpy = optional_deps.numpy()
+    hashes = numpy.array(hash_list, dtype=numpy.uint64)
+    count = len(hashes)
+    representative = [None] * count
+
+    for start in range(0, count, block_size):
+        block = hashes[start:start+block_size]
+        # Compare block rows against this and all later hashes only.
+        close = popcount(block[:, None] ^ hashes[None, start:]) <= max_distance
+        for row in range(len(block)):
+            i = start + row
+            if representative[i] is not None:
+                continue
+            # First unassigned hash (in order) represents a new cluster of
+            # all unassigned hashes close to it.
+            for col in numpy.nonzero(close[row])[0].tolist():
+                if representative[start + col] is None:
+                    representative[start + col] = i
+
+    clusters = {}
+    for i in range(count):
+        clusters.setdefault(representative[i], []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def find_near_dups(img_paths, cache=None, max_distance=MAX_DISTANCE,
+                                                                workers=None):
+    """Function that groups near-duplicate images among img_paths (sorted,
+    datestamped buffer paths). Only images with the same datestamp are
+    compared.
+    Returns dict of cluster member paths (sorted) keyed by the first one."""
+    if not available():
+        return {}
+    if cache is None:
+        cache = FileKeyCache(HASH_CACHE_PATH, HASH_CACHE_MAX)
+
+    hashes = compute_hashes(img_paths, cache, workers)
+
+    days = {}
+    for img_path in img_paths:
+        if img_path in hashes:
+            day = os.path.basename(img_path).split("_")[0]
+            days.setdefault(day, []).append(img_path)
+
+    groups = {}
+    for day_paths in days.values():
+        for members in cluster_hashes([hashes[path] for path in day_paths],
+                                                                max_distance):
+            member_paths = sorted(day_paths[i] for i in members)
+            groups[member_paths[0]] = member_paths
+    return groups
@@ -0,0 +1,62 @@
+import sys
+import threading
+import importlib
+import importlib.util
+
+
+# Heavy third-party packages (PIL, NumPy, pillow_heif, exiftool) imported on
+# first use instead of when the tools start. Importing them up front took
+# most of the startup time of every program, even ones that never open an
+# image (e.g. offload, NAS sync, --help). installed() checks for a package
+# without importing it.
+
+lock = threading.Lock()
+modules = {}        # module name -> module, or None if not installed
+
+
+def installed(module_name):
+    """True if module_name can be imported (doesn't import it)."""
+    if module_name in modules:
+        return modules[module_name] is not None
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def load(module_name):
+    """Module module_name, imported on first call, or None if not
+    installed."""
+    with lock:
+        if module_name not in modules:
+            try:
+                modules[module_name] = importlib.import_module(module_name)
+            except ImportError:
+                modules[module_name] = None
+        return modules[module_name]
+
+
+def pil():
+    """PIL package with Image, ImageOps, and ExifTags loaded, or None if not
+    installed. HEIC support is registered too if pillow_heif is installed."""
+    if "PIL" not in modules:
+        if load("PIL.Image"):
+            load("PIL.ImageOps")
+            load("PIL.ExifTags")
+            heif = load("pillow_heif")
+            if heif:
+                heif.register_heif_opener()
+        with lock:
+            modules["PIL"] = sys.modules.get("PIL") if modules["PIL.Image"] \
+                                                                    else None
+    return modules["PIL"]
+
+
+def pillow_heif():
+    """pillow_heif (registered with PIL), or None if not installed."""
+    pil()
+    return modules.get("pillow_heif")
+
+
+def numpy():
+    return load("numpy")
@@ -3,9 +3,21 @@ import shutil
 import time
 from tqdm import tqdm
 import subprocess
-import hashlib
+import json
+import bisect
+from concurrent.futures import as_completed
 
 from dir_names import CAT_DIRS
+import file_compare
+from dir_index import DIR_INDEX
+import preview
+import thumb_cache
+import near_dup
+import move_executor
+import target_index
+from move_engine import MOVE_ENGINE
+from change_manifest import MANIFEST
+from prompt_policy import POLICY
 
 
 
@@ -14,18 +26,89 @@ from dir_names import CAT_DIRS
 # Check for name collisions in target directory.
 # Allow manual path entry
 
+# Saved in buffer root after each photo_transfer() decision.
+CHECKPOINT_NAME = ".cat_checkpoint.json"
+
 
 class Categorizer(object):
-    def __init__(self, buffer_root):
+    def __init__(self, buffer_root, use_preview=True, group_near_dups=True):
         self.buffer_root = buffer_root
         self.manual_dir_list = []
 
+        # Preview page started on first image shown (if use_preview).
+        self.use_preview = use_preview
+        self.Preview = None
+        # Paths coming up after the current image, for preview prefetch.
+        self.upcoming_paths = []
+        # Thumbnail cache for grid view, created on first use.
+        self.Thumbs = None
+        # Near-duplicate clusters (dict of member paths keyed by first one).
+        # Found once per session on first photo_transfer() call.
+        self.group_near_dups = group_near_dups
+        self.near_dups = None
+        # Moves run in background so next image can be shown right away.
+        # Collisions are asked about at safe points (see flush() calls).
+        self.Mover = move_executor.MoveExecutor(copy_to_target)
+        # Targets used in this and past sessions, for lookup and suggestions.
+        self.Targets = target_index.TargetIndex(CAT_DIRS)
+
         # Display cat buffer
         display_dir(self.buffer_root)
 
     def add_manual_dir(self, dir_path):
         self.manual_dir_list.append(dir_path)
 
+    def queue_move(self, img_path, target_dir):
+        return self.Mover.submit(img_path, copy_to_target, img_path, target_dir,
+                        None, True, self.Mover.defer_collision, claim=True)
+
+    def queue_copy(self, img_path, target_dir):
+        self.Mover.submit(img_path, copy_to_target, img_path, target_dir,
+                        None, False, self.Mover.defer_collision)
+
+    def queue_remove(self, img_path):
+        self.Mover.submit(img_path, os.remove, img_path, claim=True)
+
+    def in_buffer(self, img_path):
+        """False if img already gone or queued to be moved/deleted."""
+        return (os.path.exists(img_path) and not self.Mover.is_claimed(img_path)
+                                        and not MOVE_ENGINE.is_pending(img_path))
+
+    def flush_moves(self):
+        """Finish queued moves (asking about any collisions held back), then
+        commit cross-filesystem moves so their sources are removed."""
+        self.Mover.flush()
+        MOVE_ENGINE.sync()
+        MOVE_ENGINE.report()
+
+    def start_preview(self):
+        self.Preview = preview.PreviewServer()
+        try:
+            url = self.Preview.start()
+        except OSError as err:
+            print("Couldn't start preview server (%s). Using external "
+                                                        "viewer instead." % err)
+            self.Preview = None
+            self.use_preview = False
+        else:
+            print("Preview page at %s" % url)
+            os_open(url)
+
+    def stop_preview(self):
+        if self.Preview:
+            self.Preview.stop()
+            self.Preview = None
+
+    def show_img(self, img_path):
+        """Display img in preview page if possible, else external viewer."""
+        if self.use_preview and not self.Preview:
+            self.start_preview()
+        if self.Preview:
+            self.Preview.show(img_path, self.upcoming_paths)
+            if preview.can_preview(img_path):
+                return
+        display_photo(img_path)
+
     def find_stored_dir(self, keyword, silent=False):
         """Retrieve directory path from preloaded list or from previously-used
         manual paths entered in this session."""
@@ -45,15 +128,81 @@ class Categorizer(object):
             if not silent: # Suppress duplicate output when called twice.
                 print("Interpreted '%s' as %s.\n" % (keyword, dirs_found[0]))
             return dirs_found[0]
-        else:
-            # If 0 paths found with keyword or if more than one found
-            # (ambiguous), don't return a path.
-            return None
+
+        # If 0 paths found with keyword or if more than one found (ambiguous),
+        # use most frecently-used dir from history with keyword, if any.
+        history_dir = self.Targets.lookup(keyword)
+        if history_dir and not silent:
+            print("Interpreted '%s' as %s.\n" % (keyword, history_dir))
+        return history_dir
+
+    def record_target(self, img_path, target_dir):
+        """Add decision to target history. Special-case prefixes from
+        get_target_dir() ('*' or '!NN') are ignored."""
+        if target_dir[0] == '*':
+            target_dir = target_dir[1:]
+        elif target_dir[0] == '!':
+            target_dir = target_dir[3:]
+        self.Targets.record(os.path.basename(img_path), target_dir)
+
+    def run_rule_cat(self):
+        """Function to move buffer files recognized by metadata alone (e.g.
+        screenshots) to their CAT_DIRS targets in bulk, per auto_cat rules.
+        Only files no rule matches are left for photo_transfer()."""
+        # Imported here since auto_cat uses date_compare, which imports this
+        # module.
+        import auto_cat
+
+        rules = auto_cat.load_rules(CAT_DIRS)
+        buffered_imgs = self.list_buffer()
+        if not rules or not buffered_imgs:
+            return
+
+        print("Checking %d buffer files against auto-cat rules."
+                                                        % len(buffered_imgs))
+        plan = auto_cat.plan_auto_cat([self.buffer_root + img
+                                            for img in buffered_imgs], rules)
+        if not plan:
+            print("No files matched auto-cat rules.")
+            return
+
+        print("Auto-cat rules matched:")
+        for rule in rules:
+            matched = [path for path in plan if plan[path] is rule]
+            if matched:
+                print("\t%s -> %s:\t%d files" % (rule.name, rule.target,
+                                                                len(matched)))
+        proceed = POLICY.ask("auto_cat_confirm",
+                    "Move these %d files now? [Y/N]\n> " % len(plan))
+        if proceed.lower() != 'y':
+            return
+
+        for img_path in sorted(plan):
+            rule = plan[img_path]
+            if rule.target == "st":
+                target_dir = self.get_st_target_dir(img_path)
+            else:
+                target_dir = CAT_DIRS[rule.target]
+            self.queue_move(img_path, target_dir)
+        print("Moving...")
+        self.flush_moves()
+
+        routed = {}
+        for img_path in plan:
+            if not os.path.exists(img_path):
+                routed[plan[img_path].name] = routed.get(plan[img_path].name,
+                                                                        0) + 1
+
+        print("Auto-categorized by rule:")
+        for rule_name in routed:
+            print("\t%s:\t%d files" % (rule_name, routed[rule_name]))
+        print("%d files left in buffer.\n" % (len(buffered_imgs)
+                                                    - sum(routed.values())))
 
     def run_auto_cat(self):
         """Function to automatically categorize st media that user puts in
-        st_buffer.
-        Later may have other auto categorizing groups, but for now just st."""
+        st_buffer. Rule-based categorization (run_rule_cat) runs first."""
+        self.run_rule_cat()
 
         # Initialize st buffer directory to automatically categorize from.
         # Program will automatically categorize by date and move to st root.
@@ -65,39 +214,202 @@ class Categorizer(object):
         display_dir(st_buffer_path)
 
         # Prompt to move stuff in bulk before looping through img display.
-        input("\nDo any mass copies from categorization buffer now (e.g. "
+        POLICY.ask("mass_copy_pause",
+                    "\nDo any mass copies from categorization buffer now (e.g. "
                 "into st_buffer) before proceeding."
-                "\nPress Enter when ready to continue Cat program.")
+                "\nPress Enter when ready to continue Cat program.",
+                                                                default="")
 
-        st_buffer_imgs = os.listdir(st_buffer_path)
+        st_buffer_imgs = sorted(img for img in os.listdir(st_buffer_path)
+                            # Ignore dirs. Shouldn't happen, but handling
+                            # just in case.
+                            if not os.path.isdir(st_buffer_path + img))
         if st_buffer_imgs:
-            st_buffer_imgs.sort()
-
-            # Loop through st_buffer categorize.
-            print("Categorizing st_buffer media now. Progress:")
-            for img in tqdm(st_buffer_imgs):
-                img_path = st_buffer_path + img
-                if os.path.isdir(img_path):
-                    # Ignore. Shouldn't happen, but handling just in case.
-                    continue
-
-                target_dir = self.get_target_dir(img_path, "st")
-                if target_dir:
-                    copy_to_target(img_path, target_dir, move_op=True)
-                else:
-                    # If user chooses to discard img, None is returned by
-                    # get_target_dir. Delete image from buffer.
-                    os.remove(img_path)
-
+            self.st_bulk_move([st_buffer_path + img for img in st_buffer_imgs])
             print("Successfully categorized media from st_buffer.")
         else:
             print("Nothing in st_buffer.")
 
+    def st_bulk_move(self, img_paths):
+        """Function to move st media into dated folders in st root in bulk.
+        Files are grouped by datestamp, each missing date folder is created
+        once, then all moves run in parallel on the background queue.
+        Collisions are asked about afterward, same as for one-at-a-time
+        moves."""
+        date_groups = {}
+        for img_path in img_paths:
+            img_date = os.path.basename(img_path).split('_')[0]
+            date_groups.setdefault(img_date, []).append(img_path)
+
+        print("Categorizing %d st media files into %d date folders. Progress:"
+                                        % (len(img_paths), len(date_groups)))
+        moves = []
+        for img_date in sorted(date_groups):
+            target_dir = self.get_st_target_dir(date_groups[img_date][0])
+            for img_path in date_groups[img_date]:
+                moves.append(self.queue_move(img_path, target_dir))
+        for move in tqdm(as_completed(moves), total=len(moves)):
+            pass
+        self.flush_moves()
+
+    def grid_transfer(self):
+        """Function to show contact sheet of buffer images, numbered, and move
+        selected ranges of them to one target at a time. Returns when user
+        presses Enter with no selection."""
+        if not self.Thumbs:
+            self.Thumbs = thumb_cache.ThumbCache()
+
+        while True:
+            buffered_imgs = self.list_buffer()
+            if not buffered_imgs:
+                return
+            img_paths = [self.buffer_root + img for img in buffered_imgs]
+
+            print("Loading thumbnails for %d buffer images." % len(img_paths))
+            thumbs = self.Thumbs.build(img_paths)
+            if self.use_preview and not self.Preview:
+                self.start_preview()
+            if self.Preview:
+                self.Preview.show_grid(img_paths, thumbs)
+            else:
+                for n, img in enumerate(buffered_imgs):
+                    print("\t%d:\t%s" % (n+1, img))
+
+            response = POLICY.ask("grid_selection",
+                        "\nEnter image numbers and target to move them in "
+                    "bulk (e.g. '3-17 f' or '1,4,9-12 st'), or press Enter to "
+                                    "continue one at a time.\n> ").strip()
+            if not response:
+                return
+
+            selection = None
+            if len(response.split()) >= 2:
+                select_input, target_input = response.rsplit(None, 1)
+                selection = parse_selection(select_input, len(img_paths))
+            if not selection:
+                print("Unrecognized input.")
+                continue
+
+            self.bulk_move([img_paths[i] for i in selection], target_input)
+
+    def bulk_move(self, img_paths, target_input):
+        """Move img_paths to one target, entered as at the target prompt
+        ('st' sends each to its dated folder, 'n' deletes them after
+        confirmation). Returns False if target not recognized."""
+        if target_input == 'n':
+            confirm = POLICY.ask("bulk_delete",
+                        "Delete %d images from buffer? [Y/N]\n> "
+                                                            % len(img_paths))
+            if confirm.lower() == 'y':
+                for img_path in img_paths:
+                    self.queue_remove(img_path)
+                self.flush_moves()
+            return True
+        elif target_input == 'st':
+            # Each goes to its own dated folder.
+            target_dir = None
+        elif self.find_stored_dir(target_input):
+            target_dir = self.find_stored_dir(target_input, silent=True)
+        elif os.path.isdir(target_input):
+            self.add_manual_dir(target_input)
+            target_dir = target_input
+        else:
+            print("Unrecognized target.")
+            return False
+
+        for img_path in img_paths:
+            img_target_dir = target_dir or self.get_st_target_dir(img_path)
+            self.queue_move(img_path, img_target_dir)
+            self.record_target(img_path, img_target_dir)
+        print("Moving %d files..." % len(img_paths))
+        self.flush_moves()
+        self.Targets.save()
+        return True
+
+    def event_transfer(self):
+        """Function to split buffer into events by gaps in capture time and
+        offer to move each whole event to one target. Events skipped here are
+        left for photo_transfer()."""
+        # Imported here since event_segment uses date_compare, which imports
+        # this module.
+        import event_segment
+
+        img_paths = [self.buffer_root + img for img in self.list_buffer()]
+        if not img_paths:
+            return
+        print("Finding events in %d buffer files." % len(img_paths))
+        events = event_segment.find_events(img_paths)
+        if not events:
+            print("No events found.")
+            return
+        if not self.Thumbs:
+            self.Thumbs = thumb_cache.ThumbCache()
+
+        for n, event in enumerate(events):
+            event_paths = [path for path in event.img_paths
+                                                    if self.in_buffer(path)]
+            if len(event_paths) < event_segment.MIN_EVENT_SIZE:
+                continue
+            print("\nEvent %d of %d: %s" % (n+1, len(events),
+                                                            event.describe()))
+            if self.use_preview and not self.Preview:
+                self.start_preview()
+            if self.Preview:
+                self.Preview.show_grid(event_paths,
+                                            self.Thumbs.build(event_paths))
+            else:
+                for img_path in event_paths:
+                    print("\t%s" % os.path.basename(img_path))
+
+            while True:
+                target_input = POLICY.ask("event_target",
+                            "Enter target for whole event, Enter to "
+                            "leave it for one-at-a-time, or 'q' to stop "
+                                            "going by event.\n> ").strip()
+                if not target_input:
+                    break
+                elif target_input == 'q':
+                    return
+                elif self.bulk_move(event_paths, target_input):
+                    break
+
+    def list_buffer(self):
+        """Sorted names of files in buffer (not dirs or checkpoint file)."""
+        return sorted(img for img in os.listdir(self.buffer_root)
+                        if img != CHECKPOINT_NAME
+                        and not os.path.isdir(self.buffer_root + img))
+
+    def save_checkpoint(self, next_img):
+        """Record image photo_transfer() should resume at. Written to temp
+        file then renamed, so a crash never leaves a partial checkpoint."""
+        checkpoint_path = self.buffer_root + CHECKPOINT_NAME
+        with open(checkpoint_path + ".tmp", "w") as checkpoint_file:
+            json.dump({"next_img": next_img,
+                       "saved": time.strftime("%Y-%m-%dT%H:%M:%S")},
+                                                            checkpoint_file)
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+    def load_checkpoint(self):
+        """Returns image name saved by save_checkpoint(), or "" if none."""
+        checkpoint_path = self.buffer_root + CHECKPOINT_NAME
+        if not os.path.exists(checkpoint_path):
+            return ""
+        try:
+            with open(checkpoint_path) as checkpoint_file:
+                return json.load(checkpoint_file).get("next_img") or ""
+        except (OSError, ValueError):
+            print("Ignoring unreadable checkpoint file %s" % checkpoint_path)
+            return ""
+
+    def clear_checkpoint(self):
+        if os.path.exists(self.buffer_root + CHECKPOINT_NAME):
+            os.remove(self.buffer_root + CHECKPOINT_NAME)
 
     def photo_transfer(self, start_point=""):
         """Master function to displays images in buffer and prompt user
         where it should be copied. Execute copy. Start_point can be specified
-        (as img name) to skip processing earlier imgs."""
+        (as img name) to skip processing earlier imgs. Otherwise resumes where
+        previous session left off, if it didn't finish."""
 
         # local buffer to be categorized manually
         CAT_DIRS['u'] = self.buffer_root + "manual_" + time.strftime('%Y-%m-%d') + '/'
@@ -112,6 +424,17 @@ class Categorizer(object):
         for dir in self.manual_dir_list:
             print(("\t\t\t%s" % dir).expandtabs(2))
 
+        recent_dirs = [target for target in self.Targets.ranked()
+                                    if target.startswith("/")][:10]
+        if recent_dirs:
+            print("\nTarget directories available (previous sessions, "
+                                "most used first; any 3+ letters of path):")
+            for dir in recent_dirs:
+                print(("\t\t\t%s" % dir).expandtabs(2))
+
+        print("\n(Press Enter with no input to accept suggested target shown "
+                                                                "in prompt)")
+
         print("\n(Append '&' to first choice if multiple destinations needed)\n"
                 "(Append '+' followed by a two-digit number to use same dest "
                         "folder for subsequent [number] of pics)\n")
@@ -120,81 +443,146 @@ class Categorizer(object):
         if not os.path.exists(CAT_DIRS['u']):
             os.mkdir(CAT_DIRS['u'])
 
-        buffered_imgs = os.listdir(self.buffer_root)
-        buffered_imgs.sort()
-        if start_point:
-            # If a start point is specified, truncate earlier images.
-            start_index = buffered_imgs.index(start_point)
-            buffered_imgs = buffered_imgs[start_index:]
+        # Buffer is listed once. Images are then processed in order with a
+        # cursor, and a checkpoint is saved after each decision.
+        buffered_imgs = self.list_buffer()
+        if not start_point:
+            start_point = self.load_checkpoint()
+            if start_point:
+                print("Resuming at %s (saved from previous session).\n"
+                                                                % start_point)
+        # Skip to start point (or next remaining image if it's gone).
+        cursor = bisect.bisect_left(buffered_imgs, start_point)
+
+        if self.near_dups is None:
+            self.near_dups = {}
+            if self.group_near_dups and near_dup.available():
+                print("Grouping near-duplicate images (bursts, repeated "
+                                                                "shots).")
+                self.near_dups = near_dup.find_near_dups(
+                        [self.buffer_root + img for img in buffered_imgs])
+
+        try:
+            self.categorize_from(buffered_imgs, cursor)
+        finally:
+            # Exit barrier. Let queued moves finish even if interrupted.
+            self.Mover.wait()
+            MOVE_ENGINE.sync()
+            self.Targets.save()
+        # Safe point to ask about any collisions held back during the loop.
+        self.flush_moves()
+        self.clear_checkpoint()
+
+        if not self.wait_for_manual_sort(CAT_DIRS['u'],
+                        "\nToday's manual-sort folder populated.\n"
+                        "Check folder(s) for any uncategorized pictures and "
+                        "categorize them manually.\nPress Enter to continue or 'q' "
+                                                                    "to quit.\n> "):
+            return
+        # Once manual sort folder is empty, remove it as long as it's empty.
+        if os.path.exists(CAT_DIRS['u']) and not os.listdir(CAT_DIRS['u']):
+            os.rmdir(CAT_DIRS['u'])
+        # Also remove any other manual sort folders from other days if they're empty.
+        for other_folder in os.listdir(self.buffer_root):
+            if "manual_" in other_folder:
+                if not self.wait_for_manual_sort(self.buffer_root + other_folder,
+                                "\nAt least one manual-sort "
+                        "folder in the buffer is populated.\nCategorize content "
+                        "then press Enter to continue or 'q' to quit.\n> "):
+                    return
+                if not os.listdir(self.buffer_root + other_folder):
+                    os.rmdir(self.buffer_root + other_folder)
 
-        for img in buffered_imgs:
+    def wait_for_manual_sort(self, sort_dir, prompt_text):
+        """Wait for user to empty manual-sort folder sort_dir. Returns False if
+        user quits instead, or if run is headless (no one to sort it - folder
+        is left for a later interactive run)."""
+        while os.path.exists(sort_dir) and os.listdir(sort_dir):
+            if POLICY.headless:
+                print("\nManual-sort folder %s populated. Left for manual "
+                                            "sorting in a later run." % sort_dir)
+                return False
+            sort_folder_response = POLICY.ask("manual_sort_pending",
+                                                                prompt_text)
+            if sort_folder_response.lower() == 'q':
+                return False
+        return True
+
+
+    def categorize_from(self, buffered_imgs, cursor):
+        """Prompt for each image in buffered_imgs (sorted names) starting at
+        index cursor and queue the resulting moves. Called by
+        photo_transfer()."""
+        while cursor < len(buffered_imgs):
+            img = buffered_imgs[cursor]
             img_path = self.buffer_root + img
 
-            if os.path.isdir(img_path):
-                # Ignore any manual sort folder left over from previous offload.
+            if not self.in_buffer(img_path):
+                # Already moved along with near-duplicate group or '+' batch.
+                cursor += 1
                 continue
 
+            # A near-duplicate group gets one decision for all its members,
+            # except deletion, which only applies to the image shown.
+            group_paths = [path for path in self.near_dups.get(img_path,
+                                            [img_path]) if self.in_buffer(path)]
+            if len(group_paths) > 1:
+                print("%s and %d near-duplicates (target applies to all, 'n' "
+                    "deletes only this one):" % (img, len(group_paths) - 1))
+                for path in group_paths[1:]:
+                    print("\t%s" % os.path.basename(path))
+
+            self.upcoming_paths = [self.buffer_root + next_img for next_img in
+                    buffered_imgs[cursor+1:cursor+1+preview.PREFETCH_COUNT]]
+
             # Show image and prompt for location.
             target_dir = self.get_target_dir(img_path)
+            if target_dir:
+                self.record_target(img_path, target_dir)
 
             if target_dir and (target_dir[0] == '*'):
                 # If get_target_dir detected the trailing special character '&',
                 # then after copying image into one place, the user should be
                 # prompted again w/ same photo to put somewhere else.
-                copy_to_target(img_path, target_dir[1:])
-                self.photo_transfer(start_point=img)
-                return
+                for path in group_paths:
+                    self.queue_copy(path, target_dir[1:])
+                # Cursor stays on this image.
+                continue
 
-            if target_dir and (target_dir[0] == '!'):
-                copy_to_target(img_path, target_dir[3:], move_op=True)
+            elif target_dir and (target_dir[0] == '!'):
+                for path in group_paths:
+                    self.queue_move(path, target_dir[3:])
 
                 # If get_target_dir detected the trailing special character '+' and
                 # a two-digit number, copy multiple successive images to same place.
                 additional_copies = int(target_dir[1:3])
-                re_buffered_imgs = os.listdir(self.buffer_root)
-                re_buffered_imgs.sort()
-                for extra_img in re_buffered_imgs[:additional_copies]:
-                    extra_img_path = self.buffer_root + extra_img
-                    copy_to_target(extra_img_path, target_dir[3:], move_op=True)
-
-                self.photo_transfer()
-                return
+                while additional_copies and cursor + 1 < len(buffered_imgs):
+                    cursor += 1
+                    extra_img_path = self.buffer_root + buffered_imgs[cursor]
+                    if self.in_buffer(extra_img_path):
+                        self.queue_move(extra_img_path, target_dir[3:])
+                        additional_copies -= 1
 
             elif target_dir:
                 # Execute the move from buffer to appropriate dir. End loop if user
                 # returns an abort command due to collision prompt.
-                copy_to_target(img_path, target_dir, move_op=True)
+                for path in group_paths:
+                    self.queue_move(path, target_dir)
 
             else:
                 # If user chooses to discard img, None is returned by
-                # get_target_dir. Delete image from buffer.
-                os.remove(img_path)
+                # get_target_dir. Delete image from buffer. Near-duplicates
+                # weren't shown, so they stay and come up one at a time.
+                self.queue_remove(img_path)
 
-        while os.listdir(CAT_DIRS['u']):
-            sort_folder_response = input("\nToday's manual-sort folder populated.\n"
-                        "Check folder(s) for any uncategorized pictures and "
-                        "categorize them manually.\nPress Enter to continue or 'q' "
-                                                                    "to quit.\n> ")
-            if sort_folder_response.lower() == 'q':
-                return
-            else:
-                continue
-        # Once manual sort folder is empty, remove it as long as it's empty.
-        if os.path.exists(CAT_DIRS['u']) and not os.listdir(CAT_DIRS['u']):
-            os.rmdir(CAT_DIRS['u'])
-        # Also remove any other manual sort folders from other days if they're empty.
-        for other_folder in os.listdir(self.buffer_root):
-            if "manual_" in other_folder:
-                while os.listdir(self.buffer_root + other_folder):
-                    other_folder_response = input("\nAt least one manual-sort "
-                        "folder in the buffer is populated.\nCategorize content "
-                        "then press Enter to continue or 'q' to quit.\n> ")
-                    if other_folder_response.lower() == 'q':
-                        return
-                    else:
-                        continue
-                if not os.listdir(self.buffer_root + other_folder):
-                    os.rmdir(self.buffer_root + other_folder)
+            cursor += 1
+            if cursor < len(buffered_imgs):
+                # Resume point is the earliest image not yet moved, since
+                # queued (or uncommitted) moves are lost if session crashes.
+                self.save_checkpoint(min([buffered_imgs[cursor]] +
+                                    [os.path.basename(path) for path in
+                                            self.Mover.claimed_paths()
+                                            | MOVE_ENGINE.pending_paths()]))
 
 
     def get_target_dir(self, img_path, target_input=""):
@@ -203,12 +591,30 @@ class Categorizer(object):
         Returns target path."""
         image_name = os.path.basename(img_path)
 
+        suggestion = None
+        if not target_input:
+            # Suggest target from history (same-day and similar images).
+            suggestion = self.Targets.suggest(image_name)
+            if suggestion and not (self.find_stored_dir(suggestion, silent=True)
+                                            or os.path.isdir(suggestion)):
+                suggestion = None
+
         while not target_input:
             # Display pic or video and prompt for dest.
             # Continue prompting until non-empty string input.
-            display_photo(img_path)
-            target_input = input("Enter target location for %s (or 'n' for no "
-                                                "transfer)\n> " % image_name)
+            # (Not shown if policy file answers for user.)
+            if not POLICY.has_answer("target_suggested" if suggestion
+                                                            else "target"):
+                self.show_img(img_path)
+            if suggestion:
+                target_input = POLICY.ask("target_suggested",
+                            "Enter target location for %s (or 'n' "
+                                "for no transfer) [Enter: %s]\n> "
+                                % (image_name, suggestion)) or suggestion
+            else:
+                target_input = POLICY.ask("target",
+                            "Enter target location for %s (or 'n' "
+                                "for no transfer)\n> " % image_name)
 
         if target_input == 'st':
             # 'st' type images require target folder creation in most cases.
@@ -253,15 +659,38 @@ class Categorizer(object):
 
         st_root = CAT_DIRS['st']
 
-        if not img_date in os.listdir(st_root):
+        # Shared index lists st root once per session instead of per image.
+        if not DIR_INDEX.contains(st_root, img_date):
             os.mkdir(st_root + img_date)
+            DIR_INDEX.add(st_root, img_date)
 
         return st_root + img_date
 
 
-def copy_to_target(img_path, target_dir, new_name=None, move_op=False):
+def parse_selection(select_input, count):
+    """Translates selection like '3-17' or '1,4,9-12' (numbered from 1) into
+    sorted list of indices. Returns None if invalid or out of range."""
+    indices = set()
+    for part in select_input.replace(" ", "").split(","):
+        bounds = part.split("-")
+        if len(bounds) > 2 or not all(num.isdigit() for num in bounds):
+            return None
+        first, last = int(bounds[0]), int(bounds[-1])
+        if not 1 <= first <= last <= count:
+            return None
+        indices.update(range(first-1, last))
+    return sorted(indices)
+
+
+def copy_to_target(img_path, target_dir, new_name=None, move_op=False,
+                                                            on_collision=None):
     """Function to copy img to target directory with collision detection.
-    If 'move_op' param specified, delete img from current dir."""
+    If 'move_op' param specified, delete img from current dir.
+    If 'on_collision' specified, it's called instead of prompting when a
+    different file with the same name exists in target dir, with args
+    (img_path, target_dir, new_name, move_op). It returns 's', 'o', or 'k' as
+    the prompt would, "" to prompt anyway, or None to leave img alone for now.
+    Returns path of file in target dir, or None if user chose to skip."""
 
     img = os.path.basename(img_path)
 
@@ -273,8 +702,7 @@ def copy_to_target(img_path, target_dir, new_name=None, move_op=False):
         target_dir += "/"
 
     # Prompt user for decision if collision detected.
-    target_dir_imgs = os.listdir(target_dir)
-    if new_name in target_dir_imgs:
+    if DIR_INDEX.contains(target_dir, new_name):
 
         if same_hash(img_path, os.path.join(target_dir, new_name)):
             # First check if they are the same file. If so, don't replace.
@@ -283,65 +711,58 @@ def copy_to_target(img_path, target_dir, new_name=None, move_op=False):
                             % (os.path.basename(target_dir[:-1]), new_name))
             if move_op:
                 os.remove(img_path)
-            else:
-                return
+                DIR_INDEX.discard(os.path.dirname(img_path), img)
+                MANIFEST.deleted(img_path)
+            return os.path.join(target_dir, new_name)
 
         else:
             # Otherwise, need user input to decide what to do about collision.
             action = None
-            while action != "s" and action != "o" and action != "k":
-                action = input("Collision detected: %s in dir:\n\t%s\n"
-                    "\tSkip, overwrite, or keep both? [S/O/K]\n\t> "
-                                                % (new_name, target_dir))
+            if on_collision:
+                action = on_collision(img_path, target_dir, new_name, move_op)
+                if action is None:
+                    # Caller will deal with collision later.
+                    return None
+            while True:
+                if not action:
+                    action = POLICY.ask("collision",
+                                "Collision detected: %s in dir:\n\t%s\n"
+                        "\tSkip, overwrite, or keep both? [S/O/K]\n\t> "
+                                                    % (new_name, target_dir))
                 if action.lower() == "s":
-                    return
+                    return None
                 elif action.lower() == "o":
                     # Overwrite file in destination folder w/ same name.
                     os.remove(os.path.join(target_dir, new_name))
-                    shutil.move(img_path, target_dir)
-                    return
+                    return transfer(img_path, target_dir, new_name, move_op)
                 elif action.lower() == "k":
-                    # repeatedly check for existence of duplicates until a free
-                    # name appears. Assume there will never be more than 9.
-                    # Prefer shorter file name to spare leading zeros.
-                    img_noext = os.path.splitext(new_name)[0]
-                    img_ext = os.path.splitext(new_name)[-1]
-
-                    n = 1
-                    img_noext = img_noext + "_%d" % n
-
-                    while img_noext + img_ext in target_dir_imgs:
-                        n += 1
-                        if n > 9:
-                            raise Exception("Image incrementer exceeded 9.\n"
-                                        "Check dest folder %s" % target_dir)
-                        img_noext = img_noext[:-1] + "%d" % n
-                    if move_op:
-                        shutil.move(img_path,
-                                os.path.join(target_dir, img_noext + img_ext))
-                    else:
-                        shutil.copy2(img_path,
-                                os.path.join(target_dir, img_noext + img_ext))
-
-    elif move_op:
-        shutil.move(img_path, os.path.join(target_dir, new_name))
+                    # Add "_1", "_2", etc. to name until a free one is found.
+                    return transfer(img_path, target_dir,
+                        DIR_INDEX.next_free_name(target_dir, new_name), move_op)
+                # Unrecognized response. Prompt again.
+                action = None
+
+    return transfer(img_path, target_dir, new_name, move_op)
+
+
+def transfer(img_path, target_dir, new_name, move_op):
+    """Copy or move img into target_dir (trailing slash) under new_name and
+    keep the shared directory index up to date. Returns new path.
+    Moves across filesystems leave img in place until MOVE_ENGINE.sync()."""
+    dest_path = os.path.join(target_dir, new_name)
+    if move_op:
+        # Recorded in change manifest by MOVE_ENGINE once dest is in place.
+        MOVE_ENGINE.move(img_path, dest_path)
     else:
-        shutil.copy2(img_path, os.path.join(target_dir, new_name))
+        shutil.copy2(img_path, dest_path)
+        MANIFEST.created(dest_path)
+    DIR_INDEX.add(target_dir, new_name)
+    return dest_path
 
 
 def same_hash(img1_path, img2_path):
-    with open(img1_path, 'rb') as file_obj:
-        img1_hash = hashlib.sha1(file_obj.read())
-        # print(img1_hash.hexdigest())
-
-    with open(img2_path, 'rb') as file_obj:
-        img2_hash = hashlib.sha1(file_obj.read())
-        # print(img2_hash.hexdigest())
-
-    if img1_hash.hexdigest() == img2_hash.hexdigest():
-        return True
-    else:
-        return False
+    # Size check, then sampled blocks, then full chunked digest (cached).
+    return file_compare.same_file(img1_path, img2_path)
 
 
 def os_open(input_path):
@@ -4,7 +4,11 @@ import shutil
 import time
 from tqdm import tqdm
 
+from dir_index import SortedNames
 from dir_names import IPHONE_DCIM_PREFIX
+from change_manifest import MANIFEST
+from prompt_policy import POLICY
+from tee_copy import TeeCopier, MAX_RETRIES
 
 
 class iPhoneLocError(Exception):
@@ -44,7 +48,8 @@ class iPhoneDCIM(object):
                 count += 1
 
         if count == 0 or not os.listdir(IPHONE_DCIM_PREFIX + iphone_handle):
-            input("Error: Can't find iOS device in %s\nPress Enter to try again." % IPHONE_DCIM_PREFIX)
+            POLICY.ask("device_missing",
+                        "Error: Can't find iOS device in %s\nPress Enter to try again." % IPHONE_DCIM_PREFIX)
             self.find_root()
         elif count > 1:
             raise iPhoneLocError("Error: Multiple 'gphoto' handles in " + IPHONE_DCIM_PREFIX)
@@ -56,7 +61,8 @@ class iPhoneDCIM(object):
             self.APPLE_folders = os.listdir(self.DCIM_path)
             if not self.APPLE_folders:
                 # Empty DCIM folder indicates temporary issue like locked device.
-                os_error_response = input("\nCan't access device pictures.\n"
+                os_error_response = POLICY.ask("device_locked",
+                            "\nCan't access device pictures.\n"
                 "Plugging iPhone/iPad in again and unlocking will likely fix issue.\n"
                 "Plug back in then press Enter to continue, or press 'q' to quit.\n> ")
                 if os_error_response.lower() == 'q':
@@ -106,12 +112,19 @@ class iPhoneDCIM(object):
 
 class RawOffloadGroup(object):
     """Requires no input. Creates object representing Raw_Offload root struct."""
-    def __init__(self, bu_root_path):
+    def __init__(self, bu_root_path, folder_done=None, mirror_root=None):
         # Upon creation, RawOffloadGroup creates a RawOffload object for the
         # most recent offload and any other offloads that contain latest APPLE
         # folder (the overlap folder)
 
         self.bu_root_path = bu_root_path
+        # Called with path of each APPLE folder once offload into it is done
+        # (e.g. to start NAS sync of it while the next one is copied).
+        self.folder_done = folder_done
+        # If set, each image read from the device is written to the same
+        # place under mirror_root (e.g. NAS share) too. See tee_copy.py.
+        self.mirror_root = mirror_root
+        self.Tee = None
         self.RO_root_path = self.bu_root_path + "Raw_Offload/"
 
         # Double-check Raw_Offload folder is there.
@@ -130,6 +143,20 @@ class RawOffloadGroup(object):
         # and create RawOffload objects for them. Put into a list.
         self.find_overlap_offloads()
 
+    def copy_img(self, src_img_path, dest_dir):
+        if self.Tee:
+            # One device read for both destinations.
+            self.Tee.copy(src_img_path, dest_dir)
+        else:
+            shutil.copy2(src_img_path, dest_dir)
+
+    def APPLE_folder_done(self, APPLE_folder_path):
+        if self.Tee:
+            # Re-read any images whose local copy came out bad.
+            self.Tee.retry_primary()
+        if self.folder_done:
+            self.folder_done(APPLE_folder_path)
+
     def get_BU_root(self):
         return self.bu_root_path
 
@@ -166,12 +193,14 @@ class RawOffloadGroup(object):
 
     def remove_bad_dir_items(self):
         if os.path.isfile(self.get_RO_root() + self.get_last_offload_name()):
-            input("File found where only offload folders should be in RO root.\n"
+            POLICY.ask("bad_offload_item",
+                        "File found where only offload folders should be in RO root.\n"
             "Press Enter to try again.\n> ")
             # try again
             self.remove_bad_dir_items()
         elif not os.listdir(self.get_RO_root() + self.get_last_offload_name()):
-            delete_empty_ro = input("Folder %s in raw_offload directory is empty, "
+            delete_empty_ro = POLICY.ask("empty_offload",
+                        "Folder %s in raw_offload directory is empty, "
             "probably from previous aborted offload.\n"
             "Press 'd' to delete folder and retry operation.\n"
             "Or press 'q' to quit.\n> " % self.get_last_offload_name())
@@ -179,6 +208,7 @@ class RawOffloadGroup(object):
             if delete_empty_ro == 'd':
                 # Delete that folder name from list attribute
                 os.rmdir(self.get_RO_root() + self.get_last_offload_name())
+                MANIFEST.deleted(self.get_RO_root() + self.get_last_offload_name())
 
                 # re-generate offload list after deleting an element
                 self.generate_offload_list()
@@ -211,7 +241,26 @@ class RawOffloadGroup(object):
     def create_new_offload(self):
         # Pass in current timestamp as the new offload's name
         new_timestamp = time.strftime(DATETIME_FORMAT)
-        NewOffload = NewRawOffload(new_timestamp, self)
+        if self.mirror_root:
+            self.Tee = TeeCopier(self.RO_root_path, self.mirror_root)
+        try:
+            NewOffload = NewRawOffload(new_timestamp, self)
+        except BaseException:
+            if self.Tee:
+                # Report what got copied, without reading device again.
+                self.Tee.wait()
+                self.Tee.report()
+                self.Tee = None
+            raise
+        if self.Tee:
+            Tee, self.Tee = self.Tee, None
+            # Any bad local copies not yet re-read are retried here.
+            Tee.finish()
+            if Tee.Primary.failures:
+                raise RawOffloadError("%d images failed verification after "
+                    "%d retries and are missing from %s (listed above). "
+                    "Offload not finished." % (len(Tee.Primary.failures),
+                                        MAX_RETRIES, NewOffload))
         self.merge_todays_offloads()
         return NewOffload
 
@@ -233,7 +282,8 @@ class RawOffloadGroup(object):
                 print("\t%s" % folder)
 
             while True:
-                merge_response = input("Merge folders? (Y/N)\n> ")
+                merge_response = POLICY.ask("merge_offloads",
+                            "Merge folders? (Y/N)\n> ")
                 if merge_response.lower() == 'y':
                     self.raw_offload_merge(todays_offloads)
                     break
@@ -256,15 +306,19 @@ class RawOffloadGroup(object):
             for APPLE_folder in SrcFolder.list_APPLE_folders():
                 # If the folder doesn't exist in the destination folder yet, create it.
                 if not APPLE_folder in DestFolder.list_APPLE_folders():
-                    os.mkdir(DestFolder.get_full_path() + APPLE_folder)
+                    DestFolder.make_APPLE_folder(APPLE_folder)
 
                 for image in SrcFolder.APPLE_contents(APPLE_folder):
                     shutil.move(SrcFolder.APPLE_folder_path(APPLE_folder) + image,
                             DestFolder.APPLE_folder_path(APPLE_folder))
+                    MANIFEST.moved(SrcFolder.APPLE_folder_path(APPLE_folder) + image,
+                            DestFolder.APPLE_folder_path(APPLE_folder) + image)
                 # Delete each APPLE directory after copying everything out of it
                 os.rmdir(SrcFolder.APPLE_folder_path(APPLE_folder))
+                MANIFEST.deleted(SrcFolder.APPLE_folder_path(APPLE_folder))
             # Delete each RO directory after copying everything out of it
             os.rmdir(SrcFolder.get_full_path())
+            MANIFEST.deleted(SrcFolder.get_full_path())
 
     def __str__(self):
         return self.get_RO_root()
@@ -276,9 +330,13 @@ class RawOffloadGroup(object):
 class RawOffload(object):
     """Represents a datestamped folder under the Raw_Offload root containing
     APPLE folders."""
+    __slots__ = ("Parent", "full_path", "offload_dir_name", "APPLE_names")
+
     def __init__(self, offload_name, Parent):
         self.Parent = Parent
         self.full_path = self.Parent.get_RO_root() + offload_name + '/'
+        # APPLE folder names are only listed if needed.
+        self.APPLE_names = None
 
         if len(offload_name) != 17:
             raise DirectoryNameError("Raw_Offload directory name '%s' not in "
@@ -293,10 +351,20 @@ class RawOffload(object):
         return self.full_path
 
     def list_APPLE_folders(self):
-        # Sorted; not full paths
-        APPLE_folders = os.listdir(self.get_full_path())
-        APPLE_folders.sort()
-        return APPLE_folders
+        # Sorted; not full paths. Listed on first use then kept up to date by
+        # make_APPLE_folder() and remove_APPLE_folder().
+        if self.APPLE_names is None:
+            self.APPLE_names = SortedNames.from_dir(self.get_full_path())
+        return self.APPLE_names
+
+    def make_APPLE_folder(self, APPLE_folder_name):
+        os.mkdir(self.full_path + APPLE_folder_name)
+        self.list_APPLE_folders().add(APPLE_folder_name)
+
+    def remove_APPLE_folder(self, APPLE_folder_name):
+        os.rmdir(self.full_path + APPLE_folder_name)
+        MANIFEST.deleted(self.full_path + APPLE_folder_name)
+        self.list_APPLE_folders().discard(APPLE_folder_name)
 
     def newest_APPLE_folder(self):
         if os.path.isfile(self.list_APPLE_folders()[-1]):
@@ -337,6 +405,7 @@ class RawOffload(object):
 class NewRawOffload(RawOffload):
     """Represents new RawOffload instance (timestamped folder).
     Includes functionality to perform the offload from an iPhoneDCIM obj."""
+    __slots__ = ("src_iPhone_dir", "overlap_folder", "new_overlap_path")
 
     def __init__(self, offload_name, Parent):
         self.Parent = Parent
@@ -357,6 +426,7 @@ class NewRawOffload(RawOffload):
                                                     % self.full_path)
         else:
             os.mkdir(self.full_path)
+            self.APPLE_names = SortedNames()
 
     def run_overlap_offload(self):
         # Find the last (newest) APPLE dir in the most recent offload.
@@ -371,7 +441,8 @@ class NewRawOffload(RawOffload):
                 src_APPLE_path = self.src_iPhone_dir.APPLE_folder_path(self.overlap_folder)
                 break
             except DirectoryNameError:
-                no_ovp_response = input("\nWARNING: No folder found on source "
+                no_ovp_response = POLICY.ask("overlap_missing",
+                            "\nWARNING: No folder found on source "
                 "device corresponding to overlap offload folder %s.\n"
                 "Check source device for folder %s.\n"
                 "Press Enter to retry.\n"
@@ -397,7 +468,7 @@ class NewRawOffload(RawOffload):
 
         # Create a destination folder in the new Raw Offload directory with the same APPLE name.
         self.new_overlap_path = self.full_path + self.overlap_folder + '/'
-        os.mkdir(self.new_overlap_path)
+        self.make_APPLE_folder(self.overlap_folder)
 
         # Iterate through each folder that contains the overlap folder.
         # store the img names in a set for fast membership testing (order not important).
@@ -420,10 +491,12 @@ class NewRawOffload(RawOffload):
                 # Requires iOS restart to fix.
                 while True:
                     try:
-                        shutil.copy2(src_img_path, self.new_overlap_path)
+                        self.Parent.copy_img(src_img_path, self.new_overlap_path)
+                        MANIFEST.created(self.new_overlap_path + img_name)
                         break
                     except OSError:
-                        os_error_response = input("\nEncountered device I/O error during overlap "
+                        os_error_response = POLICY.ask("device_io_error",
+                                    "\nEncountered device I/O error during overlap "
                         "offload. iPhone/iPad may need to be restarted to fix.\n"
                         "Press Enter to attempt to continue offload.\n"
                         "Or press 'q' to quit.\n> ")
@@ -447,9 +520,11 @@ class NewRawOffload(RawOffload):
         # This would happen in the rare case of the previous offload happening
         # just before the next photo saved starts a new APPLE photo on the device.
         if not self.APPLE_contents(self.overlap_folder):
-            os.rmdir(self.new_overlap_path)
+            self.remove_APPLE_folder(self.overlap_folder)
             print("No new pictures contained in %s (overlap folder) since "
                                     "last offload." % self.overlap_folder)
+        else:
+            self.Parent.APPLE_folder_done(self.new_overlap_path)
 
 
     def run_new_offload(self):
@@ -467,7 +542,7 @@ class NewRawOffload(RawOffload):
                 print("New APPLE folder %s found on iPhone - copying." % folder)
                 # Create the new destination folder
                 new_dst_APPLE_path = self.full_path + folder + '/'
-                os.mkdir(new_dst_APPLE_path)
+                self.make_APPLE_folder(folder)
 
                 # Loop through source APPLE folder and copy to new dst folder.
                 imgs = os.listdir(self.src_iPhone_dir.APPLE_folder_path(folder))
@@ -475,11 +550,13 @@ class NewRawOffload(RawOffload):
                 for img in tqdm(imgs):
                     while True:
                         try:
-                            shutil.copy2(self.src_iPhone_dir.APPLE_folder_path(folder) + img,
+                            self.Parent.copy_img(self.src_iPhone_dir.APPLE_folder_path(folder) + img,
                                     new_dst_APPLE_path)
+                            MANIFEST.created(new_dst_APPLE_path + img)
                             break
                         except OSError:
-                            os_error_response = input("\nEncountered device I/O error during new "
+                            os_error_response = POLICY.ask("device_io_error",
+                                        "\nEncountered device I/O error during new "
                             "offload. iPhone/iPad may need to be restarted to fix.\n"
                             "Press Enter to attempt to continue offload.\n"
                             "Or press 'q' to quit.\n> ")
@@ -493,6 +570,7 @@ class NewRawOffload(RawOffload):
                                 # try again
                                 continue
 
+                self.Parent.APPLE_folder_done(new_dst_APPLE_path)
                 new_APPLE_folder = True # Set if any new folder found in loop
 
         if not new_APPLE_folder:
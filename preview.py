@@ -0,0 +1,331 @@
+import os
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+# Optional: PIL (and pillow_heif to let PIL decode HEIC files), imported on
+# first use. See optional_deps.py.
+import optional_deps
+
+
+# Persistent preview page for the Categorizer. Instead of launching a viewer
+# for each image, a small web server on localhost serves one page that stays
+# open in the browser and polls for the current image. Upcoming buffer images
+# are decoded and downscaled in background threads, so by the time the user
+# moves on, the next preview is already rendered.
+# The same page can also show a numbered contact sheet of many images (from
+# thumb_cache) for bulk selection.
+
+PREVIEW_SIZE = 1600      # longest side of downscaled preview (pixels)
+PREFETCH_COUNT = 8       # number of upcoming images rendered ahead
+
+# Types the browser can show directly if PIL isn't available.
+BROWSER_TYPES = {".JPG": "image/jpeg", ".JPEG": "image/jpeg",
+                 ".PNG": "image/png", ".GIF": "image/gif"}
+VIDEO_EXTS = [".MOV", ".MP4"]
+
+
+class PreviewError(Exception):
+    pass
+
+
+def can_preview(img_path):
+    """Whether a preview can be rendered for this file type. Other types
+    (videos) still need an external viewer."""
+    img_ext = os.path.splitext(img_path)[-1].upper()
+    if img_ext in VIDEO_EXTS:
+        return False
+    elif img_ext in BROWSER_TYPES:
+        return True
+    elif img_ext == ".HEIC":
+        return (optional_deps.installed("PIL")
+                                and optional_deps.installed("pillow_heif"))
+    else:
+        return optional_deps.installed("PIL")
+
+
+def render_preview(img_path, max_size=PREVIEW_SIZE):
+    """Returns (bytes, content type) of a preview for img_path. Downscaled
+    JPEG if PIL is available, otherwise the file itself if the browser can
+    show it."""
+    img_ext = os.path.splitext(img_path)[-1].upper()
+    PIL = optional_deps.pil()
+    if PIL:
+        try:
+            with PIL.Image.open(img_path) as img:
+                # For JPEGs, draft() makes the decoder downscale as it goes
+                # (much faster than a full decode then resize).
+                img.draft("RGB", (max_size, max_size))
+                img = PIL.ImageOps.exif_transpose(img)
+                img.thumbnail((max_size, max_size))
+                preview_bytes = io.BytesIO()
+                img.convert("RGB").save(preview_bytes, "JPEG", quality=85)
+                return preview_bytes.getvalue(), "image/jpeg"
+        except Exception:
+            # Anything PIL can't decode (incl. DecompressionBombError): fall
+            # back on raw file below.
+            pass
+
+    if img_ext in BROWSER_TYPES:
+        with open(img_path, 'rb') as img_file:
+            return img_file.read(), BROWSER_TYPES[img_ext]
+    raise PreviewError("No preview available for %s" % img_path)
+
+
+PAGE_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Categorizer preview</title>
+<style>
+body { background: #222; color: #ddd; font-family: sans-serif; margin: 0;
+       height: 100vh; display: flex; flex-direction: column; }
+#name { padding: 6px 10px; font-size: 16px; }
+#view { flex: 1; display: flex; align-items: center; justify-content: center;
+        min-height: 0; }
+#view img { max-width: 100%; max-height: 100%; object-fit: contain; }
+#grid { display: none; flex-wrap: wrap; overflow-y: auto; padding: 4px; }
+.cell { width: 200px; margin: 4px; text-align: center; font-size: 12px; }
+.cell img { max-width: 200px; max-height: 200px; }
+.num { font-size: 18px; font-weight: bold; color: #fc6; }
+</style></head>
+<body><div id="name">Waiting for categorizer...</div>
+<div id="view"><img id="img"></div>
+<div id="grid"></div>
+<script>
+var seq = -1;
+var preload = {};
+function poll() {
+    fetch("/state").then(function(resp) { return resp.json(); })
+    .then(function(state) {
+        if (state.seq != seq && state.grid) {
+            seq = state.seq;
+            show_grid(state.grid);
+        } else if (state.seq != seq) {
+            seq = state.seq;
+            document.getElementById("grid").style.display = "none";
+            document.getElementById("view").style.display = "";
+            document.getElementById("name").textContent = state.name
+                + (state.preview ? "" : "  (opened in external viewer)");
+            var img = document.getElementById("img");
+            if (state.preview) {
+                img.src = "/preview/" + state.id;
+                img.style.display = "";
+            } else {
+                img.style.display = "none";
+            }
+            // Have browser fetch upcoming previews ahead of time too.
+            var next_preload = {};
+            state.upcoming.forEach(function(id) {
+                next_preload[id] = preload[id] || new Image();
+                next_preload[id].src = "/preview/" + id;
+            });
+            preload = next_preload;
+        }
+    }).catch(function() {})
+    .then(function() { setTimeout(poll, 200); });
+}
+function show_grid(cells) {
+    document.getElementById("name").textContent = cells.length
+        + " images. Enter numbers and target in terminal (e.g. 3-17 f)";
+    document.getElementById("view").style.display = "none";
+    var grid = document.getElementById("grid");
+    grid.innerHTML = "";
+    cells.forEach(function(cell) {
+        var div = document.createElement("div");
+        div.className = "cell";
+        var num = document.createElement("div");
+        num.className = "num";
+        num.textContent = cell.n;
+        div.appendChild(num);
+        if (cell.thumb) {
+            var img = document.createElement("img");
+            img.loading = "lazy";
+            img.src = "/thumb/" + cell.id;
+            div.appendChild(img);
+        }
+        var name = document.createElement("div");
+        name.textContent = cell.name;
+        div.appendChild(name);
+        grid.appendChild(div);
+    });
+    grid.style.display = "flex";
+}
+poll();
+</script></body></html>
+"""
+
+
+class PreviewServer(object):
+    """Localhost web page showing the image the Categorizer is asking about.
+    show() switches the page to a new image and queues the next images for
+    rendering in a thread pool. Rendered previews are kept in a small cache
+    bounded by the prefetch window."""
+    def __init__(self, port=0, prefetch_count=PREFETCH_COUNT,
+                                        max_size=PREVIEW_SIZE, workers=2):
+        self.port = port
+        self.prefetch_count = prefetch_count
+        self.max_size = max_size
+        self.workers = workers
+
+        self.lock = threading.Lock()
+        self.previews = OrderedDict()   # img path -> Future of render_preview()
+        self.path_ids = {}              # img path -> id used in URLs
+        self.id_paths = []
+        self.thumb_paths = {}           # id -> thumbnail file (grid view)
+        self.state = {"seq": 0, "id": None, "name": "", "preview": False,
+                                                "upcoming": [], "grid": None}
+        self.httpd = None
+        self.pool = None
+
+    def start(self):
+        """Start serving in background thread. Returns page URL."""
+        # http.server imported here, only once a preview is actually needed.
+        from http.server import ThreadingHTTPServer
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", self.port),
+                                                        make_handler(self))
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self.get_url()
+
+    def get_url(self):
+        return "http://127.0.0.1:%d/" % self.httpd.server_address[1]
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def get_id(self, img_path):
+        if img_path not in self.path_ids:
+            self.path_ids[img_path] = len(self.id_paths)
+            self.id_paths.append(img_path)
+        return self.path_ids[img_path]
+
+    def prefetch(self, img_path):
+        """Queue preview render if not already cached. Call with lock held."""
+        if img_path in self.previews:
+            self.previews.move_to_end(img_path)
+        else:
+            self.previews[img_path] = self.pool.submit(render_preview,
+                                                    img_path, self.max_size)
+
+    def show(self, img_path, upcoming=()):
+        """Display img_path on the page and render upcoming paths ahead."""
+        upcoming = [path for path in upcoming
+                                if can_preview(path)][:self.prefetch_count]
+        with self.lock:
+            if can_preview(img_path):
+                self.prefetch(img_path)
+            for path in upcoming:
+                self.prefetch(path)
+            # Keep current, upcoming, and a few recently-shown previews.
+            while len(self.previews) > 2 * self.prefetch_count + 1:
+                self.previews.popitem(last=False)
+
+            self.state = {"seq": self.state["seq"] + 1,
+                          "id": self.get_id(img_path),
+                          "name": os.path.basename(img_path),
+                          "preview": can_preview(img_path),
+                          "upcoming": [self.get_id(path) for path in upcoming],
+                          "grid": None}
+
+    def show_grid(self, img_paths, thumbs):
+        """Display numbered contact sheet of img_paths (numbered from 1).
+        thumbs is dict of thumbnail file paths keyed by img path."""
+        with self.lock:
+            grid = []
+            for n, img_path in enumerate(img_paths):
+                img_id = self.get_id(img_path)
+                if thumbs.get(img_path):
+                    self.thumb_paths[img_id] = thumbs[img_path]
+                grid.append({"n": n+1, "id": img_id,
+                             "name": os.path.basename(img_path),
+                             "thumb": bool(thumbs.get(img_path))})
+            self.state = {"seq": self.state["seq"] + 1, "id": None,
+                          "name": "", "preview": False, "upcoming": [],
+                          "grid": grid}
+
+    def get_thumb(self, img_id):
+        with self.lock:
+            thumb_path = self.thumb_paths.get(img_id)
+        if not thumb_path:
+            return None
+        try:
+            with open(thumb_path, 'rb') as thumb_file:
+                return thumb_file.read()
+        except OSError:
+            return None
+
+    def get_preview(self, img_id):
+        with self.lock:
+            if not 0 <= img_id < len(self.id_paths):
+                return None
+            img_path = self.id_paths[img_id]
+            if img_path not in self.previews:
+                if not self.pool:
+                    # Stopped.
+                    return None
+                self.prefetch(img_path)
+            future = self.previews[img_path]
+        try:
+            return future.result()
+        except (OSError, PreviewError, CancelledError):
+            # CancelledError: render still queued when stop() was called.
+            return None
+
+    def get_state(self):
+        with self.lock:
+            return dict(self.state)
+
+
+def make_handler(preview_server):
+    from http.server import BaseHTTPRequestHandler
+
+    class PreviewHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/":
+                self.send_bytes(PAGE_HTML.encode(), "text/html")
+            elif self.path == "/state":
+                self.send_bytes(json.dumps(preview_server.get_state()).encode(),
+                                                            "application/json")
+            elif self.path.startswith("/preview/"):
+                preview = preview_server.get_preview(self.get_img_id())
+                if preview:
+                    # Buffer files don't change, so browser can cache.
+                    self.send_bytes(preview[0], preview[1],
+                                                cache="max-age=3600")
+                else:
+                    self.send_error(404)
+            elif self.path.startswith("/thumb/"):
+                thumb = preview_server.get_thumb(self.get_img_id())
+                if thumb:
+                    self.send_bytes(thumb, "image/jpeg", cache="max-age=3600")
+                else:
+                    self.send_error(404)
+            else:
+                self.send_error(404)
+
+        def get_img_id(self):
+            try:
+                return int(self.path.rsplit("/", 1)[-1])
+            except ValueError:
+                return -1
+
+        def send_bytes(self, data, content_type, cache="no-store"):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Cache-Control", cache)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # Don't print request log over the categorizer's prompts.
+            pass
+
+    return PreviewHandler
@@ -0,0 +1,149 @@
+import os
+import time
+
+import optional_deps
+
+
+# Answers to the programs' prompts, so a run can go unattended (e.g.
+# overnight). Every prompt has a name, and the policy file gives the answer to
+# type at it - the same thing a user would type. Prompts not in the policy
+# are asked as usual, unless the policy is headless, in which case an
+# unanswered prompt raises PolicyError instead of waiting for a person.
+# Prompts that only pause for the user (e.g. "Press Enter when ready") have a
+# default answer, which a headless policy gives when it has none of its own.
+# The same prompt answered over and over (e.g. "retry" on a device error that
+# doesn't clear, or an answer the prompt doesn't accept) is only answered
+# max_repeats times in a row, repeat_wait seconds apart, before PolicyError is
+# raised.
+#
+# Policy file is TOML (or YAML if named .yaml/.yml), e.g.:
+#
+#   headless = true
+#   max_repeats = 10
+#   repeat_wait = 30
+#
+#   [answers]                   # every prompt a full run normally reaches
+#   device = "o"                # iPhone (or give --device)
+#   device_io_error = ""        # Enter = retry
+#   merge_offloads = "y"
+#   offload_done = ""           # pause (passes through headless anyway)
+#   manual_date = ""            # Enter = fall back on fs mod time
+#   ignore_month_warnings = "y"
+#   auto_cat_confirm = "y"
+#   mass_copy_pause = ""        # pause (passes through headless anyway)
+#   event_target = ""           # Enter = leave event for one-at-a-time
+#   grid_selection = ""         # Enter = go on one at a time
+#   target = "u"                # no suggestion: manual-sort folder
+#   target_suggested = ""       # Enter = accept suggestion
+#   collision = "k"
+#   manual_sort_pending = "q"   # leave manual-sort folder for later
+#   # Prompts about a missing or locked device, or a bad Raw_Offload folder,
+#   # are left out on purpose, so a headless run stops there.
+#
+#   [comments]                  # date_organize_tool.CommentPolicy args
+#   default_action = "skip"     # (so append_comments is never asked)
+#
+# Prompt names (answer is what the prompt itself accepts):
+#   full_bu:    device, offload_done
+#   offload:    device_missing, device_locked, bad_offload_item,
+#               empty_offload, overlap_missing, device_io_error,
+#               merge_offloads
+#   organize:   append_comments, manual_date, ignore_month_warnings
+#   categorize: auto_cat_confirm, mass_copy_pause, grid_selection,
+#               bulk_delete, event_target, target, target_suggested,
+#               collision, manual_sort_pending
+#   datestamp:  nonstandard_name
+
+DEFAULT_MAX_REPEATS = 10
+DEFAULT_REPEAT_WAIT = 0
+
+
+class PolicyError(Exception):
+    pass
+
+
+class PromptPolicy(object):
+    """Prompt answers (keyed by prompt name) and settings from a policy
+    file. With no file, every prompt is asked interactively."""
+    def __init__(self, answers=None, headless=False,
+                        max_repeats=DEFAULT_MAX_REPEATS,
+                        repeat_wait=DEFAULT_REPEAT_WAIT, sections=None):
+        self.answers = answers or {}
+        self.headless = headless
+        self.max_repeats = max_repeats
+        self.repeat_wait = repeat_wait
+        self.sections = sections or {}    # other tables, e.g. "comments"
+        self.last_prompt = None     # (name, text) last answered by policy
+        self.repeats = 0
+
+    def load(self, policy_path):
+        """Take answers and settings from TOML or YAML file at
+        policy_path."""
+        # Parsers imported only when a policy file is given.
+        if os.path.splitext(policy_path)[-1].lower() in [".yaml", ".yml"]:
+            yaml = optional_deps.load("yaml")
+            if not yaml:
+                raise PolicyError("PyYAML needed to read %s" % policy_path)
+            with open(policy_path) as policy_file:
+                settings = yaml.safe_load(policy_file) or {}
+        else:
+            # tomli is the same parser for Python < 3.11.
+            tomllib = (optional_deps.load("tomllib")
+                                            or optional_deps.load("tomli"))
+            if not tomllib:
+                raise PolicyError("tomli needed to read %s on Python < 3.11"
+                                                                % policy_path)
+            with open(policy_path, 'rb') as policy_file:
+                settings = tomllib.load(policy_file)
+
+        answers = settings.pop("answers", {}) or {}
+        for name, answer in answers.items():
+            if not isinstance(answer, str):
+                raise PolicyError("Answer for prompt '%s' in %s must be a "
+                                        "string (as typed)." % (name, policy_path))
+        self.answers = answers
+        self.headless = bool(settings.pop("headless", False))
+        self.max_repeats = settings.pop("max_repeats", DEFAULT_MAX_REPEATS)
+        self.repeat_wait = settings.pop("repeat_wait", DEFAULT_REPEAT_WAIT)
+        self.sections = settings
+
+    def has_answer(self, name):
+        return name in self.answers
+
+    def section(self, section_name):
+        """Dict of settings from other table in file (empty if none)."""
+        return dict(self.sections.get(section_name) or {})
+
+    def ask(self, name, prompt_text, default=None):
+        """Answer to prompt called name: from policy if it has one, else from
+        user (like input(prompt_text)). default is given instead by a
+        headless policy with no answer (for prompts that only pause)."""
+        if name not in self.answers:
+            if self.headless and default is not None:
+                self.last_prompt = None
+                print("%s%s\t[headless default]" % (prompt_text, default))
+                return default
+            elif self.headless:
+                raise PolicyError("No answer in policy for prompt '%s':\n%s"
+                                                        % (name, prompt_text))
+            self.last_prompt = None
+            return input(prompt_text)
+
+        if (name, prompt_text) == self.last_prompt:
+            self.repeats += 1
+            if self.repeats >= self.max_repeats:
+                raise PolicyError("Prompt '%s' answered %d times in a row by "
+                        "policy. Giving up:\n%s" % (name, self.repeats,
+                                                                prompt_text))
+            time.sleep(self.repeat_wait)
+        else:
+            self.last_prompt = (name, prompt_text)
+            self.repeats = 0
+        answer = self.answers[name]
+        # Show the prompt and answer so the log reads like an interactive run.
+        print("%s%s\t[policy: %s]" % (prompt_text, answer, name))
+        return answer
+
+
+# Policy used by all prompts. Interactive until a policy file is loaded.
+POLICY = PromptPolicy()
@@ -0,0 +1,354 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import statistics
+
+from thumb_cache import DEFAULT_CACHE_DIR
+
+
+# History of NAS syncs, built from the rsync --log-file logs that
+# NAS_BU_sync.sh, NAS_ST_sync.sh, and nas_sync.py write to
+# <log root>/rsync_logs/<timestamp>_<job name> (log root is the device BU root,
+# e.g. iPhone_Pictures, or the dir holding the st video dir). One row per
+# rsync run: files sent, files deleted, bytes, duration, exit code, keyed by
+# device (log root name) and target (job name, e.g. Raw_Offload).
+# Logs are ingested incrementally: the offset read up to is stored for each
+# log, so a run only reads logs that are new or have grown since. A run still
+# being written (no closing "sent ..." or "rsync error" line yet) is left for
+# next time, unless the log hasn't changed in STALE_SECONDS (killed sync), in
+# which case it's stored with no exit code.
+# Each new run is compared to the median of the same device and target's
+# previous runs, and flagged if its throughput dropped or it sent unusually
+# many files or bytes.
+#
+# Usage: python rsync_history.py [log root ...] [--last N]
+# (log roots default to the BU roots and st video dir parent from dir_names)
+
+DB_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), "rsync_history.db")
+
+STALE_SECONDS = 24 * 3600      # unfinished run older than this is stored as-is
+BASELINE_RUNS = 10             # earlier runs of same target compared against
+MIN_BASELINE_RUNS = 3          # fewer earlier runs than this -> no flags
+SLOW_FACTOR = 0.5              # flag if speed below this x median
+MIN_SPEED_BYTES = 10 * 1000**2 # smaller runs are mostly overhead; speed ignored
+DELTA_FACTOR = 5               # flag if files or bytes above this x median
+MIN_DELTA_FILES = 100          # ...and at least this many files
+
+# e.g. "2024/06/01 09:12:33 [12345] <f+++++++++ 2024-06-01/IMG_0001.JPG"
+LINE_PATTERN = re.compile(r"^(\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}) \[(\d+)\] "
+                                                                    r"(.*)$")
+# Itemized change of a file sent (-i). Not "." (unchanged) or "c" (created
+# dir etc.) or "h" (hard link).
+SENT_PATTERN = re.compile(r"^[<>][f]\S{9} ")
+SUMMARY_PATTERN = re.compile(r"^sent ([\d,]+) bytes\s+received ([\d,]+) bytes"
+                                            r"(?:\s+total size ([\d,]+))?")
+EXIT_PATTERN = re.compile(r"^rsync (?:error|warning): .*\(code (\d+)\)")
+LOG_NAME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{6}_(.+)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    log_path TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    device TEXT NOT NULL,
+    target TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    files INTEGER NOT NULL,
+    deleted INTEGER NOT NULL,
+    bytes_sent INTEGER,
+    bytes_received INTEGER,
+    total_size INTEGER,
+    exit_code INTEGER,
+    PRIMARY KEY (log_path, pid, start_time)
+);
+CREATE INDEX IF NOT EXISTS runs_by_target ON runs (device, target, start_time);
+"""
+
+
+class SyncRun(object):
+    """One rsync run parsed from a log."""
+    __slots__ = ("log_path", "pid", "device", "target", "start_time",
+                 "end_time", "files", "deleted", "bytes_sent",
+                 "bytes_received", "total_size", "exit_code")
+
+    def __init__(self, log_path, pid, device, target, start_time):
+        self.log_path = log_path
+        self.pid = pid
+        self.device = device
+        self.target = target
+        self.start_time = start_time
+        self.end_time = start_time
+        self.files = 0
+        self.deleted = 0
+        self.bytes_sent = None
+        self.bytes_received = None
+        self.total_size = None
+        self.exit_code = None
+
+    def duration(self):
+        return self.end_time - self.start_time
+
+    def speed(self):
+        """Bytes sent per second, or None if not known."""
+        if self.bytes_sent is None or self.duration() <= 0:
+            return None
+        return self.bytes_sent / self.duration()
+
+    def row(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_row(cls, row):
+        Run = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, row):
+            setattr(Run, name, value)
+        return Run
+
+    def describe(self):
+        speed = self.speed()
+        if self.exit_code is None and self.bytes_sent is None:
+            result = "unfinished"
+        elif self.exit_code:
+            result = "exit code %d" % self.exit_code
+        else:
+            result = "OK"
+        return ("%s  %5d files %4d deleted %9.1f MB %6.0f s %7s MB/s  %s" % (
+                time.strftime("%Y-%m-%d %H:%M", time.localtime(self.start_time)),
+                self.files, self.deleted, (self.bytes_sent or 0) / 1e6,
+                self.duration(),
+                "%.2f" % (speed / 1e6) if speed is not None else "-", result))
+
+
+def parse_log(log_path, device, target, log_bytes, after_run=False):
+    """Function that parses rsync log text (bytes read from log_path). A run
+    ends at its "sent ..." or "rsync error" line. (A local sync logs from
+    several rsync processes, so pids aren't used to tell runs apart.)
+    after_run means log_bytes starts right after an already-parsed run.
+    Returns list of finished SyncRuns, number of bytes up to end of last
+    finished run, and the unfinished run after it (or None)."""
+    runs = []
+    Run = None
+    offset = 0
+    done_offset = 0
+    for line in log_bytes.splitlines(keepends=True):
+        offset += len(line)
+        if not line.endswith(b"\n"):
+            break           # partial line still being written
+        match = LINE_PATTERN.match(line.decode(errors="replace").rstrip("\n"))
+        if not match:
+            continue
+        line_time = time.mktime(time.strptime(match.group(1),
+                                                        "%Y/%m/%d %H:%M:%S"))
+        message = match.group(3)
+        summary = SUMMARY_PATTERN.match(message)
+        exit_match = EXIT_PATTERN.match(message)
+
+        if Run is None or (Run.exit_code is not None
+                                        and not (summary or exit_match)):
+            if (summary or exit_match) and after_run:
+                # Another process's exit line for run already ingested.
+                done_offset = offset
+                continue
+            Run = SyncRun(log_path, int(match.group(2)), device, target,
+                                                                    line_time)
+        Run.end_time = line_time
+        if SENT_PATTERN.match(message):
+            Run.files += 1
+        elif message.startswith("*deleting "):
+            Run.deleted += 1
+        elif summary:
+            Run.bytes_sent = int(summary.group(1).replace(",", ""))
+            Run.bytes_received = int(summary.group(2).replace(",", ""))
+            if summary.group(3):
+                Run.total_size = int(summary.group(3).replace(",", ""))
+            if Run.exit_code is None:
+                Run.exit_code = 0
+        elif exit_match:
+            # Keep first nonzero code if several processes report one.
+            if not Run.exit_code:
+                Run.exit_code = int(exit_match.group(1))
+
+        if summary or exit_match:
+            if Run not in runs:
+                runs.append(Run)
+            done_offset = offset
+    if Run is not None and Run.exit_code is None:
+        return runs, done_offset, Run
+    return runs, done_offset, None
+
+
+class SyncHistory(object):
+    """Sync runs stored in sqlite db at db_path."""
+    def __init__(self, db_path=DB_PATH):
+        # abspath, so a bare file name (db in current dir) works too.
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def ingest(self, log_roots):
+        """Read new and grown logs under each log root's rsync_logs/.
+        Returns list of SyncRuns added."""
+        offsets = dict(self.db.execute("SELECT path, offset FROM logs"))
+        new_runs = []
+        for log_root in log_roots:
+            log_dir = os.path.join(log_root, "rsync_logs")
+            if not os.path.isdir(log_dir):
+                continue
+            device = os.path.basename(os.path.abspath(log_root))
+            with os.scandir(log_dir) as entries:
+                log_entries = sorted((entry for entry in entries
+                        if entry.is_file() and LOG_NAME_PATTERN.match(entry.name)
+                        and not entry.name.endswith(".files")),
+                                                    key=lambda entry: entry.name)
+            for entry in log_entries:
+                log_stat = entry.stat()
+                offset = offsets.get(entry.path, 0)
+                if log_stat.st_size <= offset:
+                    continue    # nothing new (only stat needed)
+                target = LOG_NAME_PATTERN.match(entry.name).group(1)
+                with open(entry.path, 'rb') as log_file:
+                    log_file.seek(offset)
+                    log_bytes = log_file.read()
+                runs, done_bytes, OpenRun = parse_log(entry.path, device,
+                                            target, log_bytes, offset > 0)
+                if OpenRun and time.time() - log_stat.st_mtime > STALE_SECONDS:
+                    # rsync killed before logging its exit.
+                    runs.append(OpenRun)
+                    done_bytes = len(log_bytes)
+                self.db.executemany("INSERT OR REPLACE INTO runs VALUES (%s)"
+                        % ",".join("?" * len(SyncRun.__slots__)),
+                        [Run.row() for Run in runs])
+                self.db.execute("INSERT OR REPLACE INTO logs VALUES (?, ?)",
+                                            (entry.path, offset + done_bytes))
+                new_runs += runs
+        self.db.commit()
+        return new_runs
+
+    def runs(self, device, target, before=None, count=None):
+        """Runs of target, newest first (only ones starting before 'before'
+        if given)."""
+        query = "SELECT * FROM runs WHERE device = ? AND target = ?"
+        params = [device, target]
+        if before is not None:
+            query += " AND start_time < ?"
+            params.append(before)
+        query += " ORDER BY start_time DESC"
+        if count:
+            query += " LIMIT ?"
+            params.append(count)
+        return [SyncRun.from_row(row) for row in
+                                            self.db.execute(query, params)]
+
+    def targets(self):
+        return self.db.execute("SELECT DISTINCT device, target FROM runs "
+                                            "ORDER BY device, target").fetchall()
+
+    def flags(self, Run):
+        """List of reasons Run looks like a regression compared to earlier
+        runs of the same target (empty if none or not enough history)."""
+        if Run.exit_code:
+            return ["failed (exit code %d)" % Run.exit_code]
+        earlier = [Earlier for Earlier in self.runs(Run.device, Run.target,
+                        before=Run.start_time, count=BASELINE_RUNS)
+                                                    if Earlier.exit_code == 0]
+        if len(earlier) < MIN_BASELINE_RUNS:
+            return []
+        flags = []
+
+        speeds = [Earlier.speed() for Earlier in earlier
+                    if Earlier.speed() and Earlier.bytes_sent >= MIN_SPEED_BYTES]
+        if (Run.speed() and Run.bytes_sent >= MIN_SPEED_BYTES
+                                    and len(speeds) >= MIN_BASELINE_RUNS):
+            median_speed = statistics.median(speeds)
+            if Run.speed() < SLOW_FACTOR * median_speed:
+                flags.append("throughput %.2f MB/s vs. usual %.2f MB/s"
+                                % (Run.speed() / 1e6, median_speed / 1e6))
+
+        median_files = statistics.median(Earlier.files for Earlier in earlier)
+        if (Run.files >= MIN_DELTA_FILES
+                            and Run.files > DELTA_FACTOR * median_files):
+            flags.append("%d files sent vs. usual %d" % (Run.files,
+                                                                median_files))
+        median_bytes = statistics.median(Earlier.bytes_sent or 0
+                                                        for Earlier in earlier)
+        if (Run.files >= MIN_DELTA_FILES and Run.bytes_sent
+                            and Run.bytes_sent > DELTA_FACTOR * median_bytes):
+            flags.append("%.1f MB sent vs. usual %.1f MB" % (
+                                    Run.bytes_sent / 1e6, median_bytes / 1e6))
+        return flags
+
+    def show(self, count=10):
+        """Print recent runs and speed trend of every target, with flags."""
+        for device, target in self.targets():
+            runs = self.runs(device, target, count=2 * count)
+            recent, older = runs[:count], runs[count:]
+            print("\n%s / %s" % (device, target))
+            speeds = [[Run.speed() for Run in group if Run.speed()
+                        and Run.bytes_sent >= MIN_SPEED_BYTES]
+                                                    for group in [recent, older]]
+            if all(speeds):
+                change = (statistics.median(speeds[0])
+                                    / statistics.median(speeds[1]) - 1) * 100
+                print("\tmedian speed %.2f MB/s (%+.0f%% vs. %d runs before)"
+                            % (statistics.median(speeds[0]) / 1e6, change,
+                                                                    len(older)))
+            for Run in reversed(recent):
+                print("\t%s" % Run.describe())
+                for flag in self.flags(Run):
+                    print("\t\t!! %s" % flag)
+
+
+def record_syncs(log_roots):
+    """Function that ingests new sync logs and prints any regression flags
+    for runs found. Problems with history db are printed, never raised, so
+    they can't affect the backup itself."""
+    try:
+        History = SyncHistory()
+        try:
+            for Run in History.ingest(log_roots):
+                for flag in History.flags(Run):
+                    print("Sync history: %s / %s at %s: %s" % (Run.device,
+                            Run.target, time.strftime("%Y-%m-%d %H:%M",
+                                    time.localtime(Run.start_time)), flag))
+        finally:
+            History.close()
+    except (OSError, sqlite3.Error) as err:
+        print("Couldn't update sync history (%s)" % err)
+
+
+def default_log_roots():
+    from dir_names import IPHONE_BU_ROOT, IPAD_BU_ROOT, ST_VID_ROOT
+    return [IPHONE_BU_ROOT, IPAD_BU_ROOT,
+                                    os.path.dirname(ST_VID_ROOT.rstrip("/"))]
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Ingest new rsync logs and "
+                                "show NAS sync history with regression flags.")
+    parser.add_argument("log_roots", nargs="*",
+                        help="dirs containing rsync_logs/ (default: BU roots "
+                                                    "and st video dir parent)")
+    parser.add_argument("--last", type=int, default=10,
+                                        help="runs shown per target")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    History = SyncHistory(args.db)
+    new_runs = History.ingest(args.log_roots or default_log_roots())
+    print("%d new sync runs ingested." % len(new_runs))
+    History.show(args.last)
+    History.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import math
+import time
+
+from thumb_cache import DEFAULT_CACHE_DIR
+
+
+# Persistent index of categorization targets, so targets don't have to be
+# typed out in full for every image. Every decision is recorded with the
+# target it went to: either a CAT_DIRS key (incl. 'st') or a manually-entered
+# dir path. Targets are then:
+#   - found by keyword: CAT_DIRS keys first, then dir paths used in this or
+#     any earlier session containing the keyword, best frecency first
+#   - suggested for each image: the target of the last image from the same
+#     day (burst of photos from one outing mostly go to the same place), plus
+#     past decisions for images with similar name pattern and type (e.g.
+#     IMG_E####.JPG edits, Screenshot PNGs). User presses Enter to accept.
+# Frecency: each use adds 1 to a target's score, and scores halve every
+# HALF_LIFE. Kept as log(score) relative to a fixed time so ranks never need
+# to be decayed or re-sorted as time passes.
+
+HALF_LIFE = 30 * 24 * 3600       # seconds
+DAY_WEIGHT = 2.0                 # suggestion weight of same-day decision
+MAX_DAYS = 5000                  # days kept for same-day suggestions
+TOP_TARGETS = 8                  # targets per feature considered in suggest()
+INDEX_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), "targets.json")
+
+DECAY_RATE = math.log(2) / HALF_LIFE
+
+
+def log_add(log_a, log_b):
+    """log(exp(log_a) + exp(log_b)) without overflow."""
+    high, low = max(log_a, log_b), min(log_a, log_b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def img_features(img_name):
+    """Cheap features of a (datestamped) buffer file name for matching past
+    decisions: its extension, and its name pattern with digits masked."""
+    name_noext, img_ext = os.path.splitext(img_name)
+    # Drop leading datestamp.
+    name_noext = re.sub(r"^\d{4}-\d{2}-\d{2}(T\d{6})?_", "", name_noext)
+    return ["ext:" + img_ext.upper(),
+            "pattern:" + re.sub(r"\d+", "#", name_noext) + img_ext.upper()]
+
+
+class TargetIndex(object):
+    """Target history loaded from and saved to index_path (JSON)."""
+    def __init__(self, cat_dirs, index_path=INDEX_PATH):
+        self.cat_dirs = cat_dirs
+        self.index_path = index_path
+        self.ranks = {}         # target -> log frecency score
+        self.features = {}      # feature -> {target: decision count}
+        self.days = {}          # datestamp -> target of latest decision
+        self.lookup_cache = {}  # keyword -> dir path (cleared on record)
+        # Derived from features: decision total and most-used targets (kept
+        # up to date as counts grow, so suggest() never scans all targets).
+        self.totals = {}
+        self.top = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as index_file:
+                    saved = json.load(index_file)
+                self.ranks = saved.get("ranks", {})
+                self.features = saved.get("features", {})
+                self.days = saved.get("days", {})
+            except (OSError, ValueError):
+                # Corrupt index is just started over.
+                print("Ignoring unreadable target index %s" % self.index_path)
+
+    def target_key(self, target_dir):
+        """Target as the user would type it: CAT_DIRS key if target_dir is
+        one of them ('st' for any dated st folder), else the dir path."""
+        target_dir = target_dir.rstrip("/") + "/"
+        if self.cat_dirs.get('st') and target_dir.startswith(
+                                        self.cat_dirs['st'].rstrip("/") + "/"):
+            return 'st'
+        for key, dir_path in self.cat_dirs.items():
+            if dir_path and dir_path.rstrip("/") + "/" == target_dir:
+                return key
+        return target_dir
+
+    def record(self, img_name, target_dir, now=None):
+        """Record decision to send img_name to target_dir."""
+        if now is None:
+            now = time.time()
+        target = self.target_key(target_dir)
+        if target in self.ranks:
+            self.ranks[target] = log_add(self.ranks[target], now * DECAY_RATE)
+        else:
+            self.ranks[target] = now * DECAY_RATE
+
+        for feature in img_features(img_name):
+            counts = self.features.setdefault(feature, {})
+            counts[target] = counts.get(target, 0) + 1
+            self.update_top(feature, target)
+
+        img_day = img_name.split("_")[0]
+        self.days.pop(img_day, None)    # re-insert as newest
+        self.days[img_day] = target
+        while len(self.days) > MAX_DAYS:
+            del self.days[next(iter(self.days))]
+
+        self.lookup_cache.clear()
+
+    def feature_top(self, feature):
+        """Most-used targets for feature, built from counts on first use."""
+        if feature not in self.top:
+            counts = self.features.get(feature, {})
+            self.totals[feature] = sum(counts.values())
+            self.top[feature] = sorted(counts, key=counts.get,
+                                                reverse=True)[:TOP_TARGETS]
+        return self.top[feature]
+
+    def update_top(self, feature, target):
+        """Counts only go up, so target can only move up in feature's top
+        list."""
+        if feature not in self.top:
+            self.feature_top(feature)
+            return
+        self.totals[feature] += 1
+        counts = self.features[feature]
+        top = self.top[feature]
+        if target not in top:
+            if len(top) < TOP_TARGETS:
+                top.append(target)
+            elif counts[target] > counts[top[-1]]:
+                top[-1] = target
+            else:
+                return
+        top.sort(key=counts.get, reverse=True)
+
+    def lookup(self, keyword):
+        """Best-ranked dir path from history containing keyword, or None.
+        Keyword must be at least three characters long."""
+        if len(keyword) < 3:
+            return None
+        if keyword not in self.lookup_cache:
+            matches = [target for target in self.ranks if target.startswith("/")
+                                        and keyword.lower() in target.lower()]
+            # Skip dirs since moved or removed.
+            self.lookup_cache[keyword] = next((target for target in
+                    sorted(matches, key=self.ranks.get, reverse=True)
+                                        if os.path.isdir(target)), None)
+        return self.lookup_cache[keyword]
+
+    def suggest(self, img_name):
+        """Most likely target for img_name (as typed at the prompt), or None
+        if no history applies. Deletions aren't recorded, so 'n' is never
+        suggested."""
+        scores = {}
+        day_target = self.days.get(img_name.split("_")[0])
+        if day_target:
+            scores[day_target] = DAY_WEIGHT
+        for feature in img_features(img_name):
+            counts = self.features.get(feature)
+            for target in self.feature_top(feature):
+                scores[target] = (scores.get(target, 0)
+                                        + counts[target] / self.totals[feature])
+        if not scores:
+            return None
+        # Frecency breaks ties.
+        return max(scores, key=lambda target: (scores[target],
+                                        self.ranks.get(target, float("-inf"))))
+
+    def ranked(self, count=None):
+        """Targets in frecency order."""
+        return sorted(self.ranks, key=self.ranks.get, reverse=True)[:count]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with open(self.index_path + ".tmp", "w") as index_file:
+            json.dump({"ranks": self.ranks, "features": self.features,
+                       "days": self.days}, index_file)
+        os.replace(self.index_path + ".tmp", self.index_path)
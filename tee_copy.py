@@ -0,0 +1,340 @@
+import os
+import time
+import queue
+import shutil
+import threading
+
+import file_compare
+
+
+# Offload copy that reads each file from the device once and writes it to two
+# places: the local Raw_Offload (primary) and a mirror dir (secondary), e.g.
+# the NAS share mounted locally, or any other dir. Reading from the phone over
+# gvfs is the slowest link, so the NAS sync doesn't have to read the same
+# bytes back from local disk.
+# The primary is written in the caller's thread, as shutil.copy2 would. Each
+# chunk read is also handed to a writer thread for the mirror. That hand-off
+# never blocks: if the mirror falls more than MIRROR_QUEUE_BYTES behind, the
+# rest of that file is dropped from the stream and the file is queued to be
+# copied to the mirror from the local primary copy instead (no device read).
+# Each destination is written to a hidden temp name, checked against the
+# digest of what was read from the device (size, then whole file read back),
+# and renamed into place only if it matches. Each destination has its own
+# retry queue:
+#   primary: bad copies are re-read from the device at retry_primary() (end
+#            of each APPLE folder), up to MAX_RETRIES times.
+#   mirror:  bad copies are re-copied from the primary copy by the writer
+#            thread, up to MAX_RETRIES times.
+# Files still failing are listed by report(). The mirror only reflects files
+# as offloaded; later moves (e.g. merging today's offloads) reach the NAS
+# through the normal NAS sync.
+
+MIRROR_QUEUE_BYTES = 256 * 1024 * 1024   # mirror backlog held in memory
+MAX_RETRIES = 3
+PART_SUFFIX = ".part"
+
+
+def part_path(dest_path):
+    return os.path.join(os.path.dirname(dest_path),
+                                "." + os.path.basename(dest_path) + PART_SUFFIX)
+
+
+def remove_quietly(file_path):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+class Destination(object):
+    """Copy stats and failures of one tee destination."""
+    def __init__(self, name, root):
+        self.name = name
+        self.root = root
+        self.copied = 0
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+        self.bytes_verified = 0
+        self.retried = 0
+        self.failures = []      # (dest path, reason) after last retry
+
+    def describe(self):
+        rate = (self.bytes_written / 1e6 / self.write_seconds
+                                            if self.write_seconds else 0)
+        return ("%s (%s): %d files, %.1f MB written at %.1f MB/s, "
+                "%.1f MB verified, %d retried, %d failed" % (self.name,
+                    self.root, self.copied, self.bytes_written / 1e6, rate,
+                    self.bytes_verified / 1e6, self.retried,
+                    len(self.failures)))
+
+
+class MirrorFile(object):
+    """Mirror copy in progress, streamed from the device read."""
+    __slots__ = ("primary_path", "mirror_path", "part_file", "hasher",
+                                                        "error", "attempt")
+
+    def __init__(self, primary_path, mirror_path, attempt=0):
+        self.primary_path = primary_path
+        self.mirror_path = mirror_path
+        self.part_file = None
+        self.hasher = file_compare.new_hasher()
+        self.error = None
+        self.attempt = attempt
+
+
+class TeeCopier(object):
+    """Copies device files into primary_root and mirror_root (both with
+    trailing slash) from one read (see above). Call finish() when done."""
+    def __init__(self, primary_root, mirror_root, verify=True,
+                                        mirror_queue_bytes=MIRROR_QUEUE_BYTES):
+        self.primary_root = primary_root
+        self.mirror_root = mirror_root
+        self.verify = verify
+        self.mirror_queue_bytes = mirror_queue_bytes
+        self.Primary = Destination("primary", primary_root)
+        self.Mirror = Destination("mirror", mirror_root)
+        self.primary_retries = []       # (src path, dest dir, attempt)
+        self.lock = threading.Lock()
+        self.queued_bytes = 0
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self.run_mirror)
+        self.worker.start()
+
+    def mirror_path(self, primary_path):
+        return self.mirror_root + os.path.relpath(primary_path,
+                                                            self.primary_root)
+
+    def copy(self, src_path, dest_dir, attempt=0):
+        """Copy src_path into dest_dir (like shutil.copy2) and to the same
+        place under mirror root. Returns primary dest path. Raises OSError
+        if the device read fails (nothing left behind)."""
+        dest_path = dest_dir + os.path.basename(src_path)
+        primary_part = part_path(dest_path)
+        MirrorCopy = MirrorFile(dest_path, self.mirror_path(dest_path),
+                                                                    attempt)
+        self.queue.put(("open", MirrorCopy))
+        streaming = True
+
+        start_time = time.perf_counter()
+        hasher = file_compare.new_hasher()
+        size = 0
+        try:
+            with open(src_path, 'rb', buffering=0) as src_file, \
+                            open(primary_part, 'wb', buffering=0) as dest_file:
+                while True:
+                    # New bytes object each read, since mirror may still be
+                    # writing the last one.
+                    chunk = src_file.read(file_compare.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    dest_file.write(chunk)
+                    size += len(chunk)
+                    if streaming:
+                        with self.lock:
+                            streaming = (self.queued_bytes + len(chunk)
+                                                    <= self.mirror_queue_bytes)
+                            if streaming:
+                                self.queued_bytes += len(chunk)
+                        if streaming:
+                            self.queue.put(("data", MirrorCopy, chunk))
+                        else:
+                            # Mirror too far behind. Copy it from primary
+                            # once primary is in place.
+                            self.queue.put(("drop", MirrorCopy))
+            shutil.copystat(src_path, primary_part)
+            os.rename(primary_part, dest_path)
+        except BaseException:
+            remove_quietly(primary_part)
+            self.queue.put(("abort", MirrorCopy))
+            raise
+
+        with self.lock:
+            self.Primary.copied += 1
+            self.Primary.bytes_written += size
+            self.Primary.write_seconds += time.perf_counter() - start_time
+
+        reason = self.check(self.Primary, dest_path, size, hasher.digest())
+        if reason:
+            remove_quietly(dest_path)
+            self.queue.put(("abort", MirrorCopy))
+            with self.lock:
+                if attempt < MAX_RETRIES:
+                    self.primary_retries.append((src_path, dest_dir,
+                                                                attempt + 1))
+                else:
+                    self.Primary.failures.append((dest_path, reason))
+        else:
+            self.queue.put(("close", MirrorCopy, size, hasher.digest()))
+        return dest_path
+
+    def check(self, Dest, dest_path, size, digest):
+        """Returns reason dest_path doesn't match what was read from source,
+        or None if it does."""
+        try:
+            dest_size = os.stat(dest_path).st_size
+        except OSError as err:
+            return str(err)
+        if dest_size != size:
+            return "size %d != %d" % (dest_size, size)
+        if not self.verify:
+            return None
+        if file_compare.full_digest(dest_path) != digest:
+            return "digest mismatch"
+        with self.lock:
+            Dest.bytes_verified += size
+        return None
+
+    def retry_primary(self):
+        """Re-copy primary copies that failed verification from source until
+        they pass or run out of retries. Returns paths copied."""
+        dest_paths = []
+        while self.primary_retries:
+            with self.lock:
+                retries, self.primary_retries = self.primary_retries, []
+            for src_path, dest_dir, attempt in retries:
+                with self.lock:
+                    self.Primary.retried += 1
+                dest_paths.append(self.copy(src_path, dest_dir, attempt))
+        return dest_paths
+
+    def run_mirror(self):
+        """Mirror writer thread."""
+        while True:
+            message = self.queue.get()
+            if message is None:
+                return
+            action, MirrorCopy = message[:2]
+            if action == "open":
+                try:
+                    os.makedirs(os.path.dirname(MirrorCopy.mirror_path),
+                                                                exist_ok=True)
+                    MirrorCopy.part_file = open(part_path(
+                                MirrorCopy.mirror_path), 'wb', buffering=0)
+                except OSError as err:
+                    MirrorCopy.error = str(err)
+            elif action == "data":
+                chunk = message[2]
+                with self.lock:
+                    self.queued_bytes -= len(chunk)
+                self.write_chunk(MirrorCopy, chunk)
+            elif action == "drop":
+                MirrorCopy.error = MirrorCopy.error or "fell behind stream"
+            elif action == "abort":
+                self.close_part(MirrorCopy, keep=False)
+            elif action == "close":
+                self.finish_mirror(MirrorCopy, *message[2:])
+            elif action == "retry":
+                self.retry_mirror(MirrorCopy, *message[2:])
+
+    def write_chunk(self, MirrorCopy, chunk):
+        if MirrorCopy.error:
+            return
+        start_time = time.perf_counter()
+        try:
+            MirrorCopy.part_file.write(chunk)
+        except OSError as err:
+            MirrorCopy.error = str(err)
+            return
+        MirrorCopy.hasher.update(chunk)
+        with self.lock:
+            self.Mirror.bytes_written += len(chunk)
+            self.Mirror.write_seconds += time.perf_counter() - start_time
+
+    def close_part(self, MirrorCopy, keep=True):
+        if MirrorCopy.part_file:
+            try:
+                MirrorCopy.part_file.close()
+            except OSError as err:
+                MirrorCopy.error = MirrorCopy.error or str(err)
+            MirrorCopy.part_file = None
+        if not keep or MirrorCopy.error:
+            remove_quietly(part_path(MirrorCopy.mirror_path))
+
+    def finish_mirror(self, MirrorCopy, size, digest):
+        """Rename streamed mirror copy into place and verify it, or queue it
+        for retry from primary copy."""
+        self.close_part(MirrorCopy)
+        reason = MirrorCopy.error
+        if not reason:
+            try:
+                shutil.copystat(MirrorCopy.primary_path,
+                                            part_path(MirrorCopy.mirror_path))
+                os.rename(part_path(MirrorCopy.mirror_path),
+                                                    MirrorCopy.mirror_path)
+            except OSError as err:
+                remove_quietly(part_path(MirrorCopy.mirror_path))
+                reason = str(err)
+        if not reason:
+            reason = self.check(self.Mirror, MirrorCopy.mirror_path, size,
+                                                                        digest)
+        if not reason:
+            with self.lock:
+                self.Mirror.copied += 1
+            return
+        self.queue_mirror_retry(MirrorCopy, size, digest, reason)
+
+    def queue_mirror_retry(self, MirrorCopy, size, digest, reason):
+        if MirrorCopy.attempt < MAX_RETRIES:
+            self.queue.put(("retry", MirrorFile(MirrorCopy.primary_path,
+                            MirrorCopy.mirror_path, MirrorCopy.attempt + 1),
+                                                                size, digest))
+        else:
+            remove_quietly(MirrorCopy.mirror_path)
+            with self.lock:
+                self.Mirror.failures.append((MirrorCopy.mirror_path, reason))
+
+    def retry_mirror(self, MirrorCopy, size, digest):
+        """Copy to mirror from the primary copy (not from the device)."""
+        with self.lock:
+            self.Mirror.retried += 1
+        start_time = time.perf_counter()
+        try:
+            os.makedirs(os.path.dirname(MirrorCopy.mirror_path), exist_ok=True)
+            shutil.copy2(MirrorCopy.primary_path,
+                                            part_path(MirrorCopy.mirror_path))
+            os.rename(part_path(MirrorCopy.mirror_path), MirrorCopy.mirror_path)
+        except OSError as err:
+            remove_quietly(part_path(MirrorCopy.mirror_path))
+            self.queue_mirror_retry(MirrorCopy, size, digest, str(err))
+            return
+        with self.lock:
+            self.Mirror.bytes_written += size
+            self.Mirror.write_seconds += time.perf_counter() - start_time
+        reason = self.check(self.Mirror, MirrorCopy.mirror_path, size, digest)
+        if reason:
+            self.queue_mirror_retry(MirrorCopy, size, digest, reason)
+        else:
+            with self.lock:
+                self.Mirror.copied += 1
+
+    def wait(self):
+        """Block until mirror writer is done with everything queued."""
+        if self.worker.is_alive():
+            self.queue.put(None)
+            self.worker.join()
+        # Retries queued by the last messages.
+        while not self.queue.empty():
+            message = self.queue.get()
+            if message and message[0] == "retry":
+                self.retry_mirror(*message[1:])
+
+    def report(self):
+        """Print stats and any files that couldn't be copied. Returns True if
+        none failed."""
+        print("Tee copy summary:")
+        for Dest in [self.Primary, self.Mirror]:
+            print("\t%s" % Dest.describe())
+            for dest_path, reason in Dest.failures:
+                print("\t\tFAILED %s (%s)" % (dest_path, reason))
+        return not (self.Primary.failures or self.Mirror.failures)
+
+    def finish(self):
+        """Retry any failed primary copies, wait for mirror, and report.
+        Returns True if none failed."""
+        try:
+            self.retry_primary()
+        finally:
+            # Writer thread has to be stopped even if a device read fails.
+            self.wait()
+        return self.report()
@@ -0,0 +1,55 @@
+"""Shared setup for the tests: puts the repo on sys.path and installs a
+dir_names stand-in (dir_names.py holds each user's local paths and isn't part
+of the repo), so no test can touch real backup dirs. Caches (thumbnails,
+hashes, sync history) go to a temp dir instead of ~/.cache."""
+import os
+import sys
+import types
+import tempfile
+
+import pytest
+
+os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(prefix="pic_backup_tests_")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+dir_names = types.ModuleType("dir_names")
+dir_names.IPHONE_DCIM_PREFIX = "/nonexistent/"
+dir_names.IPHONE_BU_ROOT = "/nonexistent/"
+dir_names.IPAD_BU_ROOT = "/nonexistent/"
+dir_names.ST_VID_ROOT = "/nonexistent/"
+dir_names.NAS_BU_ROOT = "/nonexistent/"
+dir_names.NAS_ST_DIR = "/nonexistent/"
+dir_names.SSH_PORT = 22
+dir_names.CAT_DIRS = {}
+sys.modules["dir_names"] = dir_names
+
+
+def write_file(file_path, text):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as out_file:
+        out_file.write(text)
+
+
+@pytest.fixture
+def device_tree(tmp_path, monkeypatch):
+    """Device mounted (as gvfs would) with two APPLE folders, and a BU root
+    whose last offload has the first picture of the older one.
+    Returns BU root path (trailing slash)."""
+    pytest.importorskip("tqdm")
+    import pic_offload_tool
+    dcim_prefix = str(tmp_path / "gvfs") + "/"
+    monkeypatch.setattr(pic_offload_tool, "IPHONE_DCIM_PREFIX", dcim_prefix)
+    device_dir = dcim_prefix + "gphoto2:host=Apple_Inc._iPhone/DCIM/"
+    for img_path in ["100APPLE/IMG_0001.JPG", "100APPLE/IMG_0002.JPG",
+                        "100APPLE/IMG_0003.HEIC", "101APPLE/IMG_0004.MOV"]:
+        write_file(device_dir + img_path, img_path * 100)
+
+    bu_root = str(tmp_path / "iPhone_Pictures") + "/"
+    write_file(bu_root + "Raw_Offload/2024-01-01T000000/100APPLE/IMG_0001.JPG",
+                                                    "100APPLE/IMG_0001.JPG" * 100)
+    os.makedirs(bu_root + "Organized/2024/2024-01")
+    os.makedirs(bu_root + "Cat_Buffer")
+    return bu_root
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+pytest.importorskip("tqdm")
+
+import target_index
+import pic_categorize_tool
+from prompt_policy import POLICY
+
+
+def test_delete_only_applies_to_shown_near_dup(tmp_path, monkeypatch):
+    monkeypatch.setattr(pic_categorize_tool, "CAT_DIRS", {})
+    monkeypatch.setattr(pic_categorize_tool, "os_open", lambda path: None)
+    monkeypatch.setattr(POLICY, "answers", {})
+    buffer_root = str(tmp_path / "Cat_Buffer") + "/"
+    target_dir = str(tmp_path / "Keep") + "/"
+    os.makedirs(buffer_root)
+    os.makedirs(target_dir)
+    buffered_imgs = ["2024-06-01_IMG_0001.JPG", "2024-06-01_IMG_0002.JPG",
+                                                    "2024-06-01_IMG_0003.JPG"]
+    for img in buffered_imgs:
+        with open(buffer_root + img, "w") as img_file:
+            img_file.write(img)
+
+    Cat = pic_categorize_tool.Categorizer(buffer_root, use_preview=False)
+    Cat.Targets = target_index.TargetIndex(pic_categorize_tool.CAT_DIRS,
+                                                str(tmp_path / "targets.json"))
+    Cat.near_dups = {buffer_root + buffered_imgs[0]:
+                            [buffer_root + img for img in buffered_imgs]}
+    prompts = []
+
+    def delete_first_keep_rest(prompt_text):
+        prompts.append(prompt_text)
+        return "n" if len(prompts) == 1 else target_dir
+
+    monkeypatch.setattr("builtins.input", delete_first_keep_rest)
+    Cat.categorize_from(buffered_imgs, 0)
+    Cat.flush_moves()
+
+    # Members not shown at the 'n' were asked about one at a time.
+    assert [img for prompt_text in prompts for img in buffered_imgs
+                                        if img in prompt_text] == buffered_imgs
+    assert sorted(os.listdir(target_dir)) == buffered_imgs[1:]
+    assert not [img for img in os.listdir(buffer_root) if img in buffered_imgs]
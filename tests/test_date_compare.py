@@ -0,0 +1,74 @@
+import os
+
+import date_compare
+
+
+class FakeExifTool(object):
+    """Stands in for a running exiftool process: returns metadata from a dict
+    keyed by path, and records each batch of paths read."""
+    def __init__(self, metadata_by_path):
+        self.metadata_by_path = metadata_by_path
+        self.batches = []
+
+    def get_metadata_batch(self, img_paths):
+        self.batches.append(list(img_paths))
+        return [dict(self.metadata_by_path.get(img_path, {}))
+                                                    for img_path in img_paths]
+
+
+def make_files(dir_path, img_names):
+    img_paths = []
+    for img_name in img_names:
+        img_paths.append(str(dir_path / img_name))
+        with open(img_paths[-1], "w") as img_file:
+            img_file.write("x")
+    return img_paths
+
+
+def test_comments_read_with_dates(tmp_path):
+    heic, mov, jpg, png, webp = make_files(tmp_path, ["IMG_0001.HEIC",
+            "IMG_0001.MOV", "IMG_0002.JPG", "IMG_0003.PNG", "IMG_0004.WEBP"])
+    Et = FakeExifTool({
+        heic: {"EXIF:DateTimeOriginal": "2024:06:01 09:12:33",
+                                    "EXIF:ImageDescription": "Job site visit"},
+        mov: {"QuickTime:CreationDate": "2024:06:01 09:12:33-04:00"},
+        jpg: {"EXIF:DateTimeOriginal": "2024:06:02 10:00:00"},
+        png: {"XMP:DateCreated": "2024:06:03 11:00:00",
+                                    "EXIF:ImageDescription": "Whiteboard"},
+        webp: {"EXIF:ImageDescription": "Sticker"},
+    })
+
+    comments = {}
+    group_dates = date_compare.get_group_dates_plus([[heic, mov], [jpg],
+                            [png], [webp]], Et, fallback=False, comments=comments)
+
+    assert [group_date and group_date[0].tm_mday
+                        for group_date in group_dates] == [1, 2, 3, None]
+    assert comments == {0: "Job site visit", 2: "Whiteboard", 3: "Sticker"}
+    # One batch: the lead file of each group, for date and comment both.
+    assert Et.batches == [[heic, jpg, png, webp]]
+
+
+def test_comment_from_later_file_read_for_date(tmp_path):
+    heic, mov = make_files(tmp_path, ["IMG_0001.HEIC", "IMG_0001.MOV"])
+    Et = FakeExifTool({
+        heic: {},
+        mov: {"QuickTime:CreationDate": "2024:06:01 09:12:33-04:00",
+                                        "EXIF:ImageDescription": "From video"},
+    })
+
+    comments = {}
+    date_compare.get_group_dates_plus([[heic, mov]], Et, fallback=False,
+                                                            comments=comments)
+
+    assert comments == {0: "From video"}
+    assert Et.batches == [[heic], [mov]]
+
+
+def test_without_comments_only_date_sources_read(tmp_path):
+    jpg, webp = make_files(tmp_path, ["IMG_0002.JPG", "IMG_0004.WEBP"])
+    Et = FakeExifTool({jpg: {"EXIF:DateTimeOriginal": "2024:06:02 10:00:00"}})
+
+    date_compare.get_group_dates_plus([[jpg], [webp]], Et, fallback=False)
+
+    assert Et.batches == [[jpg]]
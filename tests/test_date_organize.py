@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("tqdm")
+
+import date_organize_tool
+
+
+def test_group_siblings_leaves_out_sidecar_only_groups():
+    groups = date_organize_tool.group_siblings(["IMG_0001.HEIC",
+                "IMG_0001.AAE", "IMG_0002.AAE", "IMG_E0003.JPG",
+                                                            "IMG_0003.AAE"])
+    assert groups == [["IMG_0001.HEIC", "IMG_0001.AAE"],
+                      ["IMG_0003.AAE", "IMG_E0003.JPG"]]
+
+
+@pytest.mark.parametrize("img_names, replaced", [
+    (["IMG_1234.HEIC", "IMG_E1234.HEIC"], {"IMG_1234.HEIC"}),
+    # Edit saved with a different extension than the original.
+    (["IMG_1234.HEIC", "IMG_E1234.JPG", "IMG_1234.AAE"], {"IMG_1234.HEIC"}),
+    # Live Photo with only the still edited: video kept.
+    (["IMG_1234.HEIC", "IMG_1234.MOV", "IMG_E1234.HEIC"], {"IMG_1234.HEIC"}),
+    (["IMG_1234.HEIC", "IMG_1234.MOV", "IMG_E1234.MOV", "IMG_E1234.JPG"],
+                                        {"IMG_1234.HEIC", "IMG_1234.MOV"}),
+    (["IMG_1234.HEIC", "IMG_1234.MOV"], set()),
+    (["IMG_E1234.HEIC", "IMG_1234.AAE"], set()),
+])
+def test_replaced_originals_matched_by_number(img_names, replaced):
+    assert date_organize_tool.replaced_originals(img_names) == replaced
+
+
+def test_edit_with_other_extension_replaces_original(tmp_path):
+    bu_root = str(tmp_path) + "/"
+    buffer_root = bu_root + "Cat_Buffer/"
+    os.makedirs(bu_root + "Organized/2024/2024-05/")
+    os.mkdir(buffer_root)
+    src_dir = bu_root + "Raw_Offload/2024-06-01T090000/100APPLE/"
+    os.makedirs(src_dir)
+    img_paths = []
+    for img_name in ["IMG_1234.HEIC", "IMG_E1234.JPG", "IMG_1234.AAE"]:
+        img_paths.append(src_dir + img_name)
+        with open(img_paths[-1], "w") as img_file:
+            img_file.write(img_name)
+
+    OrgGroup = date_organize_tool.OrganizedGroup(bu_root, buffer_root)
+    img_time = time.strptime("2024-06-01", "%Y-%m-%d")
+    OrgGroup.insert_group(img_paths, img_date_plus=(img_time, False))
+
+    assert os.listdir(bu_root + "Organized/2024/2024-06/") == [
+                                                    "2024-06-01_IMG_E1234.JPG"]
+    assert os.listdir(buffer_root) == ["2024-06-01_IMG_E1234.JPG"]
+
+
+def test_comment_decided_once_per_group(tmp_path, monkeypatch):
+    import contextlib
+    import date_compare
+    from test_date_compare import FakeExifTool
+
+    bu_root = str(tmp_path) + "/"
+    buffer_root = bu_root + "Cat_Buffer/"
+    os.makedirs(bu_root + "Organized/2024/2024-05/")
+    os.mkdir(buffer_root)
+    src_dir = bu_root + "Raw_Offload/2024-06-01T090000/100APPLE/"
+    os.makedirs(src_dir)
+    for img_name in ["IMG_0001.HEIC", "IMG_0001.MOV", "IMG_0002.JPG"]:
+        with open(src_dir + img_name, "w") as img_file:
+            img_file.write(img_name)
+    Et = FakeExifTool({
+        src_dir + "IMG_0001.HEIC": {"EXIF:DateTimeOriginal":
+                "2024:06:01 09:12:33", "EXIF:ImageDescription": "Job site"},
+        src_dir + "IMG_0002.JPG": {"EXIF:DateTimeOriginal":
+                "2024:06:01 10:00:00", "EXIF:ImageDescription": "Skip me"},
+    })
+    monkeypatch.setattr(date_compare, "exiftool_session",
+                                lambda et=None: contextlib.nullcontext(Et))
+    monkeypatch.setattr(date_organize_tool.POLICY, "answers",
+                                                    {"append_comments": "1"})
+
+    OrgGroup = date_organize_tool.OrganizedGroup(bu_root, buffer_root,
+                comment_policy=date_organize_tool.CommentPolicy("ask"))
+    OrgGroup.run_org()
+
+    # Only the lead file of each group was read.
+    assert Et.batches == [[src_dir + "IMG_0001.HEIC", src_dir + "IMG_0002.JPG"]]
+    assert sorted(os.listdir(buffer_root)) == [
+                                "2024-06-01_IMG_0001_Job_site.HEIC",
+                                "2024-06-01_IMG_0001_Job_site.MOV",
+                                "2024-06-01_IMG_0002.JPG"]
@@ -0,0 +1,35 @@
+import time
+
+import event_segment
+from file_compare import FileKeyCache
+
+
+class FakeExifTool(object):
+    """Returns the same tags for every file, and counts files read."""
+    def __init__(self, tags):
+        self.tags = tags
+        self.read_count = 0
+
+    def get_tags_batch(self, tags, img_paths):
+        self.read_count += len(img_paths)
+        return [dict(self.tags) for img_path in img_paths]
+
+
+def test_capture_times_cached_by_file_identity(tmp_path):
+    img_path = str(tmp_path / "2024-06-01_IMG_0001.JPG")
+    with open(img_path, "w") as img_file:
+        img_file.write("x")
+    cache_path = str(tmp_path / "cache" / "capture_times.json")
+    Et = FakeExifTool({"EXIF:DateTimeOriginal": "2024:06:01 09:12:33"})
+    expected = time.mktime(time.strptime("2024-06-01 09:12:33",
+                                                        "%Y-%m-%d %H:%M:%S"))
+
+    times = event_segment.capture_times([img_path],
+                                    FileKeyCache(cache_path, 10), Et)
+    assert times == {img_path: expected}
+
+    # Next run (new cache object, loaded from file) doesn't read metadata.
+    times = event_segment.capture_times([img_path],
+                                    FileKeyCache(cache_path, 10), Et)
+    assert times == {img_path: expected}
+    assert Et.read_count == 1
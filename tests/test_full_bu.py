@@ -0,0 +1,94 @@
+import os
+import time
+import contextlib
+
+import pytest
+
+import nas_sync
+import full_bu
+import prompt_policy
+from change_manifest import MANIFEST
+
+
+class QueuedSyncs(object):
+    """SyncManager that only records jobs (syncing is covered by
+    test_nas_sync.py). With failed, every sync fails."""
+    def __init__(self, failed=False):
+        self.failed = failed
+        self.jobs = []
+
+    def submit(self, job):
+        self.jobs.append(job)
+
+    def wait(self):
+        pass
+
+    def report(self):
+        return not self.failed
+
+    def finish(self):
+        if self.failed:
+            raise nas_sync.SyncError("NAS sync failed. See summary above.")
+
+
+class FakeExifTool(object):
+    """Every file was taken 2024-06-01 09:12:33."""
+    TAGS = {"EXIF:DateTimeOriginal": "2024:06:01 09:12:33",
+            "QuickTime:CreationDate": "2024:06:01 09:12:33-04:00"}
+
+    def get_metadata_batch(self, img_paths):
+        return [dict(self.TAGS) for img_path in img_paths]
+
+    def get_tags_batch(self, tags, img_paths):
+        return self.get_metadata_batch(img_paths)
+
+
+def test_failed_sync_gives_exit_code(monkeypatch, capsys):
+    monkeypatch.setattr(full_bu, "SYNC", QueuedSyncs(failed=True))
+    assert full_bu.main(["--device", "iphone", "sync"]) == 3
+    assert "NAS sync failed" in capsys.readouterr().out
+    assert len(full_bu.SYNC.jobs) == 3
+
+
+@pytest.mark.parametrize("pauses_answered", [True, False])
+def test_headless_full_run_with_example_policy(device_tree, tmp_path,
+                                    monkeypatch, capsys, pauses_answered):
+    import date_compare
+    import pic_categorize_tool
+    from test_prompt_policy import example_policy
+    for attr_name, value in vars(prompt_policy.PromptPolicy()).items():
+        monkeypatch.setattr(prompt_policy.POLICY, attr_name, value)
+    monkeypatch.setattr(MANIFEST, "roots", {})
+    monkeypatch.setattr(MANIFEST, "files", {})
+    monkeypatch.setattr(full_bu, "IPHONE_BU_ROOT", device_tree)
+    monkeypatch.setattr(full_bu, "ST_VID_ROOT", str(tmp_path / "st") + "/")
+    monkeypatch.setattr(full_bu, "SYNC", QueuedSyncs())
+    monkeypatch.setattr(pic_categorize_tool, "CAT_DIRS", {})
+    monkeypatch.setattr(pic_categorize_tool, "os_open", lambda path: None)
+    monkeypatch.setattr(date_compare, "exiftool_session",
+                        lambda et=None: contextlib.nullcontext(FakeExifTool()))
+
+    policy_text = example_policy()
+    if not pauses_answered:
+        policy_text = "\n".join(line for line in policy_text.splitlines()
+                if not line.startswith(("offload_done", "mass_copy_pause")))
+    policy_path = str(tmp_path / "policy.toml")
+    with open(policy_path, "w") as policy_file:
+        policy_file.write(policy_text)
+
+    assert full_bu.main(["--headless", "--policy", policy_path, "all"]) == 0
+
+    out = capsys.readouterr().out
+    assert "CATEGORIZE program complete" in out
+    assert ("[headless default]" in out) != pauses_answered
+    assert sorted(os.listdir(device_tree + "Organized/2024/2024-06")) == [
+            "2024-06-01_IMG_0002.JPG", "2024-06-01_IMG_0003.HEIC",
+                                                "2024-06-01_IMG_0004.MOV"]
+    # Categorized to today's manual-sort folder (answer "u"), left there.
+    manual_dir = (device_tree + "Cat_Buffer/manual_"
+                                            + time.strftime("%Y-%m-%d") + "/")
+    assert sorted(os.listdir(manual_dir)) == [
+            "2024-06-01_IMG_0002.JPG", "2024-06-01_IMG_0003.HEIC",
+                                                "2024-06-01_IMG_0004.MOV"]
+    assert [Job.name for Job in full_bu.SYNC.jobs if not Job.stream] == [
+                                        "Raw_Offload", "Organized", "st"]
@@ -0,0 +1,80 @@
+import os
+import errno
+
+import pytest
+
+import move_engine
+from change_manifest import ChangeManifest
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """Buffer and target dirs under a root tracked by a fresh manifest."""
+    root = str(tmp_path / "root") + "/"
+    os.makedirs(root + "buffer")
+    os.makedirs(root + "target")
+    Manifest = ChangeManifest()
+    Manifest.track(root)
+    monkeypatch.setattr(move_engine, "MANIFEST", Manifest)
+    src_path = root + "buffer/IMG_0001.JPG"
+    with open(src_path, "wb") as img_file:
+        img_file.write(b"x" * 5000)
+    return root, Manifest, src_path
+
+
+def cross_device(monkeypatch, src_path):
+    """Make renames of src_path fail as if target were on another
+    filesystem."""
+    rename = os.rename
+
+    def fake_rename(old_path, new_path):
+        if old_path == src_path:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        rename(old_path, new_path)
+
+    monkeypatch.setattr(move_engine.os, "rename", fake_rename)
+
+
+def test_failed_verification_not_in_manifest(tree, monkeypatch):
+    root, Manifest, src_path = tree
+    cross_device(monkeypatch, src_path)
+    dest_path = root + "target/IMG_0001.JPG"
+    Engine = move_engine.MoveEngine()
+
+    Engine.move(src_path, dest_path)
+    with open(dest_path, "r+b") as dest_file:
+        dest_file.write(b"y")       # copy goes bad before commit
+    Engine.sync()
+
+    assert os.path.exists(src_path) and not os.path.exists(dest_path)
+    assert len(Engine.failures) == 1
+    assert Manifest.take(root)[1] == set()
+
+
+def test_verified_copy_recorded_at_commit(tree, monkeypatch):
+    root, Manifest, src_path = tree
+    cross_device(monkeypatch, src_path)
+    Engine = move_engine.MoveEngine()
+
+    Engine.move(src_path, root + "target/IMG_0001.JPG")
+    assert Manifest.take(root)[1] == set()
+    Engine.sync()
+
+    assert Manifest.take(root)[1] == {"buffer/IMG_0001.JPG",
+                                                    "target/IMG_0001.JPG"}
+
+
+def test_rename_dirs_fsynced_at_sync(tree, monkeypatch):
+    root, Manifest, src_path = tree
+    synced_dirs = []
+    monkeypatch.setattr(move_engine, "fsync_dirs",
+                        lambda dir_paths: synced_dirs.extend(dir_paths))
+    Engine = move_engine.MoveEngine()
+
+    Engine.move(src_path, root + "target/IMG_0001.JPG")
+    assert Manifest.take(root)[1] == {"buffer/IMG_0001.JPG",
+                                                    "target/IMG_0001.JPG"}
+    Engine.sync()
+
+    assert synced_dirs == [root + "buffer", root + "target"]
+    assert Engine.renamed == 1
@@ -0,0 +1,58 @@
+import os
+import shutil
+
+from move_executor import MoveExecutor
+
+
+def test_copy_collision_then_move_releases_claim(tmp_path):
+    # '&' copy to A collides and is deferred, then the file is moved to B.
+    buffer_dir = tmp_path / "buf"
+    dir_a = tmp_path / "a"
+    dir_b = tmp_path / "b"
+    for dir_path in [buffer_dir, dir_a, dir_b]:
+        dir_path.mkdir()
+    img_path = str(buffer_dir / "x.jpg")
+    with open(img_path, "w") as img_file:
+        img_file.write("new")
+    with open(str(dir_a / "x.jpg"), "w") as img_file:
+        img_file.write("old")
+
+    resolved = []
+
+    def resolve_collision(src_path, target_dir, new_name, move_op):
+        resolved.append((src_path, target_dir, new_name, move_op))
+        shutil.copy2(src_path, os.path.join(target_dir, "x_1.jpg"))
+
+    Executor = MoveExecutor(resolve_collision)
+    # Copy task finds a collision and defers it (move_op False: no claim).
+    Executor.submit(img_path, Executor.defer_collision, img_path, str(dir_a),
+                                                            "x.jpg", False)
+    Executor.submit(img_path, shutil.move, img_path, str(dir_b / "x.jpg"),
+                                                                claim=True)
+    Executor.wait()
+    # Move is held behind the collision and keeps the file claimed.
+    assert Executor.claimed_paths() == {img_path}
+    assert os.path.exists(img_path)
+
+    Executor.flush()
+    assert resolved == [(img_path, str(dir_a), "x.jpg", False)]
+    assert not os.path.exists(img_path)
+    assert os.path.exists(str(dir_b / "x.jpg"))
+    assert os.path.exists(str(dir_a / "x_1.jpg"))
+    assert Executor.claimed_paths() == set()
+    assert not Executor.is_claimed(img_path)
+    assert not Executor.errors
+
+
+def test_move_without_collision_releases_claim(tmp_path):
+    img_path = str(tmp_path / "x.jpg")
+    with open(img_path, "w") as img_file:
+        img_file.write("x")
+    (tmp_path / "b").mkdir()
+
+    Executor = MoveExecutor(lambda *args: None)
+    Executor.submit(img_path, shutil.move, img_path,
+                            str(tmp_path / "b" / "x.jpg"), claim=True)
+    Executor.flush()
+    assert Executor.claimed_paths() == set()
+    assert os.path.exists(str(tmp_path / "b" / "x.jpg"))
@@ -0,0 +1,142 @@
+import os
+import shutil
+
+import pytest
+
+import nas_sync
+from change_manifest import ChangeManifest
+
+# Syncs go to a local destination dir (ssh_port None), so only rsync itself
+# is needed.
+needs_rsync = pytest.mark.skipif(not shutil.which("rsync"),
+                                                reason="rsync not installed")
+
+
+def write_file(file_path, text):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as out_file:
+        out_file.write(text)
+
+
+def read_file(file_path):
+    with open(file_path) as in_file:
+        return in_file.read()
+
+
+@pytest.fixture
+def bu_tree(tmp_path):
+    """Device BU root with a Raw_Offload/ dir, and a NAS BU root with an
+    empty dir for the device (rsync only creates the last dir of dest)."""
+    src_dir = str(tmp_path / "iPhone_Pictures" / "Raw_Offload") + "/"
+    write_file(src_dir + "2024-06-01/100APPLE/IMG_0001.JPG", "a" * 5000)
+    write_file(src_dir + "2024-06-01/100APPLE/IMG_0002.HEIC", "b" * 7000)
+    nas_root = str(tmp_path / "nas")
+    os.makedirs(nas_root + "/iPhone_Pictures")
+    return src_dir, nas_root, nas_root + "/iPhone_Pictures/Raw_Offload/"
+
+
+def test_update_progress():
+    Job = nas_sync.SyncJob("Raw_Offload", "/src/", "/dest", "/logs")
+    assert Job.update_progress("  1,234,567,890  45%   12.34MB/s    0:01:23 "
+                                                    "(xfr#12, to-chk=34/567)")
+    assert (Job.bytes_sent, Job.percent, Job.rate, Job.eta) == (
+                                    1234567890, 45, "12.34MB/s", "0:01:23")
+    assert not Job.update_progress(">f+++++++++ 2024-06-01/IMG_0001.JPG")
+
+
+@needs_rsync
+def test_full_sync_to_local_dest(bu_tree, capsys):
+    src_dir, nas_root, dest_dir = bu_tree
+    Manager = nas_sync.SyncManager()
+    Job = Manager.submit(nas_sync.bu_job(src_dir, nas_root))
+    Manager.finish()
+
+    assert Job.status == "ok" and Job.returncode == 0
+    assert Job.percent == 100
+    assert Job.bytes_sent >= 12000
+    for rel_path in ["2024-06-01/100APPLE/IMG_0001.JPG",
+                     "2024-06-01/100APPLE/IMG_0002.HEIC"]:
+        assert read_file(dest_dir + rel_path) == read_file(src_dir + rel_path)
+    # Log written where rsync_history looks for it.
+    log_dir = os.path.dirname(src_dir.rstrip("/")) + "/rsync_logs"
+    assert [name for name in os.listdir(log_dir)
+                                            if name.endswith("_Raw_Offload")]
+    output = capsys.readouterr().out
+    assert "NAS sync summary:" in output
+    assert "Raw_Offload -> %s: OK" % Job.dest_path in output
+
+
+@needs_rsync
+def test_failed_sync_reported(tmp_path, capsys):
+    Manager = nas_sync.SyncManager()
+    Job = Manager.submit(nas_sync.SyncJob("Organized",
+                            str(tmp_path / "missing") + "/",
+                            str(tmp_path / "dest"), str(tmp_path)))
+    with pytest.raises(nas_sync.SyncError):
+        Manager.finish()
+    assert Job.status == "failed"
+    assert Job.returncode not in [0, nas_sync.RSYNC_VANISHED]
+    assert "FAILED (rsync exit code %d)" % Job.returncode in \
+                                                    capsys.readouterr().out
+
+
+@needs_rsync
+def test_manifest_sync_only_sends_recorded_changes(bu_tree):
+    src_dir, nas_root, dest_dir = bu_tree
+    Manager = nas_sync.SyncManager()
+    Manager.submit(nas_sync.bu_job(src_dir, nas_root))
+    Manager.finish()
+
+    Manifest = ChangeManifest()
+    Manifest.track(src_dir)
+    folder = "2024-06-01/100APPLE/"
+    # Recorded: one new file, and one moved away (deleted from src).
+    write_file(src_dir + folder + "IMG_0003.PNG", "c" * 3000)
+    Manifest.created(src_dir + folder + "IMG_0003.PNG")
+    os.remove(src_dir + folder + "IMG_0001.JPG")
+    Manifest.deleted(src_dir + folder + "IMG_0001.JPG")
+    # Not recorded, so left alone.
+    write_file(src_dir + folder + "IMG_0002.HEIC", "changed")
+
+    Job = Manager.submit(nas_sync.bu_job(src_dir, nas_root, None, Manifest))
+    Manager.finish()
+
+    assert Job.status == "ok"
+    assert Job.changed_count == 2
+    assert read_file(dest_dir + folder + "IMG_0003.PNG") == "c" * 3000
+    assert not os.path.exists(dest_dir + folder + "IMG_0001.JPG")
+    assert read_file(dest_dir + folder + "IMG_0002.HEIC") == "b" * 7000
+    # Synced changes are cleared from the manifest.
+    assert Manifest.take(src_dir)[1] == set()
+
+
+@needs_rsync
+def test_stream_sync_per_folder(bu_tree):
+    src_dir, nas_root, dest_dir = bu_tree
+    Manifest = ChangeManifest()
+    Manifest.track(src_dir)
+    Manager = nas_sync.SyncManager()
+
+    # First folder finished: queued with only the changes recorded so far.
+    Manifest.created(src_dir + "2024-06-01/100APPLE/IMG_0001.JPG")
+    Manifest.created(src_dir + "2024-06-01/100APPLE/IMG_0002.HEIC")
+    First = Manager.submit(nas_sync.bu_job(src_dir, nas_root, None, Manifest,
+                                                                stream=True))
+    # Second folder written after first was queued.
+    write_file(src_dir + "2024-06-01/101APPLE/IMG_0100.JPG", "d" * 4000)
+    Manifest.created(src_dir + "2024-06-01/101APPLE/IMG_0100.JPG")
+    Manager.wait(show_progress=False)
+
+    assert First.status == "ok"
+    assert First.changed_count == 2
+    assert os.path.exists(dest_dir + "2024-06-01/100APPLE/IMG_0001.JPG")
+    assert not os.path.exists(dest_dir + "2024-06-01/101APPLE/IMG_0100.JPG")
+
+    Second = Manager.submit(nas_sync.bu_job(src_dir, nas_root, None, Manifest,
+                                                                stream=True))
+    Manager.finish()
+    assert Second is not First and Second.status == "ok"
+    assert Second.changed_count == 1
+    assert read_file(dest_dir + "2024-06-01/101APPLE/IMG_0100.JPG") == \
+                                                                    "d" * 4000
+    assert Manifest.take(src_dir)[1] == set()
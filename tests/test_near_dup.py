@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import near_dup
+
+
+def flip(img_hash, *bits):
+    for bit in bits:
+        img_hash ^= 1 << bit
+    return img_hash
+
+
+def test_chain_does_not_join_images_far_from_first():
+    base = 0x0123456789abcdef
+    # Each hash is 4 bits from the one before, so 8 bits from base.
+    chain = [base, flip(base, 0, 1, 2, 3), flip(base, 0, 1, 2, 3, 4, 5, 6, 7),
+             flip(base, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11)]
+    clusters = near_dup.cluster_hashes(chain, max_distance=6)
+    assert clusters == [[0, 1], [2, 3]]
+
+
+def test_every_member_within_distance_of_first():
+    base = 0xfedcba9876543210
+    hashes = [flip(base, *range(n)) for n in range(20)]
+    hashes += [flip(base, 63, 62)]
+    clusters = near_dup.cluster_hashes(hashes, max_distance=6, block_size=4)
+    assert sorted(i for members in clusters for i in members) == list(range(21))
+    for members in clusters:
+        assert members == sorted(members)
+        first = hashes[members[0]]
+        assert all(bin(first ^ hashes[i]).count("1") <= 6 for i in members)
+
+
+def test_burst_kept_as_one_cluster():
+    base = 0x0f0f0f0f0f0f0f0f
+    burst = [flip(base, 1), flip(base, 2, 3, 4), base, flip(base, 60, 61)]
+    other = [0xf0f0f0f0f0f0f0f0]
+    assert near_dup.cluster_hashes(burst + other) == [[0, 1, 2, 3]]
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+pytest.importorskip("tqdm")
+
+import tee_copy
+import pic_offload_tool
+
+
+def test_offload_with_mirror(device_tree, tmp_path):
+    mirror_root = str(tmp_path / "mirror") + "/"
+    Group = pic_offload_tool.RawOffloadGroup(device_tree,
+                                                    mirror_root=mirror_root)
+    NewOffload = Group.create_new_offload()
+
+    offload_dir = NewOffload.get_full_path()
+    assert sorted(os.listdir(offload_dir + "100APPLE")) == ["IMG_0002.JPG",
+                                                            "IMG_0003.HEIC"]
+    assert os.listdir(offload_dir + "101APPLE") == ["IMG_0004.MOV"]
+    mirror_dir = mirror_root + NewOffload.get_dir_name() + "/"
+    assert sorted(os.listdir(mirror_dir + "100APPLE")) == ["IMG_0002.JPG",
+                                                            "IMG_0003.HEIC"]
+
+
+def test_primary_copy_failing_verification_stops_offload(device_tree,
+                                                        tmp_path, monkeypatch):
+    check = tee_copy.TeeCopier.check
+
+    def bad_heic(self, Dest, dest_path, size, digest):
+        if Dest is self.Primary and dest_path.endswith(".HEIC"):
+            return "digest mismatch"
+        return check(self, Dest, dest_path, size, digest)
+
+    monkeypatch.setattr(tee_copy.TeeCopier, "check", bad_heic)
+    merged = []
+    Group = pic_offload_tool.RawOffloadGroup(device_tree,
+                                    mirror_root=str(tmp_path / "mirror") + "/")
+    monkeypatch.setattr(Group, "merge_todays_offloads",
+                                                    lambda: merged.append(1))
+
+    with pytest.raises(pic_offload_tool.RawOffloadError):
+        Group.create_new_offload()
+    assert not merged
+    assert Group.Tee is None
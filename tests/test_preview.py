@@ -0,0 +1,35 @@
+import threading
+
+import pytest
+
+import preview
+
+
+def test_render_falls_back_on_raw_file_for_decompression_bomb(tmp_path,
+                                                                monkeypatch):
+    PIL = pytest.importorskip("PIL.Image")
+    img_path = str(tmp_path / "IMG_0001.PNG")
+    PIL.new("RGB", (64, 64)).save(img_path)
+    monkeypatch.setattr(PIL, "MAX_IMAGE_PIXELS", 100)
+
+    with open(img_path, "rb") as img_file:
+        assert preview.render_preview(img_path) == (img_file.read(),
+                                                                "image/png")
+
+
+def test_get_preview_after_stop(tmp_path):
+    Server = preview.PreviewServer(workers=1)
+    Server.start()
+    # Keep the only worker busy so the preview render is still queued.
+    release = threading.Event()
+    Server.pool.submit(release.wait)
+    img_id = Server.get_id(str(tmp_path / "IMG_0001.JPG"))
+    with Server.lock:
+        Server.prefetch(Server.id_paths[img_id])
+    Server.stop()
+    release.set()
+
+    assert Server.get_preview(img_id) is None
+    # Not rendered before stop(), and can't be now.
+    assert Server.get_preview(Server.get_id(str(tmp_path / "IMG_0002.JPG"))) \
+                                                                        is None
@@ -0,0 +1,101 @@
+import os
+import re
+
+import pytest
+
+import prompt_policy
+from prompt_policy import PromptPolicy, PolicyError
+
+
+def example_policy():
+    """Text of the example policy file in prompt_policy.py's header."""
+    with open(prompt_policy.__file__) as module_file:
+        source = module_file.read()
+    example = source.split("e.g.:\n#\n", 1)[1].split("\n#\n# Prompt names", 1)[0]
+    return "\n".join(re.sub(r"^#   ?", "", line)
+                                        for line in example.splitlines()) + "\n"
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    """Fresh policy installed as the shared POLICY (restored afterwards)."""
+    Policy = prompt_policy.POLICY
+    for attr_name, value in vars(PromptPolicy()).items():
+        monkeypatch.setattr(Policy, attr_name, value)
+    return Policy
+
+
+def test_example_policy_loads(tmp_path, policy):
+    policy_path = str(tmp_path / "policy.toml")
+    with open(policy_path, "w") as policy_file:
+        policy_file.write(example_policy())
+    policy.load(policy_path)
+    assert policy.headless
+    for name in ["target", "manual_sort_pending", "collision"]:
+        assert policy.has_answer(name)
+    assert policy.section("comments") == {"default_action": "skip"}
+
+
+def test_headless_unanswered_prompt_raises(policy):
+    policy.headless = True
+    with pytest.raises(PolicyError):
+        policy.ask("device", "Which device?\n> ")
+
+
+def test_repeated_answer_gives_up(policy):
+    policy.answers = {"device_io_error": ""}
+    policy.max_repeats = 3
+    with pytest.raises(PolicyError):
+        for attempt in range(5):
+            policy.ask("device_io_error", "Retry?\n> ")
+
+
+def categorizer(tmp_path, monkeypatch):
+    """Categorizer on an empty buffer, with its manual-sort folder for today
+    already populated."""
+    pytest.importorskip("tqdm")
+    import target_index
+    import pic_categorize_tool
+    monkeypatch.setattr(pic_categorize_tool, "CAT_DIRS", {})
+    monkeypatch.setattr(pic_categorize_tool, "os_open", lambda path: None)
+    buffer_root = str(tmp_path / "Cat_Buffer") + "/"
+    os.makedirs(buffer_root)
+    Cat = pic_categorize_tool.Categorizer(buffer_root, use_preview=False,
+                                                        group_near_dups=False)
+    Cat.Targets = target_index.TargetIndex(pic_categorize_tool.CAT_DIRS,
+                                                str(tmp_path / "targets.json"))
+    manual_dir = (buffer_root + "manual_"
+                    + pic_categorize_tool.time.strftime('%Y-%m-%d') + "/")
+    os.makedirs(manual_dir)
+    with open(manual_dir + "IMG_0001.JPG", "w") as img_file:
+        img_file.write("x")
+    return Cat, manual_dir
+
+
+@pytest.mark.parametrize("answers", [{}, {"manual_sort_pending": ""},
+                                            {"manual_sort_pending": "q"}])
+def test_headless_categorize_leaves_manual_sort_folder(tmp_path, monkeypatch,
+                                                            policy, answers):
+    Cat, manual_dir = categorizer(tmp_path, monkeypatch)
+    policy.headless = True
+    policy.answers = answers
+    Cat.photo_transfer()        # returns instead of waiting or raising
+    assert os.listdir(manual_dir) == ["IMG_0001.JPG"]
+
+
+def test_interactive_categorize_waits_for_manual_sort(tmp_path, monkeypatch,
+                                                                    policy):
+    Cat, manual_dir = categorizer(tmp_path, monkeypatch)
+    responses = []
+
+    def sort_then_continue(prompt_text):
+        # User sorts the folder by hand, then presses Enter.
+        responses.append(prompt_text)
+        for img_name in os.listdir(manual_dir):
+            os.remove(manual_dir + img_name)
+        return ""
+
+    monkeypatch.setattr("builtins.input", sort_then_continue)
+    Cat.photo_transfer()
+    assert len(responses) == 1
+    assert not os.path.exists(manual_dir)
@@ -0,0 +1,11 @@
+import os
+
+import rsync_history
+
+
+def test_db_in_current_dir(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("root/rsync_logs")
+    rsync_history.main(["--db", "hist.db", "root"])
+    assert os.path.isfile(str(tmp_path / "hist.db"))
+    assert "0 new sync runs ingested." in capsys.readouterr().out
@@ -0,0 +1,175 @@
+import os
+import io
+import struct
+import hashlib
+
+# Optional: PIL (and pillow_heif to let PIL read HEIC files and their
+# embedded thumbnails), imported on first use. See optional_deps.py.
+import optional_deps
+from file_compare import file_key
+
+
+# Thumbnails for the categorizer's grid view, stored as small JPEG files in a
+# cache dir. Each is named after the source file's identity (device, inode,
+# size, mtime), so a thumbnail is reused across runs until the file changes.
+# Thumbnails are taken from the preview JPEG embedded in the file's EXIF data
+# when there is one (no decode of the full image needed), otherwise made by
+# downscaling with PIL. Missing ones are built in parallel in worker processes.
+
+THUMB_SIZE = 256
+CACHE_MAX_BYTES = 200 * 1024**2
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME",
+                    os.path.expanduser("~/.cache")), "iphone_pic_backup/thumbs")
+
+
+def exif_thumbnail(img_path):
+    """Returns JPEG thumbnail embedded in a JPG file's EXIF (IFD1), or None.
+    Only reads the EXIF segment at the start of the file."""
+    with open(img_path, 'rb') as img_file:
+        if img_file.read(2) != b"\xff\xd8":
+            return None
+        while True:
+            marker, seg_len = struct.unpack(">2sH", img_file.read(4) or b"\0"*4)
+            if marker[0:1] != b"\xff" or marker == b"\xff\xda":
+                # Image data reached without finding EXIF.
+                return None
+            segment = img_file.read(seg_len - 2)
+            if marker == b"\xff\xe1" and segment[:6] == b"Exif\0\0":
+                return tiff_thumbnail(segment[6:])
+
+
+def tiff_thumbnail(tiff):
+    """Thumbnail from TIFF-structured EXIF block, or None."""
+    try:
+        endian = "<" if tiff[:2] == b"II" else ">"
+        ifd0_offset = struct.unpack(endian + "I", tiff[4:8])[0]
+        ifd0_count = struct.unpack(endian + "H",
+                                        tiff[ifd0_offset:ifd0_offset+2])[0]
+        ifd1_pointer = ifd0_offset + 2 + 12 * ifd0_count
+        ifd1_offset = struct.unpack(endian + "I",
+                                        tiff[ifd1_pointer:ifd1_pointer+4])[0]
+        if not ifd1_offset:
+            return None
+        ifd1_count = struct.unpack(endian + "H",
+                                        tiff[ifd1_offset:ifd1_offset+2])[0]
+        tags = {}
+        for n in range(ifd1_count):
+            entry = tiff[ifd1_offset+2+12*n:ifd1_offset+14+12*n]
+            tag, tag_type = struct.unpack(endian + "HH", entry[:4])
+            # JPEGInterchangeFormat (offset) and its length are LONGs.
+            if tag in [0x0201, 0x0202] and tag_type == 4:
+                tags[tag] = struct.unpack(endian + "I", entry[8:12])[0]
+        if 0x0201 in tags and 0x0202 in tags:
+            thumb = tiff[tags[0x0201]:tags[0x0201] + tags[0x0202]]
+            if thumb[:2] == b"\xff\xd8":
+                return thumb
+    except struct.error:
+        pass
+    return None
+
+
+def make_thumb(img_path, thumb_path, thumb_size=THUMB_SIZE):
+    """Write thumbnail of img_path to thumb_path. Runs in worker process.
+    Returns thumb_path, or None if no thumbnail could be made."""
+    img_ext = os.path.splitext(img_path)[-1].upper()
+    thumb = None
+    PIL = optional_deps.pil()
+    pillow_heif = optional_deps.pillow_heif()
+    try:
+        if img_ext in [".JPG", ".JPEG"]:
+            thumb = exif_thumbnail(img_path)
+
+        if PIL:
+            if thumb:
+                img = PIL.Image.open(io.BytesIO(thumb))
+            else:
+                img = PIL.Image.open(img_path)
+                if pillow_heif and img_ext == ".HEIC" and hasattr(
+                                                    pillow_heif, "thumbnail"):
+                    # Use HEIC's embedded thumbnail image if it has one.
+                    img = pillow_heif.thumbnail(img, thumb_size)
+                # Decoder downscales as it goes for JPEGs.
+                img.draft("RGB", (thumb_size, thumb_size))
+            img = PIL.ImageOps.exif_transpose(img)
+            img.thumbnail((thumb_size, thumb_size))
+            thumb_bytes = io.BytesIO()
+            img.convert("RGB").save(thumb_bytes, "JPEG", quality=80)
+            thumb = thumb_bytes.getvalue()
+    except (OSError, ValueError, SyntaxError, struct.error):
+        # Use EXIF thumbnail as-is if PIL failed on it.
+        pass
+
+    if not thumb:
+        return None
+    # Write then rename so a half-written file is never used.
+    with open(thumb_path + ".tmp", 'wb') as thumb_file:
+        thumb_file.write(thumb)
+    os.replace(thumb_path + ".tmp", thumb_path)
+    return thumb_path
+
+
+class ThumbCache(object):
+    """On-disk thumbnail cache keyed by file identity and bounded to
+    max_bytes (least recently used thumbnails deleted first)."""
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                                                    thumb_size=THUMB_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.thumb_size = thumb_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def thumb_path(self, img_path):
+        key = "%d_%d_%d_%d_%d" % (file_key(os.stat(img_path))
+                                                        + (self.thumb_size,))
+        return os.path.join(self.cache_dir,
+                                hashlib.sha1(key.encode()).hexdigest() + ".jpg")
+
+    def get(self, img_path):
+        """Returns cached thumbnail path for img, or None if not cached."""
+        thumb_path = self.thumb_path(img_path)
+        if os.path.exists(thumb_path):
+            # Mark as recently used for pruning.
+            os.utime(thumb_path)
+            return thumb_path
+        return None
+
+    def build(self, img_paths, workers=None):
+        """Make any missing thumbnails for img_paths in parallel. Returns dict
+        of thumbnail paths keyed by img path (None where not possible)."""
+        thumbs = {}
+        missing = []
+        for img_path in img_paths:
+            thumbs[img_path] = self.get(img_path)
+            if not thumbs[img_path]:
+                missing.append(img_path)
+
+        if missing:
+            # Imported here: loading the process pool machinery is a large
+            # part of startup, and most runs never build thumbnails.
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(make_thumb, missing,
+                            [self.thumb_path(path) for path in missing],
+                            [self.thumb_size] * len(missing),
+                            chunksize=max(1, len(missing) // 64))
+                for img_path, thumb_path in zip(missing, results):
+                    thumbs[img_path] = thumb_path
+            self.prune()
+        return thumbs
+
+    def prune(self):
+        """Delete least recently used thumbnails until under max_bytes."""
+        entries = []
+        total_bytes = 0
+        with os.scandir(self.cache_dir) as dir_entries:
+            for dir_entry in dir_entries:
+                thumb_stat = dir_entry.stat()
+                entries.append((thumb_stat.st_mtime, thumb_stat.st_size,
+                                                            dir_entry.path))
+                total_bytes += thumb_stat.st_size
+        entries.sort()
+        for mtime, size, thumb_path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(thumb_path)
+            total_bytes -= size